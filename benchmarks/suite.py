@@ -0,0 +1,348 @@
+"""
+The suite module benchmarks the hot paths of the game offline, against fixture characters and a local mock API.
+
+It measures team preparation (Team.update_characters, with and without precomputed tables), attack calculation (Character.calculate_attack), a full headless
+fight (with and without a binary event log), a fight between teams of thousands of characters (with random and targeting
+policies), team rendering (Character.__str__ and the frames of Renderer after an attack) and roster fetching (Battle.get_teams) against a local mock HTTP server of the
+superhero API with a configurable latency. Results are written as JSON, and can be compared against a stored baseline
+to flag regressions.
+
+Functions:
+    run_suite: Runs every benchmark and returns the results.
+    compare: Compares results against a baseline and returns the regressions.
+    run: Runs the suite from the options of the command line.
+
+Example:
+    To store a baseline and compare a later run against it, run
+    `python -m benchmarks.suite run --output baseline.json`, then
+    `python -m benchmarks.suite run --output current.json --baseline baseline.json` (or `python main.py bench ...`).
+"""
+from __future__ import annotations
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import TYPE_CHECKING, Callable
+from modules.character import STATS, Character
+from modules.engine import Policy, simulate
+from modules.events import BinarySink, EventSink
+from modules.policies import FocusFirePolicy, GreedyPolicy
+from modules.renderer import Renderer
+from modules.team import Team
+
+if TYPE_CHECKING:
+    from modules.tables import HeroTables
+
+# sample characters, like the ones of the unit tests
+CHARACTERS_DATA = [
+    {"name": "Test Character 1", "alignment": "good", "combat": "17", "durability": "80", "intelligence": "37",
+     "power": "66", "speed": "32", "strength": "33"},
+    {"name": "Test Character 2", "alignment": "bad", "combat": "84", "durability": "64", "intelligence": "90",
+     "power": "32", "speed": "34", "strength": "5"},
+    {"name": "Test Character 3", "alignment": "good", "combat": "55", "durability": "7", "intelligence": "90",
+     "power": "40", "speed": "92", "strength": "23"},
+    {"name": "Test Character 4", "alignment": "bad", "combat": "54", "durability": "93", "intelligence": "47",
+     "power": "58", "speed": "17", "strength": "79"},
+    {"name": "Test Character 5", "alignment": "good", "combat": "36", "durability": "88", "intelligence": "43",
+     "power": "83", "speed": "58", "strength": "24"}
+]
+
+def make_team(rng: random.Random, size: int = len(CHARACTERS_DATA)) -> Team:
+    """
+    Args:
+        rng (random.Random): The RNG used for the draws of the team.
+        size (int): The number of characters of the team, the fixture characters being repeated in larger teams.
+
+    Returns:
+        Team: A team of the fixture characters, not prepared yet.
+    """
+    return Team([Character(CHARACTERS_DATA[i % len(CHARACTERS_DATA)], rng) for i in range(size)])
+
+def prepared_teams(rng: random.Random, size: int = len(CHARACTERS_DATA)) -> tuple[Team, Team]:
+    """
+    Args:
+        rng (random.Random): The RNG used for the draws of the teams.
+        size (int): The number of characters of each team.
+
+    Returns:
+        tuple[Team, Team]: Two teams of the fixture characters, ready to battle.
+    """
+    teams = make_team(rng, size), make_team(rng, size)
+    for team in teams:
+        team.set_team_alignment()
+        team.update_characters(rng)
+    return teams
+
+def measure(operation: Callable[[], object], iterations: int, repeat: int) -> dict[str, float]:
+    """
+    Measures the time of an operation.
+
+    Args:
+        operation (Callable[[], object]): The operation.
+        iterations (int): The number of times the operation runs per measure.
+        repeat (int): The number of measures.
+
+    Returns:
+        dict[str, float]: The minimum, median and mean time of an operation in seconds, and the number of iterations.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            operation()
+        times.append((time.perf_counter() - start) / iterations)
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "iterations": iterations * repeat
+    }
+
+def bench_update_characters(iterations: int, repeat: int, tables: "HeroTables | None" = None) -> dict[str, float]:
+    rng = random.Random(0)
+    def operation() -> None:
+        team = make_team(rng)
+        team.set_team_alignment()
+        team.update_characters(rng, tables)
+    return measure(operation, iterations, repeat)
+
+def bench_update_characters_tables(iterations: int, repeat: int) -> dict[str, float]:
+    import numpy as np
+    from modules.tables import HeroTables, build_tables
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "tables.npy")
+        np.save(path, build_tables(dict(enumerate(CHARACTERS_DATA))))
+        return bench_update_characters(iterations, repeat, HeroTables(path))
+
+def bench_calculate_attack(iterations: int, repeat: int) -> dict[str, float]:
+    character = prepared_teams(random.Random(0))[0].characters[0]
+    return measure(lambda: character.calculate_attack(["intelligence", "speed", "combat"], [.7, .2, .1]), iterations, repeat)
+
+def bench_fight(iterations: int, repeat: int, sink: EventSink | None = None) -> dict[str, float]:
+    rng = random.Random(0)
+    snapshots = [prepared_teams(rng) for _ in range(8)]
+    hp = [[[character.hp for character in team.characters] for team in teams] for teams in snapshots]
+    count = iter(range(sys.maxsize))
+
+    def operation() -> None:
+        i = next(count) % len(snapshots)
+        teams = snapshots[i]
+        # restore the HP of the teams before every fight
+        for team, team_hp in zip(teams, hp[i]):
+            for character, character_hp in zip(team.characters, team_hp):
+                character.hp = character_hp
+        simulate(teams, rng, record_hits=False, sink=sink, battle=i)
+    return measure(operation, iterations, repeat)
+
+def bench_large_fight(
+    iterations: int, repeat: int, team_size: int, policies: tuple[Policy, Policy] = (Policy(), Policy())
+) -> dict[str, float]:
+    # a single fight between two large teams, whose HP is restored before every fight
+    rng = random.Random(0)
+    teams = prepared_teams(rng, team_size)
+    hp = [[character.hp for character in team.characters] for team in teams]
+
+    def operation() -> None:
+        for team, team_hp in zip(teams, hp):
+            for character, character_hp in zip(team.characters, team_hp):
+                character.hp = character_hp
+        simulate(teams, rng, policies, record_hits=False)
+    return {**measure(operation, iterations, repeat), "team_size": team_size}
+
+def bench_fight_logged(iterations: int, repeat: int) -> dict[str, float]:
+    # the fight benchmark, with every hit logged to a binary event log
+    with tempfile.TemporaryDirectory() as directory, BinarySink(os.path.join(directory, "hits.bin")) as sink:
+        return bench_fight(iterations, repeat, sink)
+
+def bench_render(iterations: int, repeat: int) -> dict[str, float]:
+    characters = [character for team in prepared_teams(random.Random(0)) for character in team.characters]
+    return measure(lambda: "".join(str(character) for character in characters), iterations, repeat)
+
+def bench_render_frame(iterations: int, repeat: int) -> dict[str, float]:
+    teams = dict(zip(("Team 1", "Team 2"), prepared_teams(random.Random(0))))
+    renderer = Renderer(io.StringIO(), fast=True)
+    victim = teams["Team 2"].characters[0]
+
+    def operation() -> None:
+        # a frame after an attack, in which a single character changed
+        victim.hp = victim.hp - 1 if victim.hp > 1 else 1000
+        renderer.render(teams)
+        renderer.output.seek(0)
+        renderer.output.truncate()
+    return measure(operation, iterations, repeat)
+
+async def start_mock_api(latency: float, invalid_every: int = 7):
+    """
+    Starts a local mock of the superhero API, serving the fixture characters.
+
+    Args:
+        latency (float): The time in seconds the server waits before answering a request.
+        invalid_every (int): Every character whose ID is a multiple of this number has null powerstats.
+
+    Returns:
+        tuple[web.AppRunner, str]: The runner of the server, to clean it up, and the base URL of the API.
+    """
+    import asyncio
+    from aiohttp import web
+
+    async def handle(request: web.Request) -> web.Response:
+        await asyncio.sleep(latency)
+        character_id = int(request.match_info["character_id"])
+        data = CHARACTERS_DATA[character_id % len(CHARACTERS_DATA)]
+        if request.match_info["endpoint"] == "biography":
+            return web.json_response({"response": "success", "id": str(character_id), "alignment": data["alignment"]})
+        stats = {stat: "null" if character_id % invalid_every == 0 else data[stat] for stat in STATS}
+        return web.json_response(
+            {"response": "success", "id": str(character_id), "name": f"{data['name']} #{character_id}", **stats}
+        )
+
+    app = web.Application()
+    app.router.add_get("/api/key/{character_id}/{endpoint}", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # pylint: disable=protected-access
+    return runner, f"http://127.0.0.1:{port}/api/key/"
+
+def bench_get_teams(iterations: int, repeat: int, latency: float) -> dict[str, float]:
+    import asyncio
+    from modules.api import ApiClient
+    from modules.battle import Battle
+
+    async def measure_fetches() -> dict[str, float]:
+        runner, base_url = await start_mock_api(latency)
+        try:
+            times = []
+            for i in range(repeat * iterations):
+                battle = Battle.fetcher(ApiClient(base_url, rate=1000, burst=1000), seed=i)
+                start = time.perf_counter()
+                # no loading line: the fetch would print a redraw after every candidate during the measure
+                await battle.get_teams(show_progress=False)
+                times.append(time.perf_counter() - start)
+                await battle.client.aclose()
+        finally:
+            await runner.cleanup()
+        return {
+            "min": min(times),
+            "median": statistics.median(times),
+            "mean": statistics.fmean(times),
+            "iterations": len(times),
+            "latency": latency
+        }
+    return asyncio.run(measure_fetches())
+
+def run_suite(scale: float = 1, latency: float = .05) -> dict:
+    """
+    Runs every benchmark.
+
+    Args:
+        scale (float): The factor applied to the number of iterations of every benchmark.
+        latency (float): The latency in seconds of the mock API.
+
+    Returns:
+        dict: The results of the benchmarks, keyed by benchmark name, with information about the environment.
+    """
+    def n(iterations: int) -> int:
+        return max(1, round(iterations * scale))
+
+    results = {
+        "update_characters": bench_update_characters(n(2000), 5),
+        "update_characters_tables": bench_update_characters_tables(n(2000), 5),
+        "calculate_attack": bench_calculate_attack(n(20000), 5),
+        "fight": bench_fight(n(500), 5),
+        "fight_logged": bench_fight_logged(n(500), 5),
+        "large_fight": bench_large_fight(n(2), 3, 10_000),
+        "large_fight_policies": bench_large_fight(n(2), 3, 10_000, (GreedyPolicy(), FocusFirePolicy())),
+        "render": bench_render(n(2000), 5),
+        "render_frame": bench_render_frame(n(2000), 5),
+        # network-bound and noisy: the median is taken over more fetches
+        "get_teams": bench_get_teams(n(10), 3, latency)
+    }
+    return {"python": platform.python_version(), "platform": platform.platform(), "results": results}
+
+def compare(baseline: dict, current: dict, threshold: float = .2) -> list[str]:
+    """
+    Compares results against a baseline.
+
+    Args:
+        baseline (dict): The results of the baseline.
+        current (dict): The results to compare.
+        threshold (float): The relative slowdown of the median time from which a benchmark is a regression.
+
+    Returns:
+        list[str]: A description of each regression.
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        ratio = result["median"] / baseline["results"][name]["median"]
+        if ratio > 1 + threshold:
+            regressions.append(f"{name}: {ratio:.2f}x slower than the baseline")
+    return regressions
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Adds the options of a run of the suite to a command-line parser.
+
+    Args:
+        parser (argparse.ArgumentParser): The parser.
+    """
+    parser.add_argument("--output", help="file where the results are written as JSON")
+    parser.add_argument("--baseline", help="results to compare against")
+    parser.add_argument("--threshold", type=float, default=.2, help="relative slowdown flagged as a regression")
+    parser.add_argument("--scale", type=float, default=1, help="factor applied to the number of iterations")
+    parser.add_argument("--latency", type=float, default=.05, help="latency of the mock API, in seconds")
+
+def run(args: argparse.Namespace) -> int:
+    """
+    Runs the suite with the options of the command line, prints the results and the regressions.
+
+    Args:
+        args (argparse.Namespace): The options added by add_arguments.
+
+    Returns:
+        int: The exit code, 1 if regressions were found against the baseline.
+    """
+    current = run_suite(args.scale, args.latency)
+    for name, result in current["results"].items():
+        print(f"{name:>20}: {result['median'] * 1e6:12.1f} µs (median of {result['iterations']} iterations)")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(current, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(json.load(file), current, args.threshold)
+        for regression in regressions:
+            print(f"❌ {regression}")
+        if regressions:
+            return 1
+        print("✅ No regressions against the baseline")
+    return 0
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Runs the benchmark suite from the command line.
+
+    Args:
+        argv (list[str] | None): The command-line arguments, those of the process if not provided.
+
+    Returns:
+        int: The exit code, 1 if regressions were found against the baseline.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of the game.")
+    parser.add_argument("command", choices=["run"])
+    add_arguments(parser)
+    return run(parser.parse_args(argv))
+
+if __name__ == "__main__":
+    sys.exit(main())
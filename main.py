@@ -1,41 +1,412 @@
 """
-The main module orchestrates the execution of the superhero battle game.
+The main module is the command-line interface of the superhero battle game.
 
-It defines two main functions: play and main.
+It defines a subcommand per task, each importing only the modules it needs so the interface starts fast: asyncio and
+aiohttp are only imported by the commands that call the API, and NumPy only when the win probability is printed.
+    - play: Plays battles interactively until the player ends the game (the default command).
+    - simulate: Runs headless battles between random teams of the local catalog on several processes, and prints
+      aggregate stats.
+    - bench: Runs the benchmark suite of the hot paths of the game.
+    - catalog warm: Fills the local catalog with every character of the API.
+    - catalog tables: Precomputes the battle attributes of the characters of the catalog (see the tables module).
+    - serve: Hosts battles for remote players on a TCP server (see the server module).
+    - draft: Searches the local catalog for the team with the highest expected win rate (see the draft module).
 
 Functions:
     play: Initialize and start a battle between two teams of superheroes.
-    main: The main function to run the game loop, allowing the player to play the game multiple times until they choose to end it.
+    positive_int: Parse a command-line argument that must be a positive integer.
+    main: Run a command of the command-line interface.
 
 Example:
-    To start the game, run this module directly by executing `python main.py`.
+    To start the game, run this module directly by executing `python main.py` (or `python main.py play`).
 
     This will initialize the game loop, where the player can play multiple rounds of the game. After each round, the player is prompted to choose whether they want to play again. They can end the game by pressing Enter when prompted.
 
     If the player chooses to play again, a new battle will be initiated. Otherwise, the game loop will end.
+
+    To simulate 10,000 battles on 4 processes, run `python main.py simulate --battles 10000 --workers 4 --seed 1`.
+    Add `--balance balance.json` to aggregate per-hero balance statistics of the battles into balance.json.
 """
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from typing import TYPE_CHECKING
+from benchmarks.suite import add_arguments as add_bench_arguments
+from modules.catalog import DEFAULT_PATH
+from modules.tables import DEFAULT_PATH as DEFAULT_TABLES_PATH
+
+if TYPE_CHECKING:
+    from modules.api import ApiClient
+    from modules.battle import Battle, PrefetchedRoster
+    from modules.catalog import HeroCatalog
+
+COMMANDS = ("play", "simulate", "bench", "catalog", "serve", "draft")
+
+def base_url() -> str:
+    """
+    Returns:
+        str: The base URL of the superhero API, with the API key of utils/constants.py.
+    """
+    from utils.constants import API_KEY
 
-from modules.battle import Battle
-from utils.constants import API_KEY
+    return f"https://superheroapi.com/api/{API_KEY}/"
 
-def play():
+def positive_int(value: str) -> int:
+    """
+    Parses a command-line argument that must be a positive integer.
+
+    Args:
+        value (str): The argument.
+
+    Returns:
+        int: The integer.
+
+    Raises:
+        argparse.ArgumentTypeError: If the argument is not an integer of at least 1.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value!r} is not a positive integer")
+    return number
+
+def play(
+    catalog: "HeroCatalog | None" = None,
+    client: "ApiClient | None" = None,
+    show_odds: bool = False,
+    roster: "PrefetchedRoster | None" = None,
+    fast: bool = False,
+    team_size: int = 5
+) -> "Battle":
     """
     Initialize and start a battle.
+
+    With a shared client, the roster of the next battle is fetched in the background while this one is played.
+
+    Args:
+        catalog (HeroCatalog | None): The local catalog used in front of the superhero API, if any.
+        client (ApiClient | None): The client of the superhero API shared by successive battles, if any.
+        show_odds (bool): Whether to print the win probability of each team before the fight.
+        roster (PrefetchedRoster | None): The roster prefetched during the previous battle, if any.
+        fast (bool): Whether to turn off the pauses of the display.
+        team_size (int): The number of characters in a team.
+
+    Returns:
+        Battle: The finished battle.
+    """
+    from modules.battle import Battle
+
+    return Battle(
+        base_url(),
+        catalog=catalog,
+        client=client,
+        show_odds=show_odds,
+        roster=roster,
+        prefetch_next=client is not None,
+        fast=fast,
+        team_size=team_size
+    )
+
+def run_play(args: argparse.Namespace) -> int:
+    """
+    Runs the game in a loop until the player ends it.
+
+    Args:
+        args (argparse.Namespace): The options of the play command.
+
+    Returns:
+        int: The exit code.
+    """
+    from modules.api import ApiClient
+    from modules.catalog import HeroCatalog
+    from modules.instrumentation import session
+
+    catalog = HeroCatalog()
+    # the client keeps its connections alive between battles, and fetches the next roster during a battle
+    with session(args.stats, args.profile, args.trace), ApiClient(base_url()) as client:
+        roster = None
+        play_again = True
+        while play_again:
+            roster = play(catalog, client, args.odds, roster, args.fast, args.team_size).next_roster
+            play_again_input = input(
+                "\n[PLAY AGAIN?]\nEnter 'y' if you want to play again. Press 'Enter' to end the game: ").lower()
+            if play_again_input != 'y':
+                play_again = False
+        if roster is not None:
+            # the player quit: the prefetched roster is discarded
+            roster.future.cancel()
+    return 0
+
+def run_simulate(args: argparse.Namespace) -> int:
+    """
+    Runs headless battles between random teams of the local catalog, and prints aggregate stats.
+
+    Every battle is seeded from the master seed and its index, so the stats only depend on the seed and the catalog,
+    whatever the number of workers. Results are aggregated as they stream in, without keeping them. With --balance, the
+    per-hero balance statistics of the battles are added to those of the checkpoint file (if it exists), which is
+    rewritten periodically and when the run ends, and printed as a table.
+
+    Args:
+        args (argparse.Namespace): The options of the simulate command.
+
+    Returns:
+        int: The exit code, 1 if the catalog doesn't have enough valid characters.
+    """
+    from collections import Counter
+    from modules.analytics import BalanceStats, RunningMoments, median_of_counts
+    from modules.catalog import HeroCatalog
+    from modules.rng import new_seed
+    from modules.tournament import Tournament
+
+    tables = None
+    if args.tables is not None:
+        from modules.tables import HeroTables
+
+        tables = HeroTables(args.tables)
+
+    catalog = HeroCatalog(args.catalog)
+    roster = catalog.valid_heroes()
+    catalog.close()
+    if len(roster) < args.team_size:
+        print(f"❌ The catalog has {len(roster)} valid characters: run `python main.py catalog warm` first.")
+        return 1
+
+    seed = args.seed if args.seed is not None else new_seed()
+    tournament = Tournament(
+        roster,
+        2 * args.battles,
+        seed,
+        team_size=args.team_size,
+        workers=args.workers,
+        tables=tables,
+        analytics=args.balance is not None
+    )
+    if args.balance is not None and os.path.exists(args.balance):
+        tournament.balance = BalanceStats.load(args.balance)
+        print(f"📈 Resuming the balance statistics of {tournament.balance.battles:,} battles")
+    start = last_checkpoint = time.perf_counter()
+    rounds = RunningMoments()
+    round_counts: Counter[int] = Counter()  # battles per number of rounds, for the exact median
+    first_wins = 0
+    for result in tournament.pairs():
+        rounds.add(result.rounds)
+        round_counts[result.rounds] += 1
+        first_wins += result.winner == result.teams[0]
+        if args.balance is not None and time.perf_counter() - last_checkpoint >= args.checkpoint_every:
+            tournament.balance.save(args.balance)
+            last_checkpoint = time.perf_counter()
+    elapsed = time.perf_counter() - start
+
+    n = rounds.count
+    print(f"⚔️ {n} battles in {elapsed:.2f} s ({n / elapsed:,.0f} battles/s), seed {seed}")
+    print(f"First team to attack wins {first_wins / n:.1%} of the battles")
+    print(f"Rounds: mean {rounds.mean:.1f}, median {median_of_counts(round_counts):g}, max {rounds.max:g}")
+    top = tournament.character_ratings.ranking()[:5]
+    print("Top characters: " + ", ".join(
+        f"{roster[character_id].get('name', character_id)} ({rating:.0f})" for character_id, rating in top
+    ))
+    if args.balance is not None:
+        tournament.balance.save(args.balance)
+        print(f"\n📈 Balance of {tournament.balance.battles:,} battles (saved to {args.balance}):")
+        print(tournament.balance.format_table(args.balance_rows))
+    return 0
+
+def run_serve(args: argparse.Namespace) -> int:
+    """
+    Hosts battles between remote players and the CPU, with the characters of the local catalog, until interrupted.
+
+    Args:
+        args (argparse.Namespace): The options of the serve command.
+
+    Returns:
+        int: The exit code, 1 if the catalog doesn't have enough valid characters.
+    """
+    import asyncio
+    from modules.catalog import HeroCatalog
+    from modules.server import BattleServer
+
+    tables = None
+    if args.tables is not None:
+        from modules.tables import HeroTables
+
+        tables = HeroTables(args.tables)
+
+    catalog = HeroCatalog(args.catalog)
+    roster = catalog.valid_heroes()
+    catalog.close()
+    if len(roster) < args.team_size:
+        print(f"❌ The catalog has {len(roster)} valid characters: run `python main.py catalog warm` first.")
+        return 1
+
+    server = BattleServer(roster, tables, args.seed, args.team_size, args.cpu_policy)
+    try:
+        asyncio.run(server.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\n👋 Server stopped")
+    return 0
+
+def run_draft(args: argparse.Namespace) -> int:
+    """
+    Searches the local catalog for the team with the highest expected win rate, and prints it.
+
+    Args:
+        args (argparse.Namespace): The options of the draft command.
+
+    Returns:
+        int: The exit code, 1 if no team can be drafted.
+    """
+    from modules.catalog import HeroCatalog
+    from modules.draft import draft
+
+    catalog = HeroCatalog(args.catalog)
+    roster = catalog.valid_heroes()
+    catalog.close()
+    opponent = args.opponent.split(",") if args.opponent else None
+
+    start = time.perf_counter()
+    try:
+        result = draft(roster, opponent, args.alignment, args.team_size, args.lineups, args.samples, args.seed)
+    except ValueError as error:
+        print(f"❌ {error}")
+        return 1
+    elapsed = time.perf_counter() - start
+
+    against = "the opponent" if opponent is not None else "random teams"
+    print(f"🏆 Best {result.team_alignment} team against {against} (win rate {result.win_rate:.1%}):")
+    for character_id in result.ids:
+        print(f"  {roster[character_id]['name']} ({character_id}, {roster[character_id]['alignment']})")
+    print(f"{result.lineups} lineups scored, {result.explored} partial lineups explored in {elapsed:.2f} s")
+    return 0
+
+def run_bench(args: argparse.Namespace) -> int:
+    """
+    Runs the benchmark suite.
+
+    Args:
+        args (argparse.Namespace): The options of the bench command.
+
+    Returns:
+        int: The exit code, 1 if regressions were found against the baseline.
+    """
+    from benchmarks import suite
+
+    return suite.run(args)
+
+def run_catalog(args: argparse.Namespace) -> int:
+    """
+    Manages the local catalog.
+
+    Args:
+        args (argparse.Namespace): The options of the catalog command.
+
+    Returns:
+        int: The exit code.
     """
-    base_url = f"https://superheroapi.com/api/{API_KEY}/"
-    Battle(base_url)
+    if args.action == "tables":
+        from modules.tables import save_tables
 
-def main():
+        stored = save_tables(args.path, args.output)
+        print(f"✅ Tables of {stored} characters written to {args.output}")
+        return 0
+
+    from modules import catalog
+
+    catalog.warm(args.path)
+    return 0
+
+def build_parser() -> argparse.ArgumentParser:
     """
-    Main function to run the game in a loop until user ends it.
+    Returns:
+        argparse.ArgumentParser: The parser of the command line, with a subparser per command.
+    """
+    parser = argparse.ArgumentParser(description="Play and analyze the superhero battle game.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    play_parser = commands.add_parser("play", help="play battles interactively (the default command)")
+    play_parser.add_argument("--odds", action="store_true", help="print the win probability of each team (needs NumPy)")
+    play_parser.add_argument("--fast", action="store_true", help="display the battle without any pause")
+    play_parser.add_argument("--team-size", type=positive_int, default=5, help="number of characters in a team")
+    play_parser.add_argument("--stats", action="store_true", help="print where the time of the game went when it ends")
+    play_parser.add_argument("--profile", metavar="PATH", help="write a cProfile capture (pstats) to PATH (or set FIGHT_PROFILE)")
+    play_parser.add_argument("--trace", metavar="PATH", help="write a Chrome trace JSON to PATH (or set FIGHT_TRACE)")
+    play_parser.set_defaults(run=run_play)
+
+    simulate_parser = commands.add_parser("simulate", help="run headless battles and print aggregate stats")
+    simulate_parser.add_argument("--battles", type=positive_int, default=1000, help="number of battles")
+    simulate_parser.add_argument("--workers", type=int, help="number of worker processes (default: number of CPUs)")
+    simulate_parser.add_argument("--seed", type=int, help="master seed of the battles (default: a fresh one)")
+    simulate_parser.add_argument("--team-size", type=positive_int, default=5, help="number of characters in a team")
+    simulate_parser.add_argument("--catalog", default=DEFAULT_PATH, help="path of the local catalog")
+    simulate_parser.add_argument("--tables", metavar="PATH", help="precomputed tables of the catalog (needs NumPy)")
+    simulate_parser.add_argument(
+        "--balance", metavar="PATH", help="aggregate per-hero balance statistics, checkpointed to PATH (JSON)"
+    )
+    simulate_parser.add_argument(
+        "--checkpoint-every", type=float, default=60, metavar="SECONDS", help="interval of the balance checkpoints"
+    )
+    simulate_parser.add_argument("--balance-rows", type=int, default=20, help="number of heroes of the balance table")
+    simulate_parser.set_defaults(run=run_simulate)
+
+    serve_parser = commands.add_parser("serve", help="host battles for remote players")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="interface the server listens on")
+    serve_parser.add_argument("--port", type=int, default=8765, help="port the server listens on")
+    serve_parser.add_argument("--seed", type=int, help="master seed of the matches (default: a fresh one)")
+    serve_parser.add_argument("--team-size", type=positive_int, default=5, help="number of characters in a team")
+    # the lookahead policy would search on the event loop shared by every match
+    serve_parser.add_argument(
+        "--cpu-policy", default="random", choices=["random", "greedy", "focus"], help="strategy of the CPU"
+    )
+    serve_parser.add_argument("--catalog", default=DEFAULT_PATH, help="path of the local catalog")
+    serve_parser.add_argument("--tables", metavar="PATH", help="precomputed tables of the catalog (needs NumPy)")
+    serve_parser.set_defaults(run=run_serve)
+
+    draft_parser = commands.add_parser("draft", help="search the catalog for the strongest team (needs NumPy)")
+    draft_parser.add_argument(
+        "--opponent", metavar="IDS", help="comma-separated IDs of the opponent team (default: random teams)"
+    )
+    draft_parser.add_argument("--alignment", choices=["good", "bad"], help="alignment of the team (default: both)")
+    draft_parser.add_argument("--team-size", type=positive_int, default=5, help="number of characters in a team")
+    draft_parser.add_argument("--lineups", type=int, default=64, help="number of lineups scored per alignment")
+    draft_parser.add_argument("--samples", type=int, default=256, help="number of battles simulated per lineup")
+    draft_parser.add_argument("--seed", type=int, help="seed of the simulated battles (default: a fresh one)")
+    draft_parser.add_argument("--catalog", default=DEFAULT_PATH, help="path of the local catalog")
+    draft_parser.set_defaults(run=run_draft)
+
+    bench_parser = commands.add_parser("bench", help="run the benchmark suite")
+    add_bench_arguments(bench_parser)
+    bench_parser.set_defaults(run=run_bench)
+
+    catalog_parser = commands.add_parser("catalog", help="manage the local catalog")
+    catalog_parser.add_argument(
+        "action", choices=["warm", "tables"],
+        help="fetch every character missing from the catalog (warm), or precompute their attributes (tables, needs NumPy)"
+    )
+    catalog_parser.add_argument("--path", default=DEFAULT_PATH, help="path of the local catalog")
+    catalog_parser.add_argument("--output", default=DEFAULT_TABLES_PATH, help="path of the tables")
+    catalog_parser.set_defaults(run=run_catalog)
+    return parser
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Runs a command of the command-line interface, the game if no command is given.
+
+    Args:
+        argv (list[str] | None): The command-line arguments, those of the process if not provided.
+
+    Returns:
+        int: The exit code.
     """
-    play_again = True
-    while play_again:
-        play()
-        play_again_input = input(
-            "\n[PLAY AGAIN?]\nEnter 'y' if you want to play again. Press 'Enter' to end the game: ").lower()
-        if play_again_input != 'y':
-            play_again = False
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in (*COMMANDS, "-h", "--help"):
+        # `python main.py [--odds] [--fast]` plays, as before the subcommands
+        argv = ["play", *argv]
+    args = build_parser().parse_args(argv)
+    return args.run(args)
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
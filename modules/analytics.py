@@ -0,0 +1,509 @@
+"""
+The analytics module aggregates per-hero balance statistics over many simulated battles, in memory that doesn't grow
+with the number of battles.
+
+Every appearance of a character in a battle is aggregated into the statistics of its hero, keyed by name and alignment:
+the battles played and won, the damage of each hit dealt and received per attack type, the total damage dealt and
+received per battle, the rounds survived (until the character is defeated, or the whole battle), and the filiation
+coefficient drawn by Team.update_characters, with the win rate split between characters sharing the alignment of their
+team (a coefficient from 1 to 10) and the others (from 1/10 to 1), which measures how much the coefficient matters.
+
+Distributions are kept as running moments (count, mean and variance by Welford's algorithm, minimum and maximum) and as
+quantile sketches: a sketch counts values in logarithmic buckets, so every quantile is estimated within a relative
+accuracy (2% by default) from a bounded number of buckets. Both merge exactly and cheaply (moments by Chan's formula,
+sketches by adding the counts of their buckets), so each worker process of a tournament aggregates its own battles and
+the aggregates are merged as they come back (see Tournament). The statistics are checkpointed to a JSON file, which
+can be loaded to resume a run, and summarized as a table.
+
+Classes:
+    RunningMoments: Represents the running moments of a stream of values.
+    QuantileSketch: Represents a mergeable sketch of the quantiles of a stream of non-negative values.
+    Distribution: Represents the moments and the quantile sketch of a stream of values.
+    HeroStats: Represents the statistics of a hero.
+    HeroSummary: A row of the summary table.
+    BalanceStats: Represents the statistics of every hero over many battles.
+
+Functions:
+    median_of_counts: Computes the exact median of values from their counts.
+
+Example:
+    To aggregate the battles of a tournament, create it with `Tournament(..., analytics=True)` and play it, then print
+    `tournament.balance.format_table()`, or run `python main.py simulate --battles 1000000 --balance balance.json`.
+"""
+from __future__ import annotations
+import bisect
+import itertools
+import json
+import math
+import os
+from typing import TYPE_CHECKING, NamedTuple
+from modules.engine import ATTACK_TYPES
+
+if TYPE_CHECKING:
+    from modules.engine import BattleResult
+    from modules.team import Team
+
+RELATIVE_ACCURACY = .02
+MAX_BUCKETS = 512
+
+def median_of_counts(counts: dict[int, int]) -> float:
+    """
+    Computes the exact median of values from their counts, e.g. of the rounds of battles, which take few distinct
+    values.
+
+    Args:
+        counts (dict[int, int]): The number of occurrences of each value.
+
+    Returns:
+        float: The median of the values, the mean of the two middle ones for an even number of values.
+    """
+    values = sorted(value for value, count in counts.items() if count > 0)
+    # number of occurrences of the values up to each one
+    cumulative = list(itertools.accumulate(counts[value] for value in values))
+    n = cumulative[-1]
+    lower = values[bisect.bisect_right(cumulative, (n - 1) // 2)]
+    upper = values[bisect.bisect_right(cumulative, n // 2)]
+    return (lower + upper) / 2
+
+class RunningMoments:
+    __slots__ = ("count", "mean", "m2", "min", "max")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of the squared deviations from the mean
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float) -> None:
+        """
+        Adds a value to the stream.
+
+        Args:
+            value (float): The value.
+        """
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "RunningMoments") -> None:
+        """
+        Adds the values of another stream, as if they had been added one by one.
+
+        Args:
+            other (RunningMoments): The moments of the other stream.
+        """
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def std(self) -> float:
+        """
+        Returns:
+            float: The standard deviation of the values (0 for less than two values).
+        """
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def to_json(self) -> list[float]:
+        return [self.count, self.mean, self.m2, self.min, self.max] if self.count else [0]
+
+    @classmethod
+    def from_json(cls, data: list[float]) -> "RunningMoments":
+        moments = cls()
+        if data[0]:
+            moments.count, moments.mean, moments.m2, moments.min, moments.max = data
+        return moments
+
+class QuantileSketch:
+    __slots__ = ("relative_accuracy", "gamma", "log_gamma", "max_buckets", "buckets", "zeros", "count")
+
+    def __init__(self, relative_accuracy: float = RELATIVE_ACCURACY, max_buckets: int = MAX_BUCKETS) -> None:
+        """
+        Initializes the QuantileSketch object, without any value.
+
+        A value x > 0 is counted in the bucket k such that gamma^(k-1) < x <= gamma^k, with
+        gamma = (1 + accuracy) / (1 - accuracy), and estimated as the middle of its bucket: every estimated quantile is
+        within the relative accuracy of the true one. Values spanning more than max_buckets buckets (e.g. from 1 to
+        2.2e8 with 2% accuracy and 512 buckets) lose the accuracy of their lowest quantiles, whose buckets are merged.
+
+        Args:
+            relative_accuracy (float): The relative accuracy of the quantiles.
+            max_buckets (int): The maximum number of buckets of the sketch.
+        """
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.buckets: dict[int, int] = {}  # number of values per bucket index
+        self.zeros = 0  # number of values <= 0, which can't be counted in a logarithmic bucket
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        """
+        Adds a value to the sketch.
+
+        Args:
+            value (float): The value, negative values being counted as 0.
+        """
+        self.count += 1
+        if value <= 0:
+            self.zeros += 1
+            return
+        key = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        if len(self.buckets) > self.max_buckets:
+            self.collapse()
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """
+        Adds the values of another sketch, of the same accuracy.
+
+        Args:
+            other (QuantileSketch): The other sketch.
+
+        Raises:
+            ValueError: If the sketches don't have the same accuracy.
+        """
+        if other.gamma != self.gamma:
+            raise ValueError("can't merge sketches of different accuracies")
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        if len(self.buckets) > self.max_buckets:
+            self.collapse()
+
+    def collapse(self) -> None:
+        """
+        Merges the lowest buckets until the sketch has at most max_buckets buckets.
+        """
+        keys = sorted(self.buckets)
+        excess = len(keys) - self.max_buckets
+        lowest = keys[excess]
+        self.buckets[lowest] += sum(self.buckets.pop(key) for key in keys[:excess])
+
+    def quantile(self, q: float) -> float:
+        """
+        Args:
+            q (float): The quantile, from 0 to 1 (e.g. 0.5 for the median).
+
+        Returns:
+            float: The estimated quantile of the values, NaN without any value.
+        """
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def to_json(self) -> dict:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "max_buckets": self.max_buckets,
+            "zeros": self.zeros,
+            "buckets": sorted(self.buckets.items())
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "QuantileSketch":
+        sketch = cls(data["relative_accuracy"], data["max_buckets"])
+        sketch.buckets = dict((key, count) for key, count in data["buckets"])
+        sketch.zeros = data["zeros"]
+        sketch.count = sketch.zeros + sum(sketch.buckets.values())
+        return sketch
+
+class Distribution:
+    __slots__ = ("moments", "sketch")
+
+    def __init__(self, relative_accuracy: float = RELATIVE_ACCURACY) -> None:
+        self.moments = RunningMoments()
+        self.sketch = QuantileSketch(relative_accuracy)
+
+    def add(self, value: float) -> None:
+        self.moments.add(value)
+        self.sketch.add(value)
+
+    def merge(self, other: "Distribution") -> None:
+        self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+
+    def to_json(self) -> dict:
+        return {"moments": self.moments.to_json(), "sketch": self.sketch.to_json()}
+
+    @classmethod
+    def from_json(cls, data: dict) -> "Distribution":
+        distribution = cls.__new__(cls)
+        distribution.moments = RunningMoments.from_json(data["moments"])
+        distribution.sketch = QuantileSketch.from_json(data["sketch"])
+        return distribution
+
+class HeroStats:
+    __slots__ = (
+        "battles", "wins", "aligned_battles", "aligned_wins", "fb", "hits_dealt", "hits_received", "damage_dealt",
+        "damage_received", "rounds_survived"
+    )
+
+    def __init__(self, relative_accuracy: float = RELATIVE_ACCURACY) -> None:
+        """
+        Initializes the HeroStats object, without any battle.
+
+        Args:
+            relative_accuracy (float): The relative accuracy of the quantiles.
+        """
+        self.battles = 0
+        self.wins = 0
+        # battles and wins in a team of the hero's alignment, with a filiation coefficient from 1 to 10
+        self.aligned_battles = 0
+        self.aligned_wins = 0
+        self.fb = RunningMoments()
+        # damage of each hit dealt and received, per attack type
+        self.hits_dealt = [RunningMoments() for _ in ATTACK_TYPES]
+        self.hits_received = [RunningMoments() for _ in ATTACK_TYPES]
+        # total damage dealt and received, and rounds survived, per battle
+        self.damage_dealt = Distribution(relative_accuracy)
+        self.damage_received = Distribution(relative_accuracy)
+        self.rounds_survived = Distribution(relative_accuracy)
+
+    def merge(self, other: "HeroStats") -> None:
+        """
+        Adds the battles of other statistics of the hero.
+
+        Args:
+            other (HeroStats): The other statistics.
+        """
+        self.battles += other.battles
+        self.wins += other.wins
+        self.aligned_battles += other.aligned_battles
+        self.aligned_wins += other.aligned_wins
+        self.fb.merge(other.fb)
+        for moments, other_moments in zip(self.hits_dealt + self.hits_received, other.hits_dealt + other.hits_received):
+            moments.merge(other_moments)
+        self.damage_dealt.merge(other.damage_dealt)
+        self.damage_received.merge(other.damage_received)
+        self.rounds_survived.merge(other.rounds_survived)
+
+    def to_json(self) -> dict:
+        return {
+            "battles": self.battles,
+            "wins": self.wins,
+            "aligned_battles": self.aligned_battles,
+            "aligned_wins": self.aligned_wins,
+            "fb": self.fb.to_json(),
+            "hits_dealt": [moments.to_json() for moments in self.hits_dealt],
+            "hits_received": [moments.to_json() for moments in self.hits_received],
+            "damage_dealt": self.damage_dealt.to_json(),
+            "damage_received": self.damage_received.to_json(),
+            "rounds_survived": self.rounds_survived.to_json()
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "HeroStats":
+        stats = cls.__new__(cls)
+        stats.battles, stats.wins = data["battles"], data["wins"]
+        stats.aligned_battles, stats.aligned_wins = data["aligned_battles"], data["aligned_wins"]
+        stats.fb = RunningMoments.from_json(data["fb"])
+        stats.hits_dealt = [RunningMoments.from_json(moments) for moments in data["hits_dealt"]]
+        stats.hits_received = [RunningMoments.from_json(moments) for moments in data["hits_received"]]
+        stats.damage_dealt = Distribution.from_json(data["damage_dealt"])
+        stats.damage_received = Distribution.from_json(data["damage_received"])
+        stats.rounds_survived = Distribution.from_json(data["rounds_survived"])
+        return stats
+
+class HeroSummary(NamedTuple):
+    name: str
+    alignment: str
+    battles: int
+    win_rate: float
+    damage_dealt: tuple[float, ...]  # mean damage of a hit dealt, per attack type
+    damage_received: tuple[float, ...]  # mean damage of a hit received, per attack type
+    damage_dealt_p50: float  # median total damage dealt per battle
+    damage_dealt_p90: float
+    rounds_survived: float  # mean
+    rounds_survived_p50: float
+    fb: float  # mean filiation coefficient
+    fb_swing: float  # win rate with a coefficient from 1 to 10 minus win rate from 1/10 to 1, NaN if either is unknown
+
+class BalanceStats:
+    def __init__(self, relative_accuracy: float = RELATIVE_ACCURACY) -> None:
+        """
+        Initializes the BalanceStats object, without any battle.
+
+        Args:
+            relative_accuracy (float): The relative accuracy of the quantiles.
+        """
+        self.relative_accuracy = relative_accuracy
+        self.battles = 0
+        self.heroes: dict[tuple[str, str], HeroStats] = {}  # statistics by hero name and alignment
+
+    def hero(self, name: str, alignment: str) -> HeroStats:
+        """
+        Args:
+            name (str): The name of the hero.
+            alignment (str): The alignment of the hero.
+
+        Returns:
+            HeroStats: The statistics of the hero, created if it has none yet.
+        """
+        stats = self.heroes.get((name, alignment))
+        if stats is None:
+            stats = self.heroes[name, alignment] = HeroStats(self.relative_accuracy)
+        return stats
+
+    def add_battle(self, teams: tuple["Team", "Team"], result: "BattleResult") -> None:
+        """
+        Adds a finished battle.
+
+        Args:
+            teams (tuple[Team, Team]): The teams of the battle, as prepared before it started (their characters' HP
+                aside).
+            result (BattleResult): The result of the battle, with its hits.
+        """
+        self.battles += 1
+        heroes = [[self.hero(character.name, character.alignment) for character in team.characters] for team in teams]
+        dealt = [[0.0] * len(team.characters) for team in teams]
+        received = [[0.0] * len(team.characters) for team in teams]
+        survived = [[result.rounds] * len(team.characters) for team in teams]
+        for hit in result.hits:
+            victim_side = 1 - hit.side
+            heroes[hit.side][hit.attacker].hits_dealt[hit.attack_type].add(hit.damage)
+            heroes[victim_side][hit.victim].hits_received[hit.attack_type].add(hit.damage)
+            dealt[hit.side][hit.attacker] += hit.damage
+            received[victim_side][hit.victim] += hit.damage
+            if hit.victim_hp == 0:
+                survived[victim_side][hit.victim] = hit.round
+
+        for side, team in enumerate(teams):
+            won = side == result.winner
+            for i, character in enumerate(team.characters):
+                stats = heroes[side][i]
+                stats.battles += 1
+                stats.wins += won
+                if character.alignment == team.team_alignment:
+                    stats.aligned_battles += 1
+                    stats.aligned_wins += won
+                stats.fb.add(character.fb)
+                stats.damage_dealt.add(dealt[side][i])
+                stats.damage_received.add(received[side][i])
+                stats.rounds_survived.add(survived[side][i])
+
+    def merge(self, other: "BalanceStats") -> None:
+        """
+        Adds the battles of other statistics, e.g. those of a worker process.
+
+        Args:
+            other (BalanceStats): The other statistics.
+        """
+        self.battles += other.battles
+        for (name, alignment), stats in other.heroes.items():
+            self.hero(name, alignment).merge(stats)
+
+    def summary(self) -> list[HeroSummary]:
+        """
+        Returns:
+            list[HeroSummary]: A row per hero, from the highest win rate.
+        """
+        rows = []
+        for (name, alignment), stats in self.heroes.items():
+            off_battles = stats.battles - stats.aligned_battles
+            fb_swing = (
+                stats.aligned_wins / stats.aligned_battles - (stats.wins - stats.aligned_wins) / off_battles
+                if stats.aligned_battles and off_battles else math.nan
+            )
+            rows.append(HeroSummary(
+                name,
+                alignment,
+                stats.battles,
+                stats.wins / stats.battles,
+                tuple(moments.mean for moments in stats.hits_dealt),
+                tuple(moments.mean for moments in stats.hits_received),
+                stats.damage_dealt.sketch.quantile(.5),
+                stats.damage_dealt.sketch.quantile(.9),
+                stats.rounds_survived.moments.mean,
+                stats.rounds_survived.sketch.quantile(.5),
+                stats.fb.mean,
+                fb_swing
+            ))
+        return sorted(rows, key=lambda row: (-row.win_rate, row.name, row.alignment))
+
+    def format_table(self, limit: int | None = None) -> str:
+        """
+        Args:
+            limit (int | None): The number of heroes of the table, all of them if not provided.
+
+        Returns:
+            str: The summary table, from the highest win rate, with the mean damage of a hit dealt and received per
+                attack type (mental/strong/fast), the median and 90th percentile of the damage dealt per battle, the
+                mean and median rounds survived, the mean filiation coefficient and its swing of the win rate.
+        """
+        lines = [
+            f"{'hero':<28}{'align':<8}{'battles':>9}{'win':>7}{'dealt per hit':>21}{'received per hit':>21}"
+            f"{'dealt p50':>11}{'p90':>8}{'rounds':>8}{'p50':>6}{'fb':>6}{'fb swing':>10}"
+        ]
+        for row in self.summary()[:limit]:
+            fb_swing = f"{row.fb_swing:+.1%}" if not math.isnan(row.fb_swing) else "-"
+            lines.append(
+                f"{row.name[:27]:<28}{row.alignment:<8}{row.battles:>9}{row.win_rate:>7.1%}"
+                f"{'/'.join(f'{damage:.0f}' for damage in row.damage_dealt):>21}"
+                f"{'/'.join(f'{damage:.0f}' for damage in row.damage_received):>21}"
+                f"{row.damage_dealt_p50:>11.0f}{row.damage_dealt_p90:>8.0f}{row.rounds_survived:>8.1f}"
+                f"{row.rounds_survived_p50:>6.0f}{row.fb:>6.2f}{fb_swing:>10}"
+            )
+        return "\n".join(lines)
+
+    def save(self, path: str) -> None:
+        """
+        Checkpoints the statistics to a JSON file, replacing it atomically so an interrupted run keeps the previous
+        checkpoint.
+
+        Args:
+            path (str): The path of the file.
+        """
+        data = {
+            "relative_accuracy": self.relative_accuracy,
+            "battles": self.battles,
+            "heroes": [
+                {"name": name, "alignment": alignment, **stats.to_json()}
+                for (name, alignment), stats in self.heroes.items()
+            ]
+        }
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BalanceStats":
+        """
+        Loads statistics checkpointed by save.
+
+        Args:
+            path (str): The path of the file.
+
+        Returns:
+            BalanceStats: The statistics.
+        """
+        with open(path, encoding="utf-8") as file:
+            data = json.load(file)
+        balance = cls(data["relative_accuracy"])
+        balance.battles = data["battles"]
+        for hero in data["heroes"]:
+            balance.heroes[hero["name"], hero["alignment"]] = HeroStats.from_json(hero)
+        return balance
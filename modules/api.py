@@ -0,0 +1,291 @@
+"""
+The api module defines the ApiClient class, the shared client of the superhero API.
+
+The client keeps a single pooled aiohttp session with keep-alive connections for its whole life, so successive battles
+reuse their connections. Every request goes through a token-bucket rate limiter and a circuit breaker, has its own
+timeout, and is retried with jittered exponential backoff on timeouts, connection errors and 429/5xx responses. A request
+that still fails after its retries counts as one failure of the circuit breaker. While the circuit is open, requests fail fast with CircuitOpenError, so callers can fall back to the local hero catalog.
+
+The session is bound to the event loop of the first request. ApiClient.run and ApiClient.submit run coroutines on an
+event loop owned by the client, in a background thread, which lives as long as the client: this is how the session is
+shared by several battles.
+
+Classes:
+    ApiError: Raised when a request fails.
+    CircuitOpenError: Raised when a request is refused because the circuit is open.
+    InvalidResponseError: Raised when the API rejects a request or answers with an invalid document.
+    TokenBucket: Represents a token-bucket rate limiter.
+    CircuitBreaker: Represents a circuit breaker.
+    ApiClient: Represents the shared client of the superhero API.
+
+Example:
+    To fetch the powerstats of a character, create `client = ApiClient(base_url)` and run
+    `client.run(client.get_json("1/powerstats"))`.
+"""
+from __future__ import annotations
+import asyncio
+import concurrent.futures
+import random
+import threading
+import time
+from collections.abc import Coroutine
+from typing import Any
+
+class ApiError(Exception):
+    """
+    Raised when a request to the API fails, after its retries.
+    """
+
+class CircuitOpenError(ApiError):
+    """
+    Raised when a request is refused because the circuit breaker is open.
+    """
+
+class InvalidResponseError(ApiError):
+    """
+    Raised when the API rejects a request (HTTP 4xx other than 429) or answers with a document that isn't valid JSON.
+    Such errors concern a single document: they are neither retried nor counted by the circuit breaker.
+    """
+
+    def __init__(self, message: str, status: int | None = None) -> None:
+        super().__init__(message)
+        self.status = status
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        """
+        Initializes the TokenBucket object, full.
+
+        Args:
+            rate (float): The number of tokens added per second.
+            capacity (float): The maximum number of tokens, i.e. the maximum burst of requests.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock: asyncio.Lock | None = None
+
+    async def acquire(self) -> None:
+        """
+        Waits until a token is available and takes it.
+        """
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30) -> None:
+        """
+        Initializes the CircuitBreaker object, closed.
+
+        The circuit opens after `failure_threshold` consecutive failures. Once `reset_timeout` seconds have passed, a
+        trial request is allowed (half-open): the circuit closes if it succeeds and opens again if it fails.
+
+        Args:
+            failure_threshold (int): The number of consecutive failures that opens the circuit.
+            reset_timeout (float): The time in seconds the circuit stays open.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+
+    @property
+    def state(self) -> str:
+        """
+        Returns:
+            str: The state of the circuit ('closed', 'open' or 'half-open').
+        """
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        """
+        Returns:
+            bool: Whether a request may be sent.
+        """
+        return self.state != "open"
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.failure_threshold or self.state == "half-open":
+            self.opened_at = time.monotonic()
+
+class ApiClient:
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float = 10,
+        retries: int = 3,
+        backoff: float = .25,
+        max_backoff: float = 4,
+        rate: float = 20,
+        burst: float = 20,
+        max_connections: int = 16,
+        breaker: CircuitBreaker | None = None,
+        session: Any = None
+    ) -> None:
+        """
+        Initializes the ApiClient object. The session and the event loop of the client are created when first needed.
+
+        Args:
+            base_url (str): The base URL for the superhero API.
+            timeout (float): The timeout in seconds of each request.
+            retries (int): The number of times a failed request is retried.
+            backoff (float): The base delay in seconds before retrying, doubled after each attempt.
+            max_backoff (float): The maximum delay in seconds before retrying.
+            rate (float): The maximum number of requests per second.
+            burst (float): The maximum number of requests sent at once.
+            max_connections (int): The maximum number of connections of the pool.
+            breaker (CircuitBreaker | None): The circuit breaker of the client, a default one if not provided.
+            session: The session used to send requests, a pooled aiohttp ClientSession if not provided.
+        """
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.max_connections = max_connections
+        self.session = session
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.thread: threading.Thread | None = None
+        self.jitter = random.Random()
+
+    def __enter__(self) -> "ApiClient":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def get_session(self):
+        """
+        Returns:
+            The session of the client, created on the running event loop if needed.
+        """
+        if self.session is None:
+            from aiohttp import ClientSession, ClientTimeout, TCPConnector
+
+            connector = TCPConnector(limit=self.max_connections, keepalive_timeout=60, ssl=False)
+            self.session = ClientSession(connector=connector, timeout=ClientTimeout(total=self.timeout))
+        return self.session
+
+    async def get_json(self, path: str) -> dict[str, str]:
+        """
+        Fetches a JSON document from the API.
+
+        Args:
+            path (str): The path of the document, relative to the base URL.
+
+        Returns:
+            dict[str, str]: The decoded JSON document.
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is open.
+            InvalidResponseError: If the API rejects the request or the document isn't valid JSON.
+            ApiError: If the request still fails after its retries.
+        """
+        from aiohttp import ClientError
+
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"circuit open, refusing {path}")
+            await self.bucket.acquire()
+            try:
+                async with self.get_session().get(f"{self.base_url}{path}", timeout=self.timeout) as response:
+                    if response.status == 429 or response.status >= 500:
+                        raise ApiError(f"{path}: HTTP {response.status}")
+                    if response.status >= 400:
+                        raise InvalidResponseError(f"{path}: HTTP {response.status}", response.status)
+                    try:
+                        data = await response.json(content_type=None)
+                    except ValueError as error:
+                        raise InvalidResponseError(f"{path}: invalid JSON ({error})", response.status) from error
+            except InvalidResponseError:
+                # the API answered: the failure concerns this document only
+                self.breaker.record_success()
+                raise
+            except (ApiError, ClientError, asyncio.TimeoutError) as error:
+                if attempt >= self.retries:
+                    # a request counts as a single failure, once its retries are exhausted
+                    self.breaker.record_failure()
+                    raise ApiError(f"{path}: {error!r} after {attempt + 1} attempts") from error
+                # full jitter: a random delay up to the exponential backoff
+                await asyncio.sleep(self.jitter.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return data
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        """
+        Starts the event loop of the client in a background thread, if it isn't running yet.
+
+        Returns:
+            asyncio.AbstractEventLoop: The event loop of the client.
+        """
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(target=self.loop.run_forever, name="api-client", daemon=True)
+            self.thread.start()
+        return self.loop
+
+    def submit(self, coroutine: Coroutine) -> concurrent.futures.Future:
+        """
+        Schedules a coroutine on the event loop of the client.
+
+        Args:
+            coroutine (Coroutine): The coroutine.
+
+        Returns:
+            concurrent.futures.Future: The future of the result of the coroutine.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.start())
+
+    def run(self, coroutine: Coroutine):
+        """
+        Runs a coroutine on the event loop of the client and waits for its result.
+
+        Args:
+            coroutine (Coroutine): The coroutine.
+
+        Returns:
+            The result of the coroutine.
+        """
+        return self.submit(coroutine).result()
+
+    async def aclose(self) -> None:
+        """
+        Closes the session of the client, from the event loop it is bound to.
+        """
+        if self.session is not None and hasattr(self.session, "close"):
+            await self.session.close()
+        self.session = None
+
+    def close(self) -> None:
+        """
+        Closes the session of the client and stops its event loop.
+        """
+        if self.loop is not None:
+            self.run(self.aclose())
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.loop = None
+        self.session = None
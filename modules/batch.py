@@ -0,0 +1,223 @@
+"""
+The batch module simulates many battles between the same two teams at once with NumPy, to estimate win probabilities.
+
+It contains the BatchSimulator class, which stores N parallel battles as arrays: an HP matrix of shape (N, 2 * team size),
+where the first columns are the first team's characters and the last columns the second team's, and an attack tensor of
+shape (N, 2 * team size, 3), indexed like Character.attack. All the battles are stepped at once, following the rules of
+Battle.attack and Character.assess_damage: on each turn a random alive attacker of the attacking team performs a random
+attack type on a random alive victim of the opposing team.
+
+Random choices are made from uniform draws in [0, 1): a draw u picks the item int(u * n) among n alive characters (in
+team order) or attack types, so given the same draws the results match the scalar rules exactly.
+
+Teams can also be prepared in batch: prepare_teams computes the filiation coefficients, real stats, HP and attacks of the
+characters of M teams in one vectorized pass, with the same formulas as Team.update_characters.
+
+Classes:
+    BatchSimulator: Represents N parallel battles between two teams.
+    PreparedTeams: The attributes of the characters of M teams prepared for battle.
+
+Functions:
+    win_probability: Estimates the probability of each team winning the rest of a battle.
+    prepare_teams: Prepares the characters of M teams for battle.
+
+Example:
+    To estimate the odds of a battle, run `win_probability((team_1, team_2), 100_000)`.
+"""
+from __future__ import annotations
+import time
+from typing import NamedTuple
+import numpy as np
+from modules.character import ATTACKS, DURABILITY, POWER, STRENGTH
+from modules.team import Team
+
+class BatchSimulator:
+    def __init__(self, hp: np.ndarray, attack: np.ndarray, side: int = 0) -> None:
+        """
+        Initializes the BatchSimulator object.
+
+        Args:
+            hp (np.ndarray): The HP of the characters, of shape (N, 2 * team size).
+            attack (np.ndarray): The damage of the 3 attack types of the characters, of shape (N, 2 * team size, 3).
+            side (int): The index of the team attacking next (0 or 1).
+        """
+        self.hp = np.array(hp, dtype=np.float64)
+        self.attack = np.asarray(attack, dtype=np.float64)
+        self.team_size = self.hp.shape[1] // 2
+        self.side = side
+        self.winner = np.full(len(self.hp), -1, dtype=np.int8)  # -1 while the battle is not finished
+        self.rounds = np.zeros(len(self.hp), dtype=np.int64)
+        self.set_winners()
+
+    def team_columns(self, side: int) -> slice:
+        """
+        Args:
+            side (int): The index of the team (0 or 1).
+
+        Returns:
+            slice: The columns of the team's characters in the HP matrix.
+        """
+        return slice(side * self.team_size, (side + 1) * self.team_size)
+
+    def set_winners(self) -> None:
+        """
+        Sets the winner of the unfinished battles in which a team has no alive characters.
+        """
+        for side in (0, 1):
+            defeated = (self.hp[:, self.team_columns(side)] <= 0).all(axis=1)
+            self.winner[(self.winner < 0) & defeated] = 1 - side
+
+    @staticmethod
+    def pick(alive: np.ndarray, draws: np.ndarray) -> np.ndarray:
+        """
+        Picks one alive character per battle.
+
+        Args:
+            alive (np.ndarray): Boolean matrix of shape (n, team size), True where the character is alive.
+            draws (np.ndarray): Uniform draws in [0, 1) of shape (n,).
+
+        Returns:
+            np.ndarray: The column of the picked character in each battle, among the team's columns.
+        """
+        counts = alive.sum(axis=1)
+        ranks = (draws * counts).astype(np.int64)
+        return np.argmax(alive.cumsum(axis=1) > ranks[:, None], axis=1)
+
+    def step(self, attacker_draws: np.ndarray, type_draws: np.ndarray, victim_draws: np.ndarray) -> None:
+        """
+        Plays the next attack of every unfinished battle.
+
+        Args:
+            attacker_draws (np.ndarray): Uniform draws of shape (N,) used to pick the attackers.
+            type_draws (np.ndarray): Uniform draws of shape (N,) used to pick the attack types.
+            victim_draws (np.ndarray): Uniform draws of shape (N,) used to pick the victims.
+        """
+        rows = np.flatnonzero(self.winner < 0)
+        attacking, defending = self.team_columns(self.side), self.team_columns(1 - self.side)
+
+        attackers = self.pick(self.hp[rows, attacking] > 0, attacker_draws[rows]) + attacking.start
+        attack_types = (type_draws[rows] * 3).astype(np.int64)
+        victims = self.pick(self.hp[rows, defending] > 0, victim_draws[rows]) + defending.start
+
+        damage = self.attack[rows, attackers, attack_types]
+        self.hp[rows, victims] = np.maximum(self.hp[rows, victims] - damage, 0)
+        self.rounds[rows] += 1
+
+        defeated = (self.hp[rows, defending] <= 0).all(axis=1)
+        self.winner[rows[defeated]] = self.side
+        self.side = 1 - self.side
+
+    def run(self, rng: np.random.Generator) -> np.ndarray:
+        """
+        Plays every battle until one of the teams is defeated.
+
+        Args:
+            rng (np.random.Generator): The RNG used to draw the random choices.
+
+        Returns:
+            np.ndarray: The index of the winning team of each battle.
+        """
+        while (self.winner < 0).any():
+            self.step(*rng.random((3, len(self.hp))))
+        return self.winner
+
+def win_probability(
+    teams: tuple[Team, Team],
+    n_battles: int = 100_000,
+    side: int = 0,
+    rng: np.random.Generator | None = None,
+    time_limit: float | None = None,
+    chunk_size: int = 2_000
+) -> tuple[float, float]:
+    """
+    Estimates the probability of each team winning the rest of a battle by simulating it many times.
+
+    With a time limit, battles are simulated in chunks and the estimate only uses the chunks completed within the limit
+    (at least one), since long battles between weak teams can take much longer than strong ones.
+
+    Args:
+        teams (tuple[Team, Team]): The teams, with the current HP of their characters.
+        n_battles (int): The maximum number of battles simulated.
+        side (int): The index of the team attacking next.
+        rng (np.random.Generator | None): The RNG used by the simulations, a new one if not provided.
+        time_limit (float | None): The time in seconds after which no new chunk of battles is started, None for no limit.
+        chunk_size (int): The number of battles simulated at once when there is a time limit.
+
+    Returns:
+        tuple[float, float]: The probability of each team winning.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    characters = teams[0].characters + teams[1].characters
+    hp = np.array([character.hp for character in characters], dtype=np.float64)
+    attack = np.array([character.attack for character in characters], dtype=np.float64)
+    chunk_size = n_battles if time_limit is None else min(chunk_size, n_battles)
+    deadline = time.perf_counter() + time_limit if time_limit is not None else None
+
+    played = first_team_wins = 0
+    while played < n_battles:
+        size = min(chunk_size, n_battles - played)
+        simulator = BatchSimulator(
+            np.broadcast_to(hp, (size, len(characters))),
+            np.broadcast_to(attack, (size, len(characters), 3)),
+            side
+        )
+        first_team_wins += int(np.count_nonzero(simulator.run(rng) == 0))
+        played += size
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+    first_team = first_team_wins / played
+    return first_team, 1 - first_team
+
+class PreparedTeams(NamedTuple):
+    team_alignment: np.ndarray  # (M,), 'good' or 'bad'
+    fb: np.ndarray  # (M, team size)
+    stats: np.ndarray  # (M, team size, 6), in the order of STATS
+    hp: np.ndarray  # (M, team size)
+    attack: np.ndarray  # (M, team size, 3)
+
+def prepare_teams(
+    raw_stats: np.ndarray,
+    alignments: np.ndarray,
+    actual_stamina: np.ndarray,
+    fb_draws: np.ndarray,
+    team_alignments: np.ndarray | None = None
+) -> PreparedTeams:
+    """
+    Prepares the characters of M teams for battle, like Team.set_team_alignment and Team.update_characters do.
+
+    The results are identical to the per-character formulas of Character.set_real_stats, Character.set_hp and
+    Character.set_attacks given the same stamina and filiation coefficient draws.
+
+    Args:
+        raw_stats (np.ndarray): The stats of the characters as returned by the API, of shape (M, team size, 6), in the
+            order of STATS.
+        alignments (np.ndarray): The alignments of the characters, of shape (M, team size).
+        actual_stamina (np.ndarray): The actual stamina of the characters (0 to 10), of shape (M, team size).
+        fb_draws (np.ndarray): The filiation coefficient draws of the characters (0 to 9), of shape (M, team size).
+        team_alignments (np.ndarray | None): The alignments of the teams, of shape (M,), determined from the alignments
+            of their characters if not provided.
+
+    Returns:
+        PreparedTeams: The attributes of the characters of the teams.
+    """
+    alignments = np.asarray(alignments)
+    if team_alignments is None:
+        # team is good if more than half of its characters are good, like Team.set_team_alignment
+        team_alignments = np.where(2 * (alignments == "good").sum(axis=1) > alignments.shape[1], "good", "bad")
+    team_alignments = np.asarray(team_alignments)
+
+    coefficients = 1 + np.asarray(fb_draws, dtype=np.float64)
+    fb = np.where(alignments == team_alignments[:, None], coefficients, np.power(coefficients, -1.0))
+
+    stamina = np.asarray(actual_stamina, dtype=np.float64)
+    stats = np.floor((2 * np.asarray(raw_stats, dtype=np.float64) + stamina[..., None]) / 1.1 * fb[..., None])
+
+    hp = np.floor(
+        (stats[..., STRENGTH] * .8 + stats[..., DURABILITY] * .7 + stats[..., POWER]) / 2 * (1 + stamina / 10)
+    ) + 100
+
+    attack = np.stack([
+        (stats[..., i] * w[0] + stats[..., j] * w[1] + stats[..., k] * w[2]) * fb for (i, j, k), w in ATTACKS
+    ], axis=-1)
+
+    return PreparedTeams(team_alignments, fb, stats.astype(np.int64), hp.astype(np.int64), attack)
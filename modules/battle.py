@@ -2,35 +2,111 @@
 The battle module handles the execution of battles between teams of characters in the superhero battle game.
 
 It contains the Battle class, which manages the flow of the battle, including team creation, character selection, attack execution, and determining the winner.
+The rules of the fight are applied by the headless engine of the engine module; the Battle class is the interactive front-end that prompts the player and displays the battle.
+Every random draw of a battle derives from its seed, and the fight is recorded in Battle.record so it can be replayed with engine.replay.
+Every attack is also emitted as a structured event to the sink of the battle (see the events module).
+The fetch, the fight, the display and the waits for the player are timed by the instrumentation module, when enabled.
+With a shared API client, the roster of the next battle can be fetched in the background while the current one is played.
 
 Classes:
     Battle: Represents a battle between two teams of characters.
+    PrefetchedRoster: The roster of a future battle, fetched in the background.
 
 Example:
     To initiate a battle, create a Battle object and provide the base URL for the superhero API as an argument.
 """
+from __future__ import annotations
+import concurrent.futures
 import math
 import random
-import threading
 import time
 import asyncio
-from aiohttp import ClientSession
+from typing import NamedTuple
+from modules.api import ApiClient, ApiError, InvalidResponseError
+from modules.catalog import HeroCatalog, is_valid
 from modules.character import Character
+from modules.engine import ATTACK_TYPES, BattleRecord, Engine, Policy, snapshot
+from modules.events import EventSink, RingBufferSink
+from modules.instrumentation import INSTRUMENTS, timed
+from modules.progress import FetchProgress
+from modules.renderer import Renderer
+from modules.rng import derive_seed, new_seed, substream
+from modules.sampler import HeroIndex
+from modules.solver import StateBudgetExceeded, WinSolver
 from modules.team import Team
 from utils.messages import messages
 
+# number of characters of a team by default, and fetched for a battle (two teams)
+TEAM_SIZE = 5
+ROSTER_SIZE = 2 * TEAM_SIZE
+# maximum number of new states solved for exact odds, about half a second, and of states kept by the solver
+SOLVER_BUDGET = 20_000
+SOLVER_CAPACITY = 100_000
+# once the solver exceeded its budget, it is only tried again when fewer characters are alive, and at most this many
+SOLVER_RETRY_ALIVE = 3
+
+class PrefetchedRoster(NamedTuple):
+    seed: int  # seed of the battle the roster is fetched for
+    future: concurrent.futures.Future  # teams of the battle, as returned by Battle.get_teams
+
 class Battle:
-    def __init__(self, base_url: str) -> None:
+    def __init__(
+        self,
+        base_url: str,
+        max_in_flight: int = 8,
+        catalog: HeroCatalog | None = None,
+        seed: int | None = None,
+        cpu_policy: Policy | None = None,
+        client: ApiClient | None = None,
+        show_odds: bool = False,
+        roster: PrefetchedRoster | None = None,
+        prefetch_next: bool = False,
+        fast: bool = False,
+        sink: EventSink | None = None,
+        team_size: int = TEAM_SIZE
+    ) -> None:
         """
         Initializes the Battle object, runs the battle based on the player's input, and prints the winner after the battle is finished.
 
         Args:
             base_url (str): The base URL for the superhero API.
+            max_in_flight (int): The maximum number of characters being fetched concurrently.
+            catalog (HeroCatalog | None): The local catalog used in front of the API, if any.
+            seed (int | None): The seed of every random draw of the battle, a fresh one if not provided.
+            cpu_policy (Policy | None): The policy choosing the attacker and target of the CPU, random if not provided.
+            client (ApiClient | None): The shared client of the superhero API, a client for this battle only if not provided.
+            show_odds (bool): Whether to print the win probability of each team before the fight and after each attack
+                (needs NumPy when the odds are too long to compute exactly).
+            roster (PrefetchedRoster | None): The roster fetched in the background for this battle, if any. The battle
+                then uses the seed of the roster, and only fetches its teams if the prefetch failed.
+            prefetch_next (bool): Whether to fetch the roster of the next battle in the background while this one is
+                played, in Battle.next_roster (only with a shared client).
+            fast (bool): Whether to turn off the pauses of the display.
+            sink (EventSink | None): The sink every attack is emitted to, an in-memory ring buffer if not provided.
+            team_size (int): The number of characters in a team.
         """
-        print("\n▶️ New Battle:\nWe will start by creating two teams of 5 random characters each...\n")
+        print(f"\n▶️ New Battle:\nWe will start by creating two teams of {team_size} random characters each...\n")
 
         self.base_url = base_url
-        self.teams = asyncio.run(self.get_teams())
+        self.catalog = catalog
+        self.seed = roster.seed if roster is not None else seed if seed is not None else new_seed()
+        self.rng = substream(self.seed, "battle")
+        self.team_size = team_size
+        self.cpu_policy = cpu_policy if cpu_policy is not None else Policy()
+        self.show_odds = show_odds
+        self.solver: WinSolver | None = None
+        self.solver_failed_at: int | None = None  # number of alive characters when the solver exceeded its budget
+        self.renderer = Renderer(fast=fast)
+        self.sink = sink if sink is not None else RingBufferSink()
+        self.client = client if client is not None else ApiClient(base_url)
+        self.teams = self.take_roster(roster) if roster is not None else None
+        try:
+            if self.teams is None:
+                self.teams = self.client.run(self.get_teams(max_in_flight, team_size=team_size))
+        finally:
+            if client is None:
+                self.client.close()
+        self.next_roster = self.prefetch_roster(max_in_flight) if prefetch_next and client is not None else None
 
         print("\n\n✅ Both teams have been created!\n")
 
@@ -41,22 +117,81 @@ class Battle:
 
         self.teams_formatted["Team 1"].set_team_alignment()
         self.teams_formatted["Team 2"].set_team_alignment()
-        self.teams_formatted["Team 1"].update_characters()
-        self.teams_formatted["Team 2"].update_characters()
+        self.teams_formatted["Team 1"].update_characters(substream(self.seed, "Team 1"))
+        self.teams_formatted["Team 2"].update_characters(substream(self.seed, "Team 2"))
 
-        self.print_teams(.5)
+        self.print_teams(full=True, delay=2)
 
         self.user_team = ""
         self.cpu_team = ""
         self.choose_team()
 
-        time.sleep(2)
+        self.renderer.pause(2)
 
         fight_winner = self.fight()
         if fight_winner == "player":
-            print(f"\n🎉 YOU WIN! 🎉\n{messages['player_wins'][random.randrange(5)]}")
+            print(f"\n🎉 YOU WIN! 🎉\n{messages['player_wins'][self.rng.randrange(5)]}")
         elif fight_winner == "cpu":
-            print(f"\n🤯 YOU LOSE... 🤯\n{messages['cpu_wins'][random.randrange(5)]}")
+            print(f"\n🤯 YOU LOSE... 🤯\n{messages['cpu_wins'][self.rng.randrange(5)]}")
+
+    @classmethod
+    def fetcher(
+        cls, client: ApiClient, catalog: HeroCatalog | None = None, seed: int | None = None, team_size: int = TEAM_SIZE
+    ) -> "Battle":
+        """
+        Creates a Battle without its interactive game, which only fetches its roster with get_teams.
+
+        Args:
+            client (ApiClient): The client of the superhero API.
+            catalog (HeroCatalog | None): The local catalog used in front of the API, if any.
+            seed (int | None): The seed of the battle, a fresh one if not provided.
+            team_size (int): The number of characters in a team.
+
+        Returns:
+            Battle: The battle.
+        """
+        battle = cls.__new__(cls)
+        battle.base_url = client.base_url
+        battle.client = client
+        battle.catalog = catalog
+        battle.seed = seed if seed is not None else new_seed()
+        battle.rng = substream(battle.seed, "battle")
+        battle.team_size = team_size
+        return battle
+
+    def prefetch_roster(self, max_in_flight: int = 8) -> "PrefetchedRoster":
+        """
+        Starts fetching the roster of the next battle on the event loop of the client, without waiting for it.
+
+        The seed of the next battle derives from the seed of this one, so a session of battles is reproducible.
+
+        Args:
+            max_in_flight (int): The maximum number of characters being fetched concurrently.
+
+        Returns:
+            PrefetchedRoster: The roster being fetched, to pass to the next battle or to discard.
+        """
+        seed = derive_seed(self.seed, "next")
+        fetcher = Battle.fetcher(self.client, self.catalog, seed, self.team_size)
+        return PrefetchedRoster(
+            seed, self.client.submit(fetcher.get_teams(max_in_flight, show_progress=False, team_size=self.team_size))
+        )
+
+    @staticmethod
+    def take_roster(roster: "PrefetchedRoster") -> dict[str, list[Character]] | None:
+        """
+        Waits for a prefetched roster.
+
+        Args:
+            roster (PrefetchedRoster): The roster fetched in the background.
+
+        Returns:
+            dict[str, list[Character]] | None: The two teams of characters, or None if the prefetch failed.
+        """
+        try:
+            return roster.future.result()
+        except (ApiError, concurrent.futures.CancelledError):
+            return None
 
     def choose_team(self) -> None:
         """
@@ -66,8 +201,8 @@ class Battle:
         team_selection = 0
         while team_selection not in (1, 2):
             try:
-                team_selection = int(
-                    input("\n👥 [CHOOSE YOUR TEAM]\nEnter (1) or (2): "))
+                with INSTRUMENTS.timer("input"):
+                    team_selection = int(input("\n👥 [CHOOSE YOUR TEAM]\nEnter (1) or (2): "))
                 if team_selection not in (1, 2):
                     raise ValueError
 
@@ -76,194 +211,356 @@ class Battle:
             except ValueError:
                 print("\n❌ Invalid input. Please enter 1 or 2")
 
-        random_message = messages["team_assembled"][random.randrange(20)]
+        random_message = messages["team_assembled"][self.rng.randrange(20)]
         print(f"\nYou have selected {str(self.user_team)}\n{random_message}")
 
-    async def fetch_data(self, session: ClientSession, revised_characters: dict[str, bool]) -> Character:
+    def print_win_probability(self, side: int = 0, n_battles: int = 10_000, time_limit: float = .5) -> None:
+        """
+        Prints the probability of each team winning the rest of the battle, computed exactly by the solver of the battle
+        within its budget of states, or else estimated by simulating the battle many times. Once the solver exceeded
+        its budget, the odds are estimated without trying it again until only a few characters are left.
+
+        Args:
+            side (int): The index of the team attacking next (0 for the player's team).
+            n_battles (int): The maximum number of battles simulated.
+            time_limit (float): The time in seconds after which no more battles are simulated.
+        """
+        teams = (self.teams_formatted[self.user_team], self.teams_formatted[self.cpu_team])
+        if self.solver is None:
+            self.solver = WinSolver(teams, SOLVER_CAPACITY)
+        alive = sum(character.hp > 0 for team in teams for character in team.characters)
+        odds = None
+        if self.solver_failed_at is None or alive < self.solver_failed_at and alive <= SOLVER_RETRY_ALIVE:
+            try:
+                odds = self.solver.solve(side, SOLVER_BUDGET).win_probability
+            except StateBudgetExceeded:
+                self.solver_failed_at = alive
+                # the states of a battle too long to solve won't be needed again
+                self.solver.cache.clear()
+        if odds is not None:
+            player_odds, cpu_odds = odds
+            method = "exact"
+        else:
+            from modules.batch import win_probability
+
+            player_odds, cpu_odds = win_probability(teams, n_battles, side, time_limit=time_limit)
+            method = "estimated"
+        print(f"\n📊 Win probability ({method}): {self.user_team} {player_odds:.1%}, {self.cpu_team} {cpu_odds:.1%}")
+
+    @timed("fetch_data")
+    async def fetch_data(self, character_id: str) -> Character | None:
         """
         Asynchronously fetches data about a character from the superhero API.
 
-        This method generates a random character ID and retrieves their powerstats and biography data.
-        It ensures that the character ID has not been previously fetched to avoid duplicates.
+        The character is read from the local catalog if it has a fresh entry there. Otherwise its powerstats and
+        biography are requested concurrently, and the result (valid or not) is stored in the catalog.
         If the retrieved data is valid (not null powerstats and alignment is 'good', 'bad', or 'neutral'), it creates a Character object with the retrieved data and returns it.
+        A character the API rejects (HTTP 4xx or invalid JSON) is not valid either, without aborting the roster.
+        The stamina of the character is drawn from its own substream of the battle's seed, so it doesn't depend on the order in which requests complete.
 
         Args:
-            session: The aiohttp ClientSession to use for making HTTP requests.
-            revised_characters (dict[str, bool]): A dictionary to keep track of fetched character IDs to avoid duplicates.
+            character_id (str): The ID of the character to fetch.
 
         Returns:
-            Character: A Character object initialized with the retrieved data.
+            Character | None: A Character object initialized with the retrieved data, or None if the data is not valid.
 
         Raises:
-            TimeoutError: If a timeout occurs while fetching data from the API.
+            ApiError: If the data can't be fetched from the API.
         """
-        while True:
-            character_id = str(random.randint(1, 731))
-            if character_id in revised_characters:
-                continue
-            revised_characters[character_id] = True
-            async with session.get(f"{self.base_url}{character_id}/powerstats", timeout=30, ssl=False) as response:
-                powerstats_data = await response.json()
-            async with session.get(f"{self.base_url}{character_id}/biography", timeout=30, ssl=False) as response:
-                biography_data = await response.json()
-            alignment = biography_data['alignment']
-            if 'null' in powerstats_data.values() or alignment not in ('good', 'bad', 'neutral'):
-                continue
-            return Character({**powerstats_data, "alignment": alignment})
-
-    async def get_teams(self) -> dict[str, list[Character]]:
-        """
-        Retrieves 2 teams of 5 distinct characters from the superhero API asynchronously.
+        if self.catalog is not None:
+            data = self.catalog.get(character_id)
+            if data is not None or self.catalog.is_known(character_id):
+                INSTRUMENTS.count("fetch_data.catalog_hits")
+                return Character(data, substream(self.seed, "character", character_id)) if data is not None else None
+
+        async def get_json(endpoint: str) -> dict:
+            with INSTRUMENTS.timer(f"fetch_data.{endpoint}"):
+                return await self.client.get_json(f"{character_id}/{endpoint}")
+
+        try:
+            powerstats_data, biography_data = await asyncio.gather(get_json("powerstats"), get_json("biography"))
+        except InvalidResponseError as error:
+            # the API rejected this character only: it is not a candidate, but stays unknown unless it doesn't exist
+            if self.catalog is not None and error.status == 404:
+                self.catalog.put(character_id, None)
+            return None
+        alignment = biography_data.get('alignment')
+        data = {**powerstats_data, "alignment": alignment} if is_valid(powerstats_data, alignment) else None
+        if self.catalog is not None:
+            self.catalog.put(character_id, data)
+        return Character(data, substream(self.seed, "character", character_id)) if data is not None else None
+
+    @timed("get_teams")
+    async def get_teams(
+        self, max_in_flight: int = 8, overfetch: int = 2, show_progress: bool = True, team_size: int = TEAM_SIZE
+    ) -> dict[str, list[Character]]:
+        """
+        Retrieves 2 teams of distinct characters from the superhero API asynchronously.
+
+        Up to `max_in_flight` characters are fetched concurrently. While characters are still missing,
+        `overfetch` extra candidates are requested speculatively so rejected characters don't stall the roster.
+        The roster is made of the first valid candidates in draw order, whatever the order in which they complete.
+        Requests still pending once the roster is complete are cancelled. Candidates are drawn without replacement
+        from the index of the catalog (see the sampler module), so characters known to be invalid are never drawn.
+        If the API fails (e.g. its circuit breaker is open), the roster is completed with valid characters of the
+        catalog.
+
+        Args:
+            max_in_flight (int): The maximum number of characters being fetched concurrently.
+            overfetch (int): The number of extra candidates fetched on top of the missing characters.
+            show_progress (bool): Whether to print the progress of the fetch, e.g. not for a roster fetched in the
+                background or a benchmark.
+            team_size (int): The number of characters in a team.
 
         Returns:
             dict[str, list[Character]]: A dictionary containing the two teams of characters.
+
+        Raises:
+            ApiError: If the API fails, or doesn't have enough valid characters, and the catalog can't complete the
+                roster.
         """
-        revised_characters: dict[str, bool] = {}
+        # candidates are drawn without replacement from their own substream, never among the IDs known to be invalid,
+        # and the roster keeps the first valid ones in draw order, so the teams only depend on the seed (and what is
+        # known about the IDs) and not on the order in which requests complete
+        hero_index = self.catalog.index() if self.catalog is not None else HeroIndex()
+        candidates = hero_index.sample(substream(self.seed, "roster"))
+        drawn: list[str] = []  # IDs of the candidates, in draw order
+        fetched: dict[int, Character | None] = {}  # character of each completed candidate, by draw index
+        started_at: dict[int, float] = {}  # start time of each candidate, by draw index
         all_characters: list[Character] = []
-        self.print_loading_msg(all_characters)
-        async with ClientSession() as session:
-            while len(all_characters) < 10:
-                all_characters.append(await self.fetch_data(session, revised_characters))
+        roster_ids: set[str] = set()
+        pending: dict[asyncio.Task, int] = {}
+        roster_size = 2 * team_size
+        async with FetchProgress(roster_size, show_progress) as progress:
+            try:
+                while not self.select_roster(drawn, fetched, all_characters, roster_ids, roster_size):
+                    missing = roster_size - len(all_characters)
+                    while missing > 0 and len(pending) < min(max_in_flight, missing + overfetch):
+                        character_id = next(candidates, None)
+                        if character_id is None:
+                            break
+                        started_at[len(drawn)] = time.perf_counter()
+                        pending[asyncio.create_task(self.fetch_data(character_id))] = len(drawn)
+                        drawn.append(character_id)
+                        progress.started()
+
+                    if not pending:
+                        raise ApiError(f"only {len(all_characters)} valid characters among the IDs of the API")
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        index = pending.pop(task)
+                        accepted = task.exception() is None and task.result() is not None
+                        progress.completed(accepted, time.perf_counter() - started_at[index])
+                        INSTRUMENTS.count("get_teams.accepted" if accepted else "get_teams.rejected")
+                        fetched[index] = task.result()
+            except ApiError:
+                if not self.complete_from_catalog(all_characters, roster_ids, roster_size):
+                    raise
+            finally:
+                for task in pending:
+                    task.cancel()
+                    progress.cancelled()
+                await asyncio.gather(*pending, return_exceptions=True)
 
         return {
-            "Team 1": all_characters[:5],
-            "Team 2": all_characters[5:]
+            "Team 1": all_characters[:team_size],
+            "Team 2": all_characters[team_size:]
         }
 
-    def print_loading_msg(self, all_characters: list[Character]):
+    @staticmethod
+    def select_roster(
+        drawn: list[str],
+        fetched: dict[int, Character | None],
+        all_characters: list[Character],
+        roster_ids: set[str],
+        roster_size: int = ROSTER_SIZE
+    ) -> bool:
         """
-        Prints a loading message while characters are being fetched from the superhero API.
+        Selects the valid characters fetched so far, in draw order, as the roster.
 
         Args:
-            all_characters (list[Character]): A list of Character objects representing fetched characters.
+            drawn (list[str]): The IDs of the candidates, in draw order.
+            fetched (dict[int, Character | None]): The character of each completed candidate (None if it is not valid),
+                by draw index.
+            all_characters (list[Character]): The characters of the roster, updated in place.
+            roster_ids (set[str]): The IDs of the characters of the roster, updated in place.
+            roster_size (int): The number of characters of the roster.
+
+        Returns:
+            bool: Whether the roster is complete, i.e. it holds the first valid candidates and every candidate drawn
+                before them has completed.
+        """
+        complete = True
+        all_characters.clear()
+        roster_ids.clear()
+        for index, character_id in enumerate(drawn):
+            if len(all_characters) == roster_size:
+                break
+            if index not in fetched:
+                complete = False
+            elif fetched[index] is not None:
+                all_characters.append(fetched[index])
+                roster_ids.add(character_id)
+        return complete and len(all_characters) == roster_size
+
+    def complete_from_catalog(
+        self, all_characters: list[Character], roster_ids: set[str], roster_size: int = ROSTER_SIZE
+    ) -> bool:
         """
-        def animate():
-            animation = [".","..","...","   "]
-            idx = 0
-            while len(all_characters) < 10:
-                print(f"⏳ Loading characters{animation[idx % len(animation)]}", end="\r")
-                idx += 1
-                time.sleep(0.2)
+        Completes the roster with random valid characters of the catalog, when the API can't be used.
 
-        loading_thread = threading.Thread(target=animate)
-        loading_thread.start()
+        Args:
+            all_characters (list[Character]): The characters of the roster, completed in place.
+            roster_ids (set[str]): The IDs of the characters of the roster.
+            roster_size (int): The number of characters of the roster.
 
-    def print_teams(self, delay: float) -> None:
+        Returns:
+            bool: Whether the roster could be completed.
         """
-        Prints the teams of characters with a specified delay between each print.
+        if self.catalog is None:
+            return False
+        drawn = self.catalog.index().draw_teams(self.rng, 1, roster_size - len(all_characters), exclude=roster_ids)
+        if drawn is None:
+            return False
+        for character_id in drawn[0]:
+            all_characters.append(
+                Character(self.catalog.get(character_id), substream(self.seed, "character", character_id))
+            )
+            roster_ids.add(character_id)
+        return True
+
+    @timed("print_teams")
+    def print_teams(self, full: bool = False, delay: float = 0) -> None:
+        """
+        Displays the teams of characters: all of them the first time, then only those whose HP or status changed.
 
         Args:
-            delay (float): The delay between each print.
+            full (bool): Whether to display every character.
+            delay (float): The pause after the teams are displayed.
         """
-        for team_name, team_characters in self.teams.items():
-            print(f"\n{team_name}, {self.teams_formatted[team_name]}")
-            for character in team_characters:
-                print(character)
-                time.sleep(delay)
+        self.renderer.render(self.teams_formatted, full, delay)
 
+    @timed("fight")
     def fight(self) -> str:
         """
         Initiates and manages the rounds of the battle between the two teams.
 
+        The rules are applied by the headless battle engine, with the player's team attacking first.
+
         Returns:
             str: The winner of the battle after the last round ('player' or 'cpu').
         """
-        player_attacks = True
+        if self.show_odds:
+            self.print_win_probability()
+
+        teams = (self.teams_formatted[self.user_team], self.teams_formatted[self.cpu_team])
+        fight_seed = derive_seed(self.seed, "fight")
+        self.record = BattleRecord((snapshot(teams[0]), snapshot(teams[1])), fight_seed, [], [])
+        self.engine = Engine(
+            teams, (self.choose_attacker, self.cpu_policy), random.Random(fight_seed), sink=self.sink
+        )
         self.round = 0  # incremented each time any player attacks
+        self.attacker_choices = (0, "")  # number of alive characters of the player, and the prompt listing them
         while True:
-            self.round += 1
-            attack_result = self.attack(player_attacks)
+            attack_result = self.attack()
             if attack_result["winner"]:
+                self.record.attackers.extend(hit.attacker for hit in self.engine.hits)
+                self.record.victims.extend(hit.victim for hit in self.engine.hits)
                 return attack_result["winner"]
 
-            player_attacks = not player_attacks
-
-            if not player_attacks:
+            if self.engine.side == 1:
                 # increments after both players have attacked once
                 real_round = str(math.ceil(self.round / 2))
-                input(
-                    f"\n[ROUND {real_round}. PRESS ENTER TO PLAY YOUR OPPONENT'S TURN...]")
+                with INSTRUMENTS.timer("input"):
+                    input(f"\n[ROUND {real_round}. PRESS ENTER TO PLAY YOUR OPPONENT'S TURN...]")
 
-    def attack(self, player_attacks: bool) -> dict[str, str]:
+    @timed("attack")
+    def attack(self) -> dict[str, str]:
         """
-        Performs an attack between two characters from opposing teams.
-
-        Args:
-            player_attacks (bool): Indicates whether it's the player's turn to attack.
+        Performs the next attack of the battle and displays it.
 
         Returns:
             dict[str, Union[bool, str]]: Information about the status of the battle after the attack.
         """
-        alive_player = [
-            char for char in self.teams[self.user_team] if char.hp > 0]
-        alive_cpu = [char for char in self.teams[self.cpu_team] if char.hp > 0]
-
-        # list of characters from the attacker's team that are still alive
-        attacker_characters = alive_player if player_attacks else alive_cpu
-
-        # set attacker from user input
-        character_attacker = self.set_attacking_character(
-            attacker_characters) if player_attacks else random.randint(1, len(alive_cpu))
+        self.round = self.engine.round + 1
+        hit = self.engine.step()
+        self.engine.flush_events()
 
-        # perform attack (random attack type)
-        attacker = attacker_characters[character_attacker - 1]
-        attack_type = random.choice(
-            [[0, "mental"], [1, "strong"], [2, "fast"]])
-        victim = random.choice(alive_cpu if player_attacks else alive_player)
-        damage = attacker.attack[int(attack_type[0])]
-
-        attacking_team = self.user_team if player_attacks else self.cpu_team
+        attacking_team = self.user_team if hit.side == 0 else self.cpu_team
+        attacker = self.engine.teams[hit.side].characters[hit.attacker]
+        victim = self.engine.teams[1 - hit.side].characters[hit.victim]
 
         attacker_name = attacker.data['name']
         victim_name = victim.data['name']
-        print(
+        self.renderer.write(
             f"\n***🚀***{attacking_team.upper()} IS ATTACKING***🚀***\
-            \n'{attacker_name}' is doing a '{attack_type[1]}' attack ({round(damage, 2)} HP) on '{victim_name}'..."
+            \n'{attacker_name}' is doing a '{ATTACK_TYPES[hit.attack_type]}' attack ({round(hit.damage, 2)} HP) on '{victim_name}'..."
         )
 
-        # assess damage inflicted to victim and update its status if necessary
-        victim.assess_damage(damage)
-        victim.set_status()
-
         # display updated teams
-        time.sleep(2)
-        self.print_teams(.1)
+        self.renderer.pause(2)
+        self.print_teams()
 
-        alive_player = [
-            char for char in self.teams[self.user_team] if char.hp > 0]
-        alive_cpu = [char for char in self.teams[self.cpu_team] if char.hp > 0]
-
-        if len(alive_player) == 0 or len(alive_cpu) == 0:
-            return {"winner": "player" if len(alive_cpu) == 0 else "cpu"}
+        if self.engine.winner is not None:
+            return {"winner": "player" if self.engine.winner == 0 else "cpu"}
+        if self.show_odds:
+            # the states after the attack were explored by the previous query: exact odds mostly come from the cache
+            self.print_win_probability(self.engine.side)
 
         return {"winner": ""}
 
-    def set_attacking_character(self, user_characters: list[Character]) -> int:
+    def choose_attacker(self, alive: list[int], engine: Engine, rng: random.Random) -> int:
         """
-        Allows the player to choose which character from their team will perform an attack.
+        Attacker-selection policy of the player's team, which asks the player to choose the attacker.
 
+        Args:
+            alive (list[int]): The indexes of the alive characters of the player's team.
+            engine (Engine): The engine running the battle.
+            rng (random.Random): The RNG of the battle.
+
+        Returns:
+            int: The index of the attacker in the player's team.
+        """
+        # characters are only ever defeated during a battle: the prompt changes only when the number of alive ones does
+        if self.attacker_choices[0] != len(alive):
+            characters = engine.teams[0].characters
+            self.attacker_choices = (len(alive), self.format_choices([characters[i] for i in alive]))
+        return alive[self.set_attacking_character(len(alive), self.attacker_choices[1]) - 1]
+
+    @staticmethod
+    def format_choices(user_characters: list[Character]) -> str:
+        """
         Args:
             user_characters (list[Character]): The characters available for the player to choose from.
 
         Returns:
-            int: The index of the selected character from 1 to 5 (both inclusive).
+            str: The list of the characters, numbered from 1, as shown to the player.
+        """
+        return ", ".join(
+            f"({i}) {character.name}" for i, character in enumerate(user_characters, start=1)
+        ) + ": "
+
+    def set_attacking_character(self, n_choices: int, valid_choices: str) -> int:
         """
-        valid_choices = ""
-        for i, character in enumerate(user_characters):
-            if i < len(user_characters) - 1:
-                valid_choices += f"({str(i + 1)}) {character.data['name']}, "
-            else:
-                valid_choices += f"({str(i + 1)}) {character.data['name']}: "
+        Allows the player to choose which character from their team will perform an attack.
 
+        Args:
+            n_choices (int): The number of characters available for the player to choose from.
+            valid_choices (str): The list of these characters, as returned by format_choices.
+
+        Returns:
+            int: The index of the selected character from 1 to n_choices (both inclusive).
+        """
         attacking_character = 0
-        while attacking_character not in range(1, len(user_characters) + 1):
+        while attacking_character not in range(1, n_choices + 1):
             try:
                 # increments after both players have attacked once
                 real_round = str(math.ceil(self.round / 2))
-                attacking_character = int(
-                    input(f"\n🚀 [ROUND {real_round}. CHOOSE A CHARACTER]\n{valid_choices}")
-                )
-                if attacking_character not in range(1, len(user_characters) + 1):
+                with INSTRUMENTS.timer("input"):
+                    attacking_character = int(
+                        input(f"\n🚀 [ROUND {real_round}. CHOOSE A CHARACTER]\n{valid_choices}")
+                    )
+                if attacking_character not in range(1, n_choices + 1):
                     raise ValueError
             except ValueError:
                 print(
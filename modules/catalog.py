@@ -0,0 +1,233 @@
+"""
+The catalog module defines the HeroCatalog class, a persistent on-disk cache of the superhero API catalog.
+
+Every character fetched from the API is stored in a SQLite file keyed by character ID, together with whether it is valid
+(usable in a battle) or invalid (null powerstats or unusable alignment), so invalid characters are never requested twice.
+Entries older than the catalog's TTL are considered stale and fetched again. Random IDs are drawn from the index of the
+catalog (see the sampler module), built from its characters on first use.
+
+Classes:
+    HeroCatalog: Represents the local store of characters fetched from the superhero API.
+
+Functions:
+    is_valid: Determines whether a character can take part in a battle.
+    warm: Fetches every character of the API missing from the catalog.
+
+Example:
+    To warm the catalog with every character of the API, run `python main.py catalog warm`.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sqlite3
+import time
+from typing import TYPE_CHECKING
+from modules.character import STATS
+
+if TYPE_CHECKING:
+    # the API client (and asyncio) is only imported to fetch characters, so offline commands start fast
+    from modules.api import ApiClient, ApiError
+    from modules.sampler import HeroIndex
+
+# highest character ID in the API
+MAX_CHARACTER_ID = 731
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "hero_catalog.db")
+DEFAULT_TTL = 30 * 24 * 60 * 60  # 30 days, in seconds
+
+def is_valid(powerstats_data: dict[str, str], alignment: str | None) -> bool:
+    """
+    Determines whether a character can take part in a battle.
+
+    Args:
+        powerstats_data (dict[str, str]): The powerstats of the character, as returned by the API.
+        alignment (str | None): The alignment of the character, as returned by the API.
+
+    Returns:
+        bool: True if the powerstats are all present and not null, and the alignment is 'good', 'bad' or 'neutral'.
+    """
+    return (
+        all(powerstats_data.get(stat) not in (None, 'null') for stat in STATS)
+        and alignment in ('good', 'bad', 'neutral')
+    )
+
+class HeroCatalog:
+    def __init__(self, path: str = DEFAULT_PATH, ttl: float = DEFAULT_TTL) -> None:
+        """
+        Initializes the HeroCatalog object, creating the catalog file if it doesn't exist.
+
+        Args:
+            path (str): The path of the SQLite file of the catalog (':memory:' for a catalog that is not persisted).
+            ttl (float): The time in seconds after which a stored character is considered stale.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS heroes ("
+            "id INTEGER PRIMARY KEY, valid INTEGER NOT NULL, data TEXT, fetched_at REAL NOT NULL)"
+        )
+        self.connection.commit()
+        self.hero_index: "HeroIndex | None" = None  # built on first use, then updated by put
+
+    def get(self, character_id: str) -> dict[str, str] | None:
+        """
+        Gets the data of a fresh valid character.
+
+        Args:
+            character_id (str): The ID of the character.
+
+        Returns:
+            dict[str, str] | None: A copy of the data of the character, or None if it is unknown, stale or invalid.
+        """
+        row = self.connection.execute(
+            "SELECT data FROM heroes WHERE id = ? AND valid = 1 AND fetched_at >= ?",
+            (int(character_id), self.fresh_since())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def is_known(self, character_id: str) -> bool:
+        """
+        Checks whether a character has a fresh entry in the catalog, valid or not.
+
+        Args:
+            character_id (str): The ID of the character.
+
+        Returns:
+            bool: True if the character doesn't need to be requested from the API.
+        """
+        row = self.connection.execute(
+            "SELECT 1 FROM heroes WHERE id = ? AND fetched_at >= ?", (int(character_id), self.fresh_since())
+        ).fetchone()
+        return row is not None
+
+    def invalid_ids(self) -> set[str]:
+        """
+        Returns:
+            set[str]: The IDs of the fresh characters known to be invalid.
+        """
+        rows = self.connection.execute(
+            "SELECT id FROM heroes WHERE valid = 0 AND fetched_at >= ?", (self.fresh_since(),)
+        )
+        return {str(row[0]) for row in rows}
+
+    def valid_heroes(self) -> dict[str, dict[str, str]]:
+        """
+        Returns:
+            dict[str, dict[str, str]]: The data of the fresh valid characters, keyed by character ID.
+        """
+        rows = self.connection.execute(
+            "SELECT id, data FROM heroes WHERE valid = 1 AND fetched_at >= ? ORDER BY id", (self.fresh_since(),)
+        )
+        return {str(row[0]): json.loads(row[1]) for row in rows}
+
+    def put(self, character_id: str, data: dict[str, str] | None) -> None:
+        """
+        Stores a character in the catalog.
+
+        Args:
+            character_id (str): The ID of the character.
+            data (dict[str, str] | None): The data of the character (powerstats and alignment), or None if it is invalid.
+        """
+        self.connection.execute(
+            "INSERT OR REPLACE INTO heroes (id, valid, data, fetched_at) VALUES (?, ?, ?, ?)",
+            (int(character_id), data is not None, json.dumps(data) if data is not None else None, time.time())
+        )
+        self.connection.commit()
+        if self.hero_index is not None:
+            self.hero_index.put(character_id, data)
+
+    def index(self) -> "HeroIndex":
+        """
+        Returns:
+            HeroIndex: The index of the characters of the catalog, to draw IDs from. It is built from the fresh
+                characters the first time, and kept up to date with the characters stored afterwards.
+        """
+        if self.hero_index is None:
+            from modules.sampler import HeroIndex
+
+            self.hero_index = HeroIndex.from_heroes(self.valid_heroes(), self.invalid_ids())
+        return self.hero_index
+
+    def fresh_since(self) -> float:
+        """
+        Returns:
+            float: The timestamp before which entries are considered stale.
+        """
+        return time.time() - self.ttl
+
+    async def prefetch_all(self, client: "ApiClient", max_in_flight: int = 8) -> tuple[int, dict[str, "ApiError"]]:
+        """
+        Fetches every character of the API that has no fresh entry in the catalog.
+
+        A character that can't be fetched is left unknown, so it is requested again by the next prefetch or battle,
+        without stopping the others.
+
+        Args:
+            client (ApiClient): The client of the superhero API.
+            max_in_flight (int): The maximum number of characters being fetched concurrently.
+
+        Returns:
+            tuple[int, dict[str, ApiError]]: The number of characters fetched, and the error of each character that
+                couldn't be fetched, keyed by character ID.
+        """
+        import asyncio
+        from modules.api import ApiError, InvalidResponseError
+
+        semaphore = asyncio.Semaphore(max_in_flight)
+        failures: dict[str, ApiError] = {}
+
+        async def fetch(character_id: str) -> None:
+            try:
+                async with semaphore:
+                    powerstats_data, biography_data = await asyncio.gather(
+                        client.get_json(f"{character_id}/powerstats"),
+                        client.get_json(f"{character_id}/biography")
+                    )
+            except ApiError as error:
+                if isinstance(error, InvalidResponseError) and error.status == 404:
+                    self.put(character_id, None)
+                else:
+                    failures[character_id] = error
+                return
+            alignment = biography_data.get('alignment')
+            valid = is_valid(powerstats_data, alignment)
+            self.put(character_id, {**powerstats_data, "alignment": alignment} if valid else None)
+
+        missing = [
+            str(character_id) for character_id in range(1, MAX_CHARACTER_ID + 1)
+            if not self.is_known(str(character_id))
+        ]
+        await asyncio.gather(*(fetch(character_id) for character_id in missing))
+        return len(missing) - len(failures), failures
+
+    def close(self) -> None:
+        """
+        Closes the connection to the catalog file.
+        """
+        self.connection.close()
+
+def warm(path: str = DEFAULT_PATH) -> None:
+    """
+    Fetches every character of the API missing from the catalog file, and prints what was stored.
+
+    Args:
+        path (str): The path of the SQLite file of the catalog.
+    """
+    from modules.api import ApiClient
+    from utils.constants import API_KEY
+
+    catalog = HeroCatalog(path)
+    with ApiClient(f"https://superheroapi.com/api/{API_KEY}/") as api_client:
+        fetched, failures = api_client.run(catalog.prefetch_all(api_client))
+    print(f"✅ Catalog is warm: {fetched} characters fetched, {len(catalog.valid_heroes())} valid characters stored.")
+    if failures:
+        print(f"⚠️ {len(failures)} characters couldn't be fetched and will be retried: {', '.join(sorted(failures, key=int))}")
+    catalog.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the local superhero catalog.")
+    parser.add_argument("command", choices=["prefetch-all"])
+    parser.add_argument("--path", default=DEFAULT_PATH)
+    args = parser.parse_args()
+    warm(args.path)
@@ -3,11 +3,18 @@ The character module defines the Character class, which represents a superhero c
 
 It contains methods to initialize a character with initial data, set their real stats, calculate their HP and attacks, assess damage inflicted during battles, and update their status based on their HP.
 
+Stats are parsed once when the character is created and stored as integers; the data of the character (name, alignment and stats, as strings like in the API) is exposed through a read-only view.
+
 Classes:
+    CharacterData: Read-only view of the data of a character.
     Character: Represents a superhero character in the superhero battle game.
 
 Attributes:
-    data (dict[str, str]): Data about the character.
+    name (str): The name of the character.
+    alignment (str): The alignment of the character ('good', 'bad' or 'neutral').
+    base_stats (tuple[int, ...]): The stats of the character, as returned by the API, in the order of STATS.
+    stats (tuple[int, ...]): The real stats of the character for a battle, in the order of STATS.
+    data (CharacterData): Read-only view of the data of the character.
     actual_stamina (int): The actual stamina of the character, initialized randomly.
     attack (list[float]): A list to store the damage for the 3 types of attack of the character.
     status (str): The status of the character ('🟢' for healthy, '🟡' for wounded, '🔴' for defeated).
@@ -23,34 +30,86 @@ Methods:
     set_status: Sets the status of the character based on their current HP.
     __str__: Returns a string representation of the character, including their status, name, alignment, HP, and attacks.
 """
+from __future__ import annotations
 import math
 import random
+from collections.abc import Iterator, Mapping
+
+STATS = ("combat", "durability", "intelligence", "power", "speed", "strength")
+STAT_INDEX = {stat: i for i, stat in enumerate(STATS)}
+COMBAT, DURABILITY, INTELLIGENCE, POWER, SPEED, STRENGTH = range(len(STATS))
+
+# stats and weights of the 3 types of attack (mental, strong, fast)
+ATTACKS = (
+    ((INTELLIGENCE, SPEED, COMBAT), (.7, .2, .1)),
+    ((STRENGTH, POWER, COMBAT), (.6, .2, .2)),
+    ((SPEED, DURABILITY, STRENGTH), (.55, .25, .2))
+)
+
+class CharacterData(Mapping):
+    __slots__ = ("character",)
+
+    def __init__(self, character: "Character") -> None:
+        """
+        Initializes the CharacterData object.
+
+        Args:
+            character (Character): The character whose data is viewed.
+        """
+        self.character = character
+
+    def __getitem__(self, key: str) -> str:
+        if key == "name":
+            return self.character.name
+        if key == "alignment":
+            return self.character.alignment
+        return str(self.character.stats[STAT_INDEX[key]])
+
+    def __iter__(self) -> Iterator[str]:
+        yield "name"
+        yield "alignment"
+        yield from STATS
+
+    def __len__(self) -> int:
+        return len(STATS) + 2
 
 class Character:
-    def __init__(self, data: dict[str, str]) -> None:
+    __slots__ = ("name", "alignment", "base_stats", "stats", "actual_stamina", "attack", "status", "fb", "hp")
+
+    def __init__(self, data: Mapping[str, str], rng: random.Random | None = None) -> None:
         """
         Initializes the Character object.
 
         Args:
-            data (dict[str, str]): Data about the character.
+            data (Mapping[str, str]): Data about the character (name, alignment and stats).
+            rng (random.Random | None): The RNG used to draw the actual stamina, the global one if not provided.
         """
         # data of the character
-        self.data = data
-        self.actual_stamina = random.randrange(11)
+        self.name = data["name"]
+        self.alignment = data["alignment"]
+        self.base_stats = tuple(int(data[stat]) for stat in STATS)
+        self.stats = self.base_stats
+        self.actual_stamina = (rng or random).randrange(11)
         self.attack: list[float] = []
         self.status = "🟢"
         self.fb: float = 0
         self.hp = 0
 
+    @property
+    def data(self) -> CharacterData:
+        """
+        Returns:
+            CharacterData: Read-only view of the data of the character.
+        """
+        return CharacterData(self)
+
     def set_real_stats(self) -> None:
         """
         Sets the real stats of the character based on its initial data and the affiliation of the team it belongs to for a battle.
         """
-        for key, stat in self.data.items():
-            if key in ("combat", "durability", "intelligence", "power", "speed", "strength"):
-                self.data[key] = str(math.floor(
-                    (2 * int(stat) + self.actual_stamina) / 1.1 * self.fb
-                ))
+        self.stats = tuple(
+            math.floor((2 * stat + self.actual_stamina) / 1.1 * self.fb) for stat in self.base_stats
+        )
 
     def set_hp(self) -> None:
         """
@@ -58,8 +117,9 @@ class Character:
         """
         strength_weight = .8
         durability_weight = .7
+        stats = self.stats
         self.hp = math.floor(
-            (int(self.data["strength"]) * strength_weight + int(self.data["durability"]) * durability_weight + int(self.data["power"])) / 2 *
+            (stats[STRENGTH] * strength_weight + stats[DURABILITY] * durability_weight + stats[POWER]) / 2 *
             (1 + self.actual_stamina / 10)
         ) + 100
 
@@ -68,12 +128,9 @@ class Character:
         Sets the damage for the 3 types of attack of the character.
         """
         if len(self.attack) == 0:
-            self.attack.append(self.calculate_attack(
-                ["intelligence", "speed", "combat"], [.7, .2, .1]))
-            self.attack.append(self.calculate_attack(
-                ["strength", "power", "combat"], [.6, .2, .2]))
-            self.attack.append(self.calculate_attack(
-                ["speed", "durability", "strength"], [.55, .25, .2]))
+            stats = self.stats
+            for (i, j, k), w in ATTACKS:
+                self.attack.append((stats[i] * w[0] + stats[j] * w[1] + stats[k] * w[2]) * self.fb)
 
     def calculate_attack(self, stats: list[str], w: list[float]) -> float:
         """
@@ -86,11 +143,8 @@ class Character:
         Returns:
             float: The damage of the attack.
         """
-        return (
-            float(self.data[stats[0]]) * w[0]
-            + float(self.data[stats[1]]) * w[1]
-            + float(self.data[stats[2]]) * w[2]
-        ) * self.fb
+        i, j, k = (STAT_INDEX[stat] for stat in stats)
+        return (self.stats[i] * w[0] + self.stats[j] * w[1] + self.stats[k] * w[2]) * self.fb
 
     def assess_damage(self, damage: float) -> None:
         """
@@ -108,4 +162,4 @@ class Character:
         self.status = "🟡" if self.hp > 0 else "🔴"
 
     def __str__(self) -> str:
-        return f"\n  {self.status} {self.data['name']} ({self.data['alignment']}), HP: {str(self.hp)}\n     Attacks (damage): Mental ({str(round(self.attack[0]))}), Strong ({str(round(self.attack[1]))}), Fast ({str(round(self.attack[2]))})"
+        return f"\n  {self.status} {self.name} ({self.alignment}), HP: {str(self.hp)}\n     Attacks (damage): Mental ({str(round(self.attack[0]))}), Strong ({str(round(self.attack[1]))}), Fast ({str(round(self.attack[2]))})"
@@ -0,0 +1,285 @@
+"""
+The draft module searches a roster of characters (e.g. the hero catalog) for the team with the highest expected win rate
+against an opponent team, or against random teams of the roster.
+
+A team's alignment and the filiation coefficients of its characters follow Team.set_team_alignment and
+Team.update_characters: a team is good when more than half of its characters are good (3 or more in a team of 5) and
+bad otherwise, and a character draws a coefficient from 1 to 10 when it shares the alignment of its team, or from 1/10
+to 1 otherwise. Before searching, the attributes of every character are averaged (and maximized) over its 110
+combinations of actual stamina and coefficient draw, for each team alignment, with the formulas of batch.prepare_teams.
+
+The search has two stages:
+    1. The characters are indexed per team alignment, sorted by strength (expected HP times expected damage) in a team
+       of that alignment, and flagged when they count against it (in a team of 5, at most 2 characters of a good team
+       can be bad or neutral, and at most 2 of a bad team can be good). A branch and bound over each index finds the
+       lineups with the highest fighting strength (total expected HP times total expected damage), pruning every partial
+       lineup whose upper bound (the HP and damage of its characters plus the highest ones left in the index for each
+       free slot) can't beat the lineups already found.
+    2. The best lineups are scored together, as one batch of simulated battles of the batch module against the
+       opponent, half of them attacking first, and the lineup with the highest win rate is returned.
+
+Classes:
+    Draft: The result of a draft.
+
+Functions:
+    hero_profiles: Computes the expected and best attributes of characters in a team of an alignment.
+    max_off_alignment: Computes how many characters of a team can be off its alignment.
+    best_lineups: Finds the lineups with the highest fighting strength of an index of characters.
+    score_lineups: Estimates the win rate of lineups against an opponent.
+    draft: Searches a roster for the team with the highest expected win rate.
+
+Example:
+    To draft the best good team against 5 characters of the catalog, run
+    `draft(HeroCatalog().valid_heroes(), opponent=["70", "644", "149", "423", "313"], alignment="good")`, or
+    `python main.py draft --opponent 70,644,149,423,313 --alignment good`.
+"""
+from __future__ import annotations
+import heapq
+from typing import NamedTuple
+import numpy as np
+from modules.batch import BatchSimulator, prepare_teams
+from modules.character import STATS
+from modules.tables import FB_DRAWS, STAMINA_LEVELS
+
+TEAM_SIZE = 5
+TEAM_ALIGNMENTS = ("good", "bad")
+
+class Draft(NamedTuple):
+    ids: tuple[str, ...]  # IDs of the characters of the team
+    team_alignment: str
+    win_rate: float  # estimated win rate against the opponent
+    lineups: int  # number of lineups scored by simulation
+    explored: int  # number of partial lineups explored by the branch and bound
+
+def hero_profiles(raw_stats: np.ndarray, alignments: np.ndarray, team_alignment: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the expected HP and damage of characters in a team of an alignment, over every combination of actual
+    stamina and filiation coefficient draw.
+
+    Args:
+        raw_stats (np.ndarray): The stats of the characters as returned by the API, of shape (n, 6), in the order of
+            STATS.
+        alignments (np.ndarray): The alignments of the characters, of shape (n,).
+        team_alignment (str): The alignment of the team ('good' or 'bad').
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The expected HP and the expected damage of an attack of each character, of
+            shape (n,) each.
+    """
+    stamina, draws = (
+        grid.ravel() for grid in np.meshgrid(np.arange(STAMINA_LEVELS), np.arange(FB_DRAWS), indexing="ij")
+    )
+    shape = (len(raw_stats), stamina.size)
+    # each character is prepared as a team of its 110 combinations
+    prepared = prepare_teams(
+        np.broadcast_to(raw_stats[:, None, :], (*shape, len(STATS))),
+        np.broadcast_to(alignments[:, None], shape),
+        np.broadcast_to(stamina, shape),
+        np.broadcast_to(draws, shape),
+        np.full(len(raw_stats), team_alignment)
+    )
+    return prepared.hp.mean(axis=1), prepared.attack.mean(axis=(1, 2))
+
+def max_off_alignment(team_alignment: str, team_size: int) -> int:
+    """
+    Args:
+        team_alignment (str): The alignment of the team ('good' or 'bad').
+        team_size (int): The number of characters in the team.
+
+    Returns:
+        int: The highest number of characters of the team that can be off its alignment: a team is good when more than
+            half of its characters are good (e.g. 2 for a team of 5 of either alignment, 1 for a good team of 4 and 2
+            for a bad one).
+    """
+    majority = team_size // 2 + 1
+    return team_size - majority if team_alignment == "good" else majority - 1
+
+def best_lineups(
+    hp: np.ndarray,
+    damage: np.ndarray,
+    off_alignment: np.ndarray,
+    count: int,
+    team_size: int = TEAM_SIZE,
+    max_off: int | None = None
+) -> tuple[list[tuple[float, tuple[int, ...]]], int]:
+    """
+    Finds the lineups with the highest fighting strength (total HP times total damage) of an index of characters, by a
+    branch and bound.
+
+    Args:
+        hp (np.ndarray): The HP of the characters of the index, of shape (n,), sorted by decreasing strength.
+        damage (np.ndarray): The damage of the characters of the index, of shape (n,).
+        off_alignment (np.ndarray): Whether each character counts against the alignment of the team (not good in a
+            good team, good in a bad team), of shape (n,).
+        count (int): The number of lineups to find.
+        team_size (int): The number of characters in a lineup.
+        max_off (int | None): The highest number of characters off alignment in a lineup, that of a good team of the
+            size if not provided.
+
+    Returns:
+        tuple[list[tuple[float, tuple[int, ...]]], int]: The strength and the positions in the index of the best
+            lineups, from the strongest, and the number of partial lineups explored.
+    """
+    if max_off is None:
+        max_off = max_off_alignment("good", team_size)
+    hp, damage, off = hp.tolist(), damage.tolist(), off_alignment.tolist()
+    n = len(hp)
+    # highest HP and damage from each position of the index to its end
+    max_hp = np.maximum.accumulate(np.asarray(hp)[::-1])[::-1].tolist() + [0]
+    max_damage = np.maximum.accumulate(np.asarray(damage)[::-1])[::-1].tolist() + [0]
+
+    best: list[tuple[float, tuple[int, ...]]] = []  # min-heap of the best lineups found
+    explored = 0
+    # partial lineups: positions, total HP, total damage, number of characters off alignment, next position
+    stack = [((), 0.0, 0.0, 0, 0)]
+    while stack:
+        lineup, total_hp, total_damage, n_off, start = stack.pop()
+        explored += 1
+        free = team_size - len(lineup)
+        if free == 0:
+            strength = total_hp * total_damage
+            if len(best) < count:
+                heapq.heappush(best, (strength, lineup))
+            elif strength > best[0][0]:
+                heapq.heapreplace(best, (strength, lineup))
+            continue
+        children = []
+        for i in range(start, n - free + 1):
+            if len(best) == count:
+                # bound of every lineup completed from position i on, which only decreases with i
+                if (total_hp + free * max_hp[i]) * (total_damage + free * max_damage[i]) <= best[0][0]:
+                    break
+                bound = (total_hp + hp[i] + (free - 1) * max_hp[i + 1]) * (
+                    total_damage + damage[i] + (free - 1) * max_damage[i + 1]
+                )
+                if bound <= best[0][0]:
+                    continue
+            if off[i] and n_off == max_off:
+                continue
+            children.append((lineup + (i,), total_hp + hp[i], total_damage + damage[i], n_off + off[i], i + 1))
+        # the strongest characters are explored first
+        stack.extend(reversed(children))
+    return sorted(best, reverse=True), explored
+
+def score_lineups(
+    raw_stats: np.ndarray,
+    alignments: np.ndarray,
+    lineups: np.ndarray,
+    opponent: np.ndarray | None,
+    samples: int,
+    rng: np.random.Generator
+) -> np.ndarray:
+    """
+    Estimates the win rate of lineups against an opponent, by simulating all their battles at once.
+
+    Every battle draws the actual stamina and filiation coefficients of both teams, like a real battle, and the lineup
+    attacks first in half of the battles of each lineup.
+
+    Args:
+        raw_stats (np.ndarray): The stats of the characters of the roster, of shape (n, 6), in the order of STATS.
+        alignments (np.ndarray): The alignments of the characters of the roster, of shape (n,).
+        lineups (np.ndarray): The characters of the lineups, as rows of the roster, of shape (M, team size).
+        opponent (np.ndarray | None): The characters of the opponent team, as rows of the roster, of shape
+            (team size,), or None to battle a random team of the roster in each battle.
+        samples (int): The number of battles of each lineup.
+        rng (np.random.Generator): The RNG of the battles.
+
+    Returns:
+        np.ndarray: The win rate of each lineup, of shape (M,).
+    """
+    team_size = lineups.shape[1]
+    ours = np.repeat(lineups, samples, axis=0)
+    if opponent is None:
+        # each battle draws distinct characters, like Battle.get_teams
+        theirs = np.argsort(rng.random((len(ours), len(raw_stats))), axis=1)[:, :team_size]
+    else:
+        theirs = np.broadcast_to(opponent, ours.shape)
+    rows = np.concatenate([ours, theirs])
+    prepared = prepare_teams(
+        raw_stats[rows],
+        alignments[rows],
+        rng.integers(STAMINA_LEVELS, size=rows.shape),
+        rng.integers(FB_DRAWS, size=rows.shape)
+    )
+    hp = np.concatenate([prepared.hp[:len(ours)], prepared.hp[len(ours):]], axis=1)
+    attack = np.concatenate([prepared.attack[:len(ours)], prepared.attack[len(ours):]], axis=1)
+
+    wins = np.zeros(len(ours))
+    first = np.arange(len(ours)) % 2 == 0
+    for side, battles in ((0, first), (1, ~first)):
+        wins[battles] = BatchSimulator(hp[battles], attack[battles], side).run(rng) == 0
+    return wins.reshape(len(lineups), samples).mean(axis=1)
+
+def draft(
+    roster: dict[str, dict[str, str]],
+    opponent: list[str] | None = None,
+    alignment: str | None = None,
+    team_size: int = TEAM_SIZE,
+    lineups: int = 64,
+    samples: int = 256,
+    seed: int | None = None
+) -> Draft:
+    """
+    Searches a roster for the team with the highest expected win rate against an opponent.
+
+    Args:
+        roster (dict[str, dict[str, str]]): The data of the valid characters, keyed by character ID.
+        opponent (list[str] | None): The IDs of the characters of the opponent team, None to battle random teams of
+            the roster.
+        alignment (str | None): The alignment of the team ('good' or 'bad'), None to search both.
+        team_size (int): The number of characters in a team.
+        lineups (int): The number of strongest lineups of each alignment scored by simulation.
+        samples (int): The number of battles simulated per lineup.
+        seed (int | None): The seed of the battles, a fresh one if not provided.
+
+    Returns:
+        Draft: The best team found.
+
+    Raises:
+        ValueError: If the roster doesn't have enough characters, or the opponent is not a team of `team_size` distinct
+            characters of the roster.
+    """
+    excluded = set(opponent or ())
+    if opponent is not None and len(opponent) != team_size:
+        raise ValueError(f"the opponent team has {len(opponent)} characters, {team_size} are needed")
+    if len(excluded) != len(opponent or ()):
+        raise ValueError("the opponent team has the same character more than once")
+    if not excluded <= roster.keys():
+        raise ValueError(f"characters missing from the roster: {', '.join(sorted(excluded - roster.keys()))}")
+    ids = list(roster)
+    raw_stats = np.array([[int(roster[i][stat]) for stat in STATS] for i in ids], dtype=np.int64)
+    raw_stats = raw_stats.reshape(len(ids), len(STATS))
+    alignments = np.array([roster[i]["alignment"] for i in ids])
+    # the opponent's characters can't be drafted, like a character can't be in both teams of a battle
+    candidates = np.array([row for row, i in enumerate(ids) if i not in excluded], dtype=np.int64)
+    if len(candidates) < team_size:
+        raise ValueError(f"the roster has {len(candidates)} characters to draft from, {team_size} are needed")
+
+    found = []
+    explored = 0
+    for team_alignment in (alignment,) if alignment is not None else TEAM_ALIGNMENTS:
+        hp, damage = hero_profiles(raw_stats[candidates], alignments[candidates], team_alignment)
+        good = alignments[candidates] == "good"
+        off_alignment = ~good if team_alignment == "good" else good
+        # index of the characters for a team of the alignment, from the strongest
+        order = np.argsort(-hp * damage, kind="stable")
+        index = candidates[order]
+        max_off = max_off_alignment(team_alignment, team_size)
+        best, lineup_explored = best_lineups(
+            hp[order], damage[order], off_alignment[order], lineups, team_size, max_off
+        )
+        found.extend(index[list(positions)] for _, positions in best)
+        explored += lineup_explored
+    if not found:
+        raise ValueError(f"no team of {team_size} characters has the alignment {alignment}")
+
+    found_lineups = np.array(found)
+    opponent_rows = np.array([ids.index(i) for i in opponent]) if opponent is not None else None
+    win_rates = score_lineups(
+        raw_stats, alignments, found_lineups, opponent_rows, samples, np.random.default_rng(seed)
+    )
+    best_lineup = found_lineups[int(np.argmax(win_rates))]
+    team_alignment = "good" if 2 * (alignments[best_lineup] == "good").sum() > team_size else "bad"
+    return Draft(
+        tuple(ids[row] for row in best_lineup), team_alignment, float(win_rates.max()), len(found_lineups), explored
+    )
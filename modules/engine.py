@@ -0,0 +1,535 @@
+"""
+The engine module runs battles between two teams of characters without any user interaction.
+
+It contains the Engine class, which applies the rules of the game to two prepared teams (team alignment set and characters
+updated): the teams attack in turns, starting with the first team. On each turn the attacking team's policy picks the
+attacker, the attack type is drawn at random from the engine's RNG, and the victim is drawn at random too unless the
+policy picks a target. The battle ends when all the characters of a team are defeated. The engine neither prints nor sleeps, so it can be used to run many battles.
+The indexes of the alive characters of each team are kept by the engine and updated when a character is defeated, so
+attacks don't scan the HP of every character. Small teams keep them in a plain list, and large ones in an AliveSet, in
+which drawing the k-th alive character and removing a defeated one both take O(log n). Policies that target characters
+by HP use an HpOrder of the opposing team, built on first use and updated on each hit, and policies that pick the
+attacker by a fixed strength use a ranking of the team (see Engine.hp_order and Engine.strongest), so a turn takes
+O(log n) for teams of any size with the built-in policies other than the lookahead search.
+
+A battle can be recorded (prepared characters, seed of the fight and attacker choices) and replayed exactly later on,
+e.g. to compare runs like for like. Every hit can also be emitted to a sink of the events module, to log many battles.
+
+Classes:
+    AliveSet: The indexes of the alive characters of a large team, in team order.
+    HpOrder: The alive characters of a team, sorted by HP.
+    Hit: A record of a single attack.
+    BattleResult: A compact record of a finished battle.
+    BattleRecord: Everything needed to replay a battle exactly.
+    Policy: Base class of the policies choosing the attacker and the target of a team, which picks them at random.
+    FunctionPolicy: Policy choosing the attacker with an attacker-selection function.
+    ScriptedPolicy: Policy replaying recorded choices.
+    Engine: Represents the state of a battle between two teams.
+
+Functions:
+    random_attacker: Attacker-selection policy that picks a random alive character.
+    simulate: Runs a whole battle between two teams and returns its result.
+    snapshot: Captures the prepared characters of a team.
+    replay: Re-runs a recorded battle.
+
+Example:
+    To simulate a battle, prepare two Team objects and run `simulate((team_1, team_2), random.Random(seed))`.
+"""
+from __future__ import annotations
+import bisect
+import random
+from array import array
+from collections.abc import Iterator, Sequence
+from typing import Callable, NamedTuple
+from modules.character import STATS, Character
+from modules.events import EventSink
+from modules.team import Team
+
+ATTACK_TYPES = ("mental", "strong", "fast")
+# teams up to this size keep their alive characters in a plain list: indexing it is faster than an AliveSet, and
+# removing a defeated character only shifts a few hundred pointers
+SMALL_TEAM_SIZE = 256
+
+class AliveSet(Sequence[int]):
+    def __init__(self, alive: list[int], size: int) -> None:
+        """
+        Initializes the AliveSet object.
+
+        The set is a Fenwick tree over the positions of the team, counting the alive characters of each range of
+        positions: the k-th alive character is found by descending the tree, and a defeated character is removed by
+        updating the O(log n) ranges that contain it. It takes 5 bytes per character of the team.
+
+        Args:
+            alive (list[int]): The indexes of the alive characters, in team order.
+            size (int): The number of characters of the team.
+        """
+        self.flags = bytearray(size)
+        for i in alive:
+            self.flags[i] = 1
+        self.count = len(alive)
+        # tree[i] counts the alive characters at positions [i - lowbit(i), i) of the team, from 1
+        self.tree = array("i", bytes(4 * (size + 1)))
+        for i in range(1, size + 1):
+            self.tree[i] += self.flags[i - 1]
+            parent = i + (i & -i)
+            if parent <= size:
+                self.tree[parent] += self.tree[i]
+        self.top = 1 << size.bit_length() - 1 if size else 0  # highest power of 2 up to the size
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, k: int) -> int:  # type: ignore[override]
+        """
+        Args:
+            k (int): The rank of the character among the alive ones, in team order (negative from the end).
+
+        Returns:
+            int: The index of the k-th alive character in its team.
+
+        Raises:
+            IndexError: If there are not that many alive characters.
+        """
+        if k < 0:
+            k += self.count
+        if not 0 <= k < self.count:
+            raise IndexError("alive character out of range")
+        position, step, tree = 0, self.top, self.tree
+        while step:
+            if position + step < len(tree) and tree[position + step] <= k:
+                position += step
+                k -= tree[position]
+            step >>= 1
+        return position
+
+    def __iter__(self) -> Iterator[int]:
+        return (i for i, flag in enumerate(self.flags) if flag)
+
+    def __contains__(self, i: object) -> bool:
+        return isinstance(i, int) and 0 <= i < len(self.flags) and self.flags[i] == 1
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Sequence):
+            return len(other) == self.count and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+    def remove(self, i: int) -> None:
+        """
+        Removes a defeated character.
+
+        Args:
+            i (int): The index of the character in its team.
+
+        Raises:
+            ValueError: If the character is not alive.
+        """
+        if i not in self:
+            raise ValueError(f"character {i} is not alive")
+        self.flags[i] = 0
+        self.count -= 1
+        position = i + 1
+        while position < len(self.tree):
+            self.tree[position] -= 1
+            position += position & -position
+
+class HpOrder:
+    def __init__(self, characters: list[Character], alive: Sequence[int]) -> None:
+        """
+        Initializes the HpOrder object.
+
+        The alive characters are kept as a sorted list of (HP, index) pairs, the lowest HP first and the first in team
+        order on ties, which answers both the lowest HP and the closest HP to a damage with a binary search. Only alive
+        characters are listed, so the list shrinks as they are defeated.
+
+        Args:
+            characters (list[Character]): The characters of the team.
+            alive (Sequence[int]): The indexes of the alive characters.
+        """
+        self.entries = sorted((characters[i].hp, i) for i in alive)
+
+    def update(self, i: int, previous_hp: float, hp: float) -> None:
+        """
+        Moves a character after it was hit.
+
+        Args:
+            i (int): The index of the character in its team.
+            previous_hp (float): The HP of the character before the hit.
+            hp (float): The HP of the character after the hit, 0 if it was defeated.
+        """
+        del self.entries[bisect.bisect_left(self.entries, (previous_hp, i))]
+        if hp > 0:
+            bisect.insort(self.entries, (hp, i))
+
+    def lowest(self) -> int:
+        """
+        Returns:
+            int: The index of the alive character with the lowest HP, the first in team order on ties.
+        """
+        return self.entries[0][1]
+
+    def closest_above(self, hp: float) -> int:
+        """
+        Args:
+            hp (float): The HP threshold, e.g. the damage of an attack.
+
+        Returns:
+            int: The index of the alive character with the lowest HP from the threshold on, or with the highest HP if
+                they are all below it, the first in team order on ties.
+        """
+        position = bisect.bisect_left(self.entries, (hp, -1))
+        if position == len(self.entries):
+            position = bisect.bisect_left(self.entries, (self.entries[-1][0], -1))
+        return self.entries[position][1]
+
+class Hit(NamedTuple):
+    round: int  # incremented each time any team attacks
+    side: int  # index of the attacking team (0 or 1)
+    attacker: int  # index of the attacker in its team
+    attack_type: int  # index in ATTACK_TYPES and Character.attack
+    victim: int  # index of the victim in its team
+    damage: float
+    victim_hp: float  # HP of the victim after the attack
+
+class BattleResult(NamedTuple):
+    winner: int  # index of the winning team (0 or 1)
+    rounds: int
+    hits: list[Hit]
+
+class BattleRecord(NamedTuple):
+    teams: tuple[list[dict], list[dict]]  # snapshots of the prepared teams, the first one attacks first
+    seed: int  # seed of the RNG of the fight
+    attackers: list[int]  # index of the attacker of every hit
+    victims: list[int] | None = None  # index of the victim of every hit, if targets were chosen by policies
+
+# an attacker-selection function receives the indexes of the alive characters of its team, the engine and the RNG of
+# the policies, and returns the index of the attacker
+AttackerPolicy = Callable[[list[int], "Engine", random.Random], int]
+
+def random_attacker(alive: list[int], engine: "Engine", rng: random.Random) -> int:
+    """
+    Picks a random alive character as the attacker.
+
+    Args:
+        alive (list[int]): The indexes of the alive characters of the attacking team.
+        engine (Engine): The engine running the battle.
+        rng (random.Random): The RNG of the battle.
+
+    Returns:
+        int: The index of the attacker.
+    """
+    return alive[rng.randrange(len(alive))]
+
+class Policy:
+    """
+    Base class of the policies choosing the attacker and the target of a team. The base policy picks both at random,
+    following the rules of the game; strategies override either method (see the policies module).
+    """
+
+    def choose_attacker(self, alive: list[int], engine: "Engine", rng: random.Random) -> int:
+        """
+        Chooses the attacker of the team, before the attack type is drawn.
+
+        Args:
+            alive (list[int]): The indexes of the alive characters of the attacking team.
+            engine (Engine): The engine running the battle, whose side is the attacking team.
+            rng (random.Random): The RNG of the policies.
+
+        Returns:
+            int: The index of the attacker.
+        """
+        return random_attacker(alive, engine, rng)
+
+    def choose_target(
+        self, alive: list[int], attacker: int, attack_type: int, engine: "Engine", rng: random.Random
+    ) -> int | None:
+        """
+        Chooses the victim of the attack, once the attack type is drawn.
+
+        Args:
+            alive (list[int]): The indexes of the alive characters of the opposing team.
+            attacker (int): The index of the attacker.
+            attack_type (int): The index of the attack type.
+            engine (Engine): The engine running the battle, whose side is the attacking team.
+            rng (random.Random): The RNG of the policies.
+
+        Returns:
+            int | None: The index of the victim, or None to let the engine draw a random victim.
+        """
+        return None
+
+class FunctionPolicy(Policy):
+    def __init__(self, choose_attacker: AttackerPolicy) -> None:
+        """
+        Initializes the FunctionPolicy object.
+
+        Args:
+            choose_attacker (AttackerPolicy): The attacker-selection function.
+        """
+        self.choose_attacker = choose_attacker
+
+class Engine:
+    def __init__(
+        self,
+        teams: tuple[Team, Team],
+        policies: tuple[Policy | AttackerPolicy, Policy | AttackerPolicy],
+        rng: random.Random,
+        record_hits: bool = True,
+        sink: EventSink | None = None,
+        battle: int = 0
+    ) -> None:
+        """
+        Initializes the Engine object.
+
+        Args:
+            teams (tuple[Team, Team]): The prepared teams, the first one attacks first.
+            policies (tuple[Policy | AttackerPolicy, Policy | AttackerPolicy]): The policy of each team, or its
+                attacker-selection function.
+            rng (random.Random): The RNG used to draw attack types and victims.
+            record_hits (bool): Whether to keep a log of every hit.
+            sink (EventSink | None): The sink every hit is emitted to, if any. Hits are emitted at the end of run, or
+                by flush_events when the battle is played step by step.
+            battle (int): The index of the battle in the events emitted to the sink.
+        """
+        self.teams = teams
+        self.policies = tuple(
+            policy if isinstance(policy, Policy) else FunctionPolicy(policy) for policy in policies
+        )
+        self.rng = rng
+        # policies draw from their own stream, so replaying their choices doesn't shift the draws of the engine
+        self.policy_rng = random.Random(rng.getrandbits(64))
+        self.record_hits = record_hits
+        self.sink = sink
+        self.battle = battle
+        self.events: list[Hit] = []  # hits not emitted to the sink yet
+        self.hits: list[Hit] = []
+        self.round = 0
+        self.side = 0  # index of the team attacking next
+        self.winner: int | None = None
+        # indexes of the alive characters of each team, in team order, updated when a character is defeated instead of
+        # scanning the HP of every character on each attack
+        self.alive_members: tuple[list[int] | AliveSet, ...] = tuple(
+            self.alive_set([i for i, character in enumerate(team.characters) if character.hp > 0], len(team.characters))
+            for team in teams
+        )
+        self.hp_orders: list[HpOrder | None] = [None, None]  # built when a policy first needs them
+        self.rankings: dict[tuple[int, Callable[[Character], float]], list] = {}
+
+    @staticmethod
+    def alive_set(alive: list[int], size: int) -> list[int] | AliveSet:
+        """
+        Args:
+            alive (list[int]): The indexes of the alive characters of a team, in team order.
+            size (int): The number of characters of the team.
+
+        Returns:
+            list[int] | AliveSet: The alive characters as a list for small teams, as an AliveSet for larger ones.
+        """
+        return alive if size <= SMALL_TEAM_SIZE else AliveSet(alive, size)
+
+    def alive(self, side: int) -> list[int] | AliveSet:
+        """
+        Args:
+            side (int): The index of the team.
+
+        Returns:
+            list[int] | AliveSet: The indexes of the characters of the team that are still alive, in team order. The
+                sequence is the live state of the engine, not a copy: it must not be modified.
+        """
+        return self.alive_members[side]
+
+    def hp_order(self, side: int) -> HpOrder:
+        """
+        Args:
+            side (int): The index of the team.
+
+        Returns:
+            HpOrder: The alive characters of the team sorted by HP, kept up to date by the engine after it is built.
+        """
+        order = self.hp_orders[side]
+        if order is None:
+            order = self.hp_orders[side] = HpOrder(self.teams[side].characters, self.alive_members[side])
+        return order
+
+    def strongest(self, side: int, key: Callable[[Character], float]) -> int:
+        """
+        Finds the alive character of a team with the highest key, the first in team order on ties.
+
+        The characters are sorted by key on the first call for the team and key, and the defeated ones are skipped
+        afterwards, so each call takes O(1) amortized. The key of a character must not change during the battle.
+
+        Args:
+            side (int): The index of the team.
+            key (Callable[[Character], float]): The strength of a character.
+
+        Returns:
+            int: The index of the character.
+        """
+        characters = self.teams[side].characters
+        ranking = self.rankings.get((side, key))
+        if ranking is None:
+            order = sorted(self.alive_members[side], key=lambda i: (-key(characters[i]), i))
+            ranking = self.rankings[side, key] = [order, 0]
+        order, position = ranking
+        while characters[order[position]].hp <= 0:
+            position += 1
+        ranking[1] = position
+        return order[position]
+
+    def step(self) -> Hit:
+        """
+        Plays the next attack of the battle.
+
+        Returns:
+            Hit: The record of the attack.
+        """
+        side = self.side
+        self.round += 1
+
+        policy = self.policies[side]
+        attacker_index = policy.choose_attacker(self.alive_members[side], self, self.policy_rng)
+        attack_type = self.rng.randrange(len(ATTACK_TYPES))
+        alive_victims = self.alive_members[1 - side]
+        # the random victim is always drawn, so policies choosing targets don't shift the draws of the engine
+        victim_index = alive_victims[self.rng.randrange(len(alive_victims))]
+        target = policy.choose_target(alive_victims, attacker_index, attack_type, self, self.policy_rng)
+        if target is not None:
+            victim_index = target
+
+        attacker = self.teams[side].characters[attacker_index]
+        victim = self.teams[1 - side].characters[victim_index]
+        damage = attacker.attack[attack_type]
+        previous_hp = victim.hp
+        victim.assess_damage(damage)
+        victim.set_status()
+        hp_order = self.hp_orders[1 - side]
+        if hp_order is not None:
+            hp_order.update(victim_index, previous_hp, victim.hp)
+
+        hit = Hit(self.round, side, attacker_index, attack_type, victim_index, damage, victim.hp)
+        if self.record_hits:
+            self.hits.append(hit)
+        if self.sink is not None:
+            self.events.append(hit)
+
+        if victim.hp == 0:
+            # removing a character keeps the team order the draws depend on
+            alive_victims.remove(victim_index)
+            if not alive_victims:
+                self.winner = side
+        self.side = 1 - side
+        return hit
+
+    def run(self) -> BattleResult:
+        """
+        Plays the battle until one of the teams is defeated.
+
+        Returns:
+            BattleResult: The result of the battle.
+        """
+        while self.winner is None:
+            self.step()
+        self.flush_events()
+        return BattleResult(self.winner, self.round, self.hits)
+
+    def flush_events(self) -> None:
+        """
+        Emits the hits played since the last call to the sink of the engine.
+        """
+        if self.events:
+            self.sink.write(self.battle, self.events)
+            self.events = []
+
+def simulate(
+    teams: tuple[Team, Team],
+    rng: random.Random,
+    policies: tuple[Policy | AttackerPolicy, Policy | AttackerPolicy] = (random_attacker, random_attacker),
+    record_hits: bool = True,
+    sink: EventSink | None = None,
+    battle: int = 0
+) -> BattleResult:
+    """
+    Runs a whole battle between two prepared teams.
+
+    Args:
+        teams (tuple[Team, Team]): The prepared teams, the first one attacks first.
+        rng (random.Random): The RNG used by the battle.
+        policies (tuple[Policy | AttackerPolicy, Policy | AttackerPolicy]): The policy of each team, or its
+            attacker-selection function.
+        record_hits (bool): Whether to keep a log of every hit.
+        sink (EventSink | None): The sink every hit is emitted to, if any.
+        battle (int): The index of the battle in the events emitted to the sink.
+
+    Returns:
+        BattleResult: The result of the battle.
+    """
+    return Engine(teams, policies, rng, record_hits, sink, battle).run()
+
+def snapshot(team: Team) -> list[dict]:
+    """
+    Captures the prepared characters of a team, before the battle starts.
+
+    Args:
+        team (Team): The prepared team.
+
+    Returns:
+        list[dict]: The data (with the stats as returned by the API), actual stamina and filiation coefficient of each
+            character, in a JSON-serializable form.
+    """
+    return [
+        {
+            "name": character.name,
+            "alignment": character.alignment,
+            **{stat: str(value) for stat, value in zip(STATS, character.base_stats)},
+            "actual_stamina": character.actual_stamina,
+            "fb": character.fb
+        }
+        for character in team.characters
+    ]
+
+def replay(record: BattleRecord, record_hits: bool = True) -> BattleResult:
+    """
+    Re-runs a recorded battle exactly.
+
+    Args:
+        record (BattleRecord): The record of the battle.
+        record_hits (bool): Whether to keep a log of every hit.
+
+    Returns:
+        BattleResult: The result of the battle, identical to the recorded one.
+    """
+    teams = []
+    for characters in record.teams:
+        team = Team([Character(data) for data in characters])
+        for character, data in zip(team.characters, characters):
+            character.actual_stamina = data["actual_stamina"]
+            character.fb = data["fb"]
+            character.set_real_stats()
+            character.set_hp()
+            character.set_attacks()
+        teams.append(team)
+
+    policy = ScriptedPolicy(record.attackers, record.victims)
+    return simulate((teams[0], teams[1]), random.Random(record.seed), (policy, policy), record_hits)
+
+class ScriptedPolicy(Policy):
+    def __init__(self, attackers: list[int], victims: list[int] | None = None) -> None:
+        """
+        Initializes the ScriptedPolicy object.
+
+        Args:
+            attackers (list[int]): The index of the attacker of every hit.
+            victims (list[int] | None): The index of the victim of every hit, None for random victims.
+        """
+        self.attackers = iter(attackers)
+        self.victims = iter(victims) if victims is not None else None
+
+    def choose_attacker(self, alive: list[int], engine: Engine, rng: random.Random) -> int:
+        return next(self.attackers)
+
+    def choose_target(
+        self, alive: list[int], attacker: int, attack_type: int, engine: Engine, rng: random.Random
+    ) -> int | None:
+        return next(self.victims) if self.victims is not None else None
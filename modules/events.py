@@ -0,0 +1,231 @@
+"""
+The events module logs the attacks of battles as structured events.
+
+Every attack of a battle run by the engine is emitted to a sink as an Event: the battle, the round, the attacking team,
+the attacker, the attack type, the victim, the damage and the HP of the victim after the attack. The engine hands the
+attacks of a battle to its sink at once, and sinks buffer events and write them in batches:
+    - RingBufferSink keeps the last events in memory, e.g. the history of an interactive battle.
+    - NdjsonSink streams events as newline-delimited JSON, one object per line.
+    - BinarySink streams events as fixed-width binary records, after a magic header. A binary log can be memory-mapped
+      with load_binary_log to analyze millions of simulated battles with NumPy, without parsing text.
+
+Record layout (little-endian, packed, 30 bytes): battle (uint32), round (uint32), side (uint8), attacker (uint16),
+attack type (uint8), victim (uint16), damage (float64), victim HP (float64). The last byte of the magic header is the
+version of the layout: version 1 logs, whose records had no battle, are not read.
+
+Classes:
+    Event: A structured record of an attack.
+    EventSink: Base class of the sinks of events.
+    RingBufferSink: Keeps the last events in memory.
+    NdjsonSink: Writes events as newline-delimited JSON.
+    BinarySink: Writes events as fixed-width binary records.
+
+Functions:
+    load_binary_log: Memory-maps a binary log as a NumPy structured array.
+    read_ndjson_log: Reads the events of a newline-delimited JSON log.
+
+Example:
+    To log simulated battles, run `simulate(teams, rng, sink=sink, battle=i)` for each battle inside
+    `with BinarySink("hits.bin") as sink:`, then analyze `load_binary_log("hits.bin")`.
+"""
+from __future__ import annotations
+import collections
+import itertools
+import json
+import os
+import struct
+from abc import ABC, abstractmethod
+from collections.abc import Iterable, Iterator
+from typing import IO, TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+MAGIC = b"FSHITS\x02\x00"  # magic header of the binary logs, with the version of the record layout
+RECORD = struct.Struct("<IIBHBHdd")
+
+class Event(NamedTuple):
+    battle: int  # index of the battle in the log
+    round: int  # incremented each time any team attacks
+    side: int  # index of the attacking team (0 or 1)
+    attacker: int  # index of the attacker in its team
+    attack_type: int  # index in engine.ATTACK_TYPES and Character.attack
+    victim: int  # index of the victim in its team
+    damage: float
+    victim_hp: float  # HP of the victim after the attack
+
+class EventSink(ABC):
+    """
+    Base class of the sinks of events. Sinks are context managers, which flush their buffer and close when exited.
+    """
+
+    @abstractmethod
+    def write(self, battle: int, hits: list[tuple]) -> None:
+        """
+        Receives the events of consecutive attacks of a battle.
+
+        Args:
+            battle (int): The index of the battle.
+            hits (list[tuple]): The attacks, as engine.Hit (round, side, attacker, attack type, victim, damage, victim HP).
+        """
+
+    def flush(self) -> None:
+        """
+        Writes the buffered events.
+        """
+
+    def close(self) -> None:
+        """
+        Writes the buffered events and releases the sink.
+        """
+        self.flush()
+
+    def __enter__(self) -> "EventSink":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+class RingBufferSink(EventSink):
+    def __init__(self, capacity: int = 1024) -> None:
+        """
+        Initializes the RingBufferSink object.
+
+        Args:
+            capacity (int): The number of events kept, the oldest ones being dropped first.
+        """
+        self.events: collections.deque[Event] = collections.deque(maxlen=capacity)
+
+    def write(self, battle: int, hits: list[tuple]) -> None:
+        self.events.extend(Event(battle, *hit) for hit in hits)
+
+class BufferedSink(EventSink):
+    mode = "wb"  # mode in which the sink opens its file
+    open_args: dict = {}
+
+    def __init__(self, file: str | IO, batch_size: int) -> None:
+        """
+        Initializes the BufferedSink object, the base of the sinks writing batches of events to a file.
+
+        Args:
+            file (str | IO): The path of the file, truncated if it exists, or a file object opened for writing.
+            batch_size (int): The number of events buffered before they are written.
+        """
+        self.owns_file = isinstance(file, str)
+        self.file = open(file, self.mode, **self.open_args) if isinstance(file, str) else file  # pylint: disable=consider-using-with
+        self.batch_size = batch_size
+        self.buffer: list[tuple] = []
+
+    def write(self, battle: int, hits: list[tuple]) -> None:
+        self.buffer.extend(self.buffered(battle, hits))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def buffered(self, battle: int, hits: list[tuple]) -> Iterable[tuple]:
+        """
+        Args:
+            battle (int): The index of the battle.
+            hits (list[tuple]): The attacks.
+
+        Returns:
+            Iterable[tuple]: The events buffered for the attacks.
+        """
+        return ((battle, *hit) for hit in hits)
+
+    def flush(self) -> None:
+        if self.buffer:
+            self.file.write(self.encode(self.buffer))
+            self.buffer = []
+
+    @abstractmethod
+    def encode(self, events: list[tuple]) -> str | bytes:
+        """
+        Args:
+            events (list[tuple]): The buffered events.
+
+        Returns:
+            str | bytes: The data written to the file for the events.
+        """
+
+    def close(self) -> None:
+        self.flush()
+        if self.owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+class NdjsonSink(BufferedSink):
+    """
+    Writes events as newline-delimited JSON objects, with the fields of Event.
+    """
+
+    mode = "w"
+    open_args = {"encoding": "utf-8"}
+
+    def __init__(self, file: str | IO, batch_size: int = 1024) -> None:
+        super().__init__(file, batch_size)
+
+    def encode(self, events: list[tuple]) -> str:
+        return "".join(
+            f'{{"battle":{battle},"round":{round_},"side":{side},"attacker":{attacker},"attack_type":{attack_type},'
+            f'"victim":{victim},"damage":{damage!r},"victim_hp":{victim_hp!r}}}\n'
+            for battle, round_, side, attacker, attack_type, victim, damage, victim_hp in events
+        )
+
+class BinarySink(BufferedSink):
+    """
+    Writes events as fixed-width binary records (see the record layout of the module), after a magic header.
+    """
+
+    def __init__(self, file: str | IO, batch_size: int = 4096) -> None:
+        super().__init__(file, batch_size)
+        self.file.write(MAGIC)
+
+    def encode(self, events: list[tuple]) -> bytes:
+        # a single pack call for the whole batch
+        return struct.pack(f"<{RECORD.format[1:] * len(events)}", *itertools.chain.from_iterable(events))
+
+def load_binary_log(path: str) -> "np.ndarray":
+    """
+    Memory-maps a binary log, without reading it.
+
+    Args:
+        path (str): The path of the log.
+
+    Returns:
+        np.ndarray: The events, as a read-only memory-mapped structured array with the fields of Event (an empty array
+            if the log has no events).
+
+    Raises:
+        ValueError: If the file is not a binary log, or a log of another version of the record layout.
+    """
+    import numpy as np
+
+    with open(path, "rb") as file:
+        header = file.read(len(MAGIC))
+    if header[:-2] != MAGIC[:-2]:
+        raise ValueError(f"{path} is not a binary event log")
+    if header != MAGIC:
+        raise ValueError(f"{path} is a binary event log of version {header[-2]}, version {MAGIC[-2]} is supported")
+    dtype = np.dtype([
+        ("battle", "<u4"), ("round", "<u4"), ("side", "u1"), ("attacker", "<u2"), ("attack_type", "u1"),
+        ("victim", "<u2"), ("damage", "<f8"), ("victim_hp", "<f8")
+    ])
+    if os.path.getsize(path) == len(MAGIC):
+        # an empty file can't be memory-mapped
+        return np.empty(0, dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=len(MAGIC))
+
+def read_ndjson_log(path: str) -> Iterator[Event]:
+    """
+    Reads the events of a newline-delimited JSON log.
+
+    Args:
+        path (str): The path of the log.
+
+    Yields:
+        Event: Each event of the log.
+    """
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            yield Event(**json.loads(line))
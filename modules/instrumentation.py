@@ -0,0 +1,245 @@
+"""
+The instrumentation module measures where the time of the game goes.
+
+It contains the Instruments class, a registry of named timers and counters. The game loop is instrumented with the
+`timed` decorator and with `INSTRUMENTS.timer` blocks: fetching the roster (per endpoint), preparing teams, fighting,
+attacking, rendering, pausing and waiting for the player. Instrumentation is disabled by default, and then costs a single
+flag check per instrumented call. Once enabled, it keeps the count, total and maximum time of every timer, can record
+every timed call as a Chrome trace (to open in chrome://tracing or Perfetto), and prints a summary report.
+
+The `session` context manager enables instrumentation for a run of the game, optionally under cProfile, and writes the
+report, the trace and the profile when the run ends. It is driven by the command-line flags of main.py or by the
+FIGHT_PROFILE and FIGHT_TRACE environment variables.
+
+Classes:
+    Instruments: Represents the timers and counters of the game.
+
+Functions:
+    timed: Decorator timing every call of a function.
+    session: Instruments a run of the game.
+
+Example:
+    To see where the time of a battle goes, run `python main.py play --stats --trace trace.json`.
+"""
+from __future__ import annotations
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from collections.abc import Callable, Iterator
+
+# paths of the files where a run is profiled (pstats) and traced (Chrome trace JSON), if set
+PROFILE_ENV = "FIGHT_PROFILE"
+TRACE_ENV = "FIGHT_TRACE"
+CO_COROUTINE = 0x80  # inspect.CO_COROUTINE, without importing inspect at startup
+
+class TimerStats:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+class Timer:
+    __slots__ = ("instruments", "name", "start")
+
+    def __init__(self, instruments: "Instruments", name: str) -> None:
+        self.instruments = instruments
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> "Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.instruments.record(self.name, self.start, time.perf_counter())
+
+class Instruments:
+    def __init__(self) -> None:
+        """
+        Initializes the Instruments object, disabled.
+        """
+        self.enabled = False
+        self.tracing = False
+        self.timers: dict[str, TimerStats] = {}
+        self.counters: dict[str, int] = {}
+        self.trace: list[dict] = []  # Chrome trace events, if tracing
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()  # timers are also updated from the thread of the API client
+
+    def enable(self, trace: bool = False) -> None:
+        """
+        Enables instrumentation, starting from empty timers and counters.
+
+        Args:
+            trace (bool): Whether to record every timed call as a trace event.
+        """
+        self.reset()
+        self.enabled = True
+        self.tracing = trace
+
+    def disable(self) -> None:
+        self.enabled = False
+        self.tracing = False
+
+    def reset(self) -> None:
+        """
+        Clears the timers, counters and trace.
+        """
+        self.timers = {}
+        self.counters = {}
+        self.trace = []
+        self.origin = time.perf_counter()
+
+    def timer(self, name: str) -> contextlib.AbstractContextManager:
+        """
+        Args:
+            name (str): The name of the timer.
+
+        Returns:
+            contextlib.AbstractContextManager: A context manager timing its block, a no-op one if disabled.
+        """
+        return Timer(self, name) if self.enabled else NULL_TIMER
+
+    def record(self, name: str, start: float, end: float) -> None:
+        """
+        Records a timed call.
+
+        Args:
+            name (str): The name of the timer.
+            start (float): The start of the call, from time.perf_counter.
+            end (float): The end of the call, from time.perf_counter.
+        """
+        with self.lock:
+            stats = self.timers.get(name)
+            if stats is None:
+                stats = self.timers[name] = TimerStats()
+            stats.count += 1
+            stats.total += end - start
+            stats.max = max(stats.max, end - start)
+            if self.tracing:
+                self.trace.append({
+                    "name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                    "ts": (start - self.origin) * 1e6, "dur": (end - start) * 1e6
+                })
+
+    def count(self, name: str, n: int = 1) -> None:
+        """
+        Increments a counter, if enabled.
+
+        Args:
+            name (str): The name of the counter.
+            n (int): The increment.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            value = self.counters[name] = self.counters.get(name, 0) + n
+            if self.tracing:
+                self.trace.append({
+                    "name": name, "ph": "C", "pid": os.getpid(), "tid": threading.get_ident(),
+                    "ts": (time.perf_counter() - self.origin) * 1e6, "args": {name: value}
+                })
+
+    def report(self) -> str:
+        """
+        Returns:
+            str: A summary of the timers, from the longest total time, and of the counters.
+        """
+        lines = [f"{'timer':<28}{'calls':>8}{'total ms':>12}{'mean ms':>10}{'max ms':>10}"]
+        for name, stats in sorted(self.timers.items(), key=lambda item: item[1].total, reverse=True):
+            lines.append(
+                f"{name:<28}{stats.count:>8}{stats.total * 1e3:>12.1f}{stats.total / stats.count * 1e3:>10.2f}"
+                f"{stats.max * 1e3:>10.2f}"
+            )
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name:<28}{value:>8}")
+        return "\n".join(lines)
+
+    def export_trace(self, path: str) -> None:
+        """
+        Writes the trace as a Chrome trace JSON file.
+
+        Args:
+            path (str): The path of the file.
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"traceEvents": self.trace, "displayTimeUnit": "ms"}, file)
+
+NULL_TIMER = contextlib.nullcontext()
+
+# instruments of the game loop
+INSTRUMENTS = Instruments()
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """
+    Decorator timing every call of a function or coroutine function with the timer of the given name, when
+    instrumentation is enabled.
+
+    Args:
+        name (str): The name of the timer.
+
+    Returns:
+        Callable[[Callable], Callable]: The decorator.
+    """
+    def decorator(function: Callable) -> Callable:
+        if function.__code__.co_flags & CO_COROUTINE:
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                if not INSTRUMENTS.enabled:
+                    return await function(*args, **kwargs)
+                with Timer(INSTRUMENTS, name):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not INSTRUMENTS.enabled:
+                return function(*args, **kwargs)
+            with Timer(INSTRUMENTS, name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@contextlib.contextmanager
+def session(stats: bool = False, profile: str | None = None, trace: str | None = None) -> Iterator[None]:
+    """
+    Instruments a run of the game, and writes its results when the run ends (even on errors).
+
+    Instrumentation is only enabled if any output is requested. The profile only covers the main thread.
+
+    Args:
+        stats (bool): Whether to print the summary report.
+        profile (str | None): The path of the pstats file of a cProfile capture, the FIGHT_PROFILE variable if not
+            provided, None for no profiling.
+        trace (str | None): The path of the Chrome trace file, the FIGHT_TRACE variable if not provided, None for no
+            trace.
+    """
+    profile = profile or os.environ.get(PROFILE_ENV)
+    trace = trace or os.environ.get(TRACE_ENV)
+    if not (stats or profile or trace):
+        yield
+        return
+
+    INSTRUMENTS.enable(trace=trace is not None)
+    profiler = None
+    if profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile)
+        INSTRUMENTS.disable()
+        if trace:
+            INSTRUMENTS.export_trace(trace)
+        if stats:
+            print(f"\n{INSTRUMENTS.report()}")
@@ -0,0 +1,243 @@
+"""
+The policies module provides the built-in strategies choosing the attacker and the target of a team in a battle.
+
+Every strategy is a Policy of the engine module, so it can be used by the CPU team of an interactive Battle as well as
+by both teams of headless simulations. The attack type is always drawn at random by the engine, after the attacker is
+chosen and before the target is. The greedy and focus fire policies pick their moves from the rankings the engine keeps
+up to date (Engine.strongest and Engine.hp_order), in O(log n) per turn for teams of any size.
+
+Classes:
+    RandomPolicy: Picks the attacker and the target at random, following the rules of the game.
+    GreedyPolicy: Maximizes the damage of each attack.
+    FocusFirePolicy: Attacks the alive opponent with the lowest HP with the strongest character.
+    LookaheadPolicy: Chooses attacker and target by an expectimax search within a latency budget.
+
+Functions:
+    get_policy: Creates a built-in policy from its name.
+
+Example:
+    To simulate a battle in which the first team searches its moves, run
+    `simulate(teams, rng, (LookaheadPolicy(budget=.05), RandomPolicy()))`.
+"""
+from __future__ import annotations
+import random
+import time
+from modules.character import Character
+from modules.engine import ATTACK_TYPES, Engine, Policy
+
+RandomPolicy = Policy
+
+def expected_damage(attack: list[float]) -> float:
+    """
+    Args:
+        attack (list[float]): The damage of the 3 attack types of a character.
+
+    Returns:
+        float: The expected damage of an attack of the character, whose type is drawn at random.
+    """
+    return sum(attack) / len(attack)
+
+def attack_strength(character: Character) -> float:
+    """
+    Args:
+        character (Character): A prepared character.
+
+    Returns:
+        float: The expected damage of an attack of the character, the key of Engine.strongest for the attacker.
+    """
+    return expected_damage(character.attack)
+
+class GreedyPolicy(Policy):
+    """
+    Attacks with the character with the highest expected damage, and targets the opponent that loses the most HP
+    from the attack, preferring the weakest one when several lose the whole damage.
+    """
+
+    def choose_attacker(self, alive: list[int], engine: Engine, rng: random.Random) -> int:
+        return engine.strongest(engine.side, attack_strength)
+
+    def choose_target(
+        self, alive: list[int], attacker: int, attack_type: int, engine: Engine, rng: random.Random
+    ) -> int | None:
+        # the opponent losing the most HP has the lowest HP from the damage on, else the highest HP
+        damage = engine.teams[engine.side].characters[attacker].attack[attack_type]
+        return engine.hp_order(1 - engine.side).closest_above(damage)
+
+class FocusFirePolicy(GreedyPolicy):
+    """
+    Attacks with the character with the highest expected damage, and targets the alive opponent with the lowest HP.
+    """
+
+    def choose_target(
+        self, alive: list[int], attacker: int, attack_type: int, engine: Engine, rng: random.Random
+    ) -> int | None:
+        return engine.hp_order(1 - engine.side).lowest()
+
+class SearchTimeout(Exception):
+    """
+    Raised when a search exceeds its latency budget.
+    """
+
+class LookaheadPolicy(Policy):
+    def __init__(self, budget: float = .05, max_depth: int = 6) -> None:
+        """
+        Initializes the LookaheadPolicy object.
+
+        The policy runs an expectimax search over the next attacks, deepening iteratively until its latency budget is
+        spent: its own attacks are chosen to maximize the expected outcome, while attack types and the opponent's
+        moves are chance events, the opponent being modeled as playing at random. The search works on a copy of the
+        HP and alive characters of the teams, updated in place and restored after each explored attack.
+
+        Args:
+            budget (float): The time in seconds the policy may spend on a move.
+            max_depth (int): The maximum number of attacks looked ahead.
+        """
+        self.budget = budget
+        self.max_depth = max_depth
+        self.side = 0
+        self.hp: list[list[float]] = []  # HP of the characters of both teams, explored in place
+        self.alive: list[list[int]] = []  # indexes of the alive characters of both teams, in team order
+        self.attack: list[list[list[float]]] = []
+        self.targets: dict[int, int] = {}  # best target per attack type of the chosen attacker
+        self.depth_reached = 0
+
+    def choose_attacker(self, alive: list[int], engine: Engine, rng: random.Random) -> int:
+        side = engine.side
+        self.hp = [[character.hp for character in team.characters] for team in engine.teams]
+        self.alive = [list(engine.alive(0)), list(engine.alive(1))]
+        self.attack = [[character.attack for character in team.characters] for team in engine.teams]
+        self.side = side
+        deadline = time.perf_counter() + self.budget
+
+        # depth 1 always completes, deeper searches are only used if they complete within the budget
+        best = self.search_root(alive, 1, None)
+        self.depth_reached = 1
+        for depth in range(2, self.max_depth + 1):
+            try:
+                best = self.search_root(alive, depth, deadline)
+            except SearchTimeout:
+                break
+            self.depth_reached = depth
+
+        attacker, self.targets = best
+        return attacker
+
+    def choose_target(
+        self, alive: list[int], attacker: int, attack_type: int, engine: Engine, rng: random.Random
+    ) -> int | None:
+        return self.targets.get(attack_type)
+
+    def search_root(self, alive: list[int], depth: int, deadline: float | None) -> tuple[int, dict[int, int]]:
+        """
+        Searches the best attacker and its best target for each attack type.
+
+        Args:
+            alive (list[int]): The indexes of the alive characters of the policy's team.
+            depth (int): The number of attacks looked ahead.
+            deadline (float | None): The time after which the search is abandoned, None for no limit.
+
+        Returns:
+            tuple[int, dict[int, int]]: The best attacker and its best target per attack type.
+        """
+        side = self.side
+        victims = self.alive[1 - side]
+        best_value, best = float("-inf"), (alive[0], {})
+        for attacker in alive:
+            total, targets = 0.0, {}
+            for attack_type in range(len(ATTACK_TYPES)):
+                damage = self.attack[side][attacker][attack_type]
+                value, targets[attack_type] = max(
+                    (self.after_attack(1 - side, victim, damage, depth - 1, deadline), victim) for victim in victims
+                )
+                total += value
+            if total > best_value:
+                best_value, best = total, (attacker, targets)
+        return best
+
+    def after_attack(self, defending: int, victim: int, damage: float, depth: int, deadline: float | None) -> float:
+        """
+        Evaluates the battle after an attack, restoring the HP of the victim afterwards.
+
+        Args:
+            defending (int): The index of the attacked team.
+            victim (int): The index of the victim.
+            damage (float): The damage of the attack.
+            depth (int): The number of attacks looked ahead after this one.
+            deadline (float | None): The time after which the search is abandoned, None for no limit.
+
+        Returns:
+            float: The value of the battle for the policy's team, between -1 (defeat) and 1 (victory).
+        """
+        hp = self.hp[defending]
+        previous = hp[victim]
+        hp[victim] = max(previous - damage, 0)
+        alive = self.alive[defending]
+        position = alive.index(victim) if hp[victim] == 0 else -1
+        if position >= 0:
+            del alive[position]
+        try:
+            return self.value(defending, depth, deadline)
+        finally:
+            hp[victim] = previous
+            if position >= 0:
+                alive.insert(position, victim)
+
+    def value(self, side: int, depth: int, deadline: float | None) -> float:
+        """
+        Evaluates the battle with the given team attacking next.
+
+        Args:
+            side (int): The index of the team attacking next.
+            depth (int): The number of attacks looked ahead.
+            deadline (float | None): The time after which the search is abandoned, None for no limit.
+
+        Returns:
+            float: The value of the battle for the policy's team, between -1 (defeat) and 1 (victory).
+        """
+        if not self.alive[1 - self.side]:
+            return 1.0
+        if not self.alive[self.side]:
+            return -1.0
+        if depth == 0:
+            own_hp, opponent_hp = sum(self.hp[self.side]), sum(self.hp[1 - self.side])
+            return (own_hp - opponent_hp) / (own_hp + opponent_hp)
+        if deadline is not None and time.perf_counter() > deadline:
+            raise SearchTimeout
+
+        # the lists of alive characters are restored after each explored attack, so they can be iterated while exploring
+        attackers = self.alive[side]
+        victims = self.alive[1 - side]
+        if side == self.side:
+            # own attack: best attacker, attack type drawn at random, then best target
+            return max(
+                sum(
+                    max(self.after_attack(1 - side, victim, damage, depth - 1, deadline) for victim in victims)
+                    for damage in self.attack[side][attacker]
+                ) / len(ATTACK_TYPES)
+                for attacker in attackers
+            )
+        # opponent's attack: attacker, attack type and victim drawn at random
+        total = sum(
+            self.after_attack(1 - side, victim, damage, depth - 1, deadline)
+            for attacker in attackers for damage in self.attack[side][attacker] for victim in victims
+        )
+        return total / (len(attackers) * len(ATTACK_TYPES) * len(victims))
+
+POLICIES = {
+    "random": RandomPolicy,
+    "greedy": GreedyPolicy,
+    "focus": FocusFirePolicy,
+    "lookahead": LookaheadPolicy
+}
+
+def get_policy(name: str) -> Policy:
+    """
+    Creates a built-in policy from its name.
+
+    Args:
+        name (str): The name of the policy ('random', 'greedy', 'focus' or 'lookahead').
+
+    Returns:
+        Policy: The policy.
+    """
+    return POLICIES[name]()
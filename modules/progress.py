@@ -0,0 +1,111 @@
+"""
+The progress module reports the progress of the roster fetch of a battle.
+
+It contains the FetchProgress class, which counts the candidates in flight, the valid characters fetched, the rejected
+ones and their fetch latency. The fetch pipeline notifies it of every started and completed candidate, and, when enabled,
+an asyncio task redraws the loading line after each notification instead of polling on a thread. Notifications arriving
+while the line is being drawn are coalesced into a single redraw.
+
+Classes:
+    FetchProgress: Represents the progress of the roster fetch of a battle.
+
+Example:
+    To report the progress of a fetch, run it inside `async with FetchProgress(10) as progress:` and call
+    `progress.started()` and `progress.completed(accepted, latency)` for every candidate.
+"""
+from __future__ import annotations
+import asyncio
+
+class FetchProgress:
+    def __init__(self, total: int, enabled: bool = True) -> None:
+        """
+        Initializes the FetchProgress object.
+
+        Args:
+            total (int): The number of valid characters to fetch.
+            enabled (bool): Whether to print the progress, e.g. not for headless runs or benchmarks.
+        """
+        self.total = total
+        self.enabled = enabled
+        self.in_flight = 0
+        self.fetched = 0
+        self.rejected = 0
+        self.latency = 0.0  # sum of the fetch latencies of the completed candidates, in seconds
+        self.width = 0  # length of the last line printed
+        self.changed = asyncio.Event()
+        self.closed = False
+        self.task: asyncio.Task | None = None
+
+    async def __aenter__(self) -> "FetchProgress":
+        if self.enabled:
+            self.task = asyncio.create_task(self.report())
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.aclose()
+
+    def started(self) -> None:
+        """
+        Notifies that a candidate is being fetched.
+        """
+        self.in_flight += 1
+        self.changed.set()
+
+    def completed(self, accepted: bool, latency: float) -> None:
+        """
+        Notifies that a candidate has been fetched.
+
+        Args:
+            accepted (bool): Whether the candidate is a valid character.
+            latency (float): The time in seconds the candidate took to fetch.
+        """
+        self.in_flight -= 1
+        if accepted:
+            self.fetched += 1
+        else:
+            self.rejected += 1
+        self.latency += latency
+        self.changed.set()
+
+    def cancelled(self) -> None:
+        """
+        Notifies that the fetch of a candidate has been cancelled.
+        """
+        self.in_flight -= 1
+        self.changed.set()
+
+    def render(self) -> str:
+        """
+        Returns:
+            str: The loading line.
+        """
+        completed = self.fetched + self.rejected
+        latency = f", {self.latency / completed * 1000:.0f} ms avg" if completed else ""
+        return (
+            f"⏳ Loading characters: {min(self.fetched, self.total)}/{self.total} fetched, {self.rejected} rejected, "
+            f"{self.in_flight} in flight{latency}"
+        )
+
+    async def report(self) -> None:
+        """
+        Redraws the loading line each time the progress changes, until the progress is closed.
+        """
+        while True:
+            await self.changed.wait()
+            self.changed.clear()
+            line = self.render()
+            # pad with spaces to erase the end of a longer previous line
+            print(line.ljust(self.width), end="\r", flush=True)
+            self.width = len(line)
+            if self.closed:
+                return
+
+    async def aclose(self) -> None:
+        """
+        Stops reporting, after drawing the final state of the progress.
+        """
+        self.closed = True
+        self.changed.set()
+        if self.task is not None:
+            await self.task
+            self.task = None
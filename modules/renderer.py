@@ -0,0 +1,93 @@
+"""
+The renderer module displays the teams of a battle in the terminal.
+
+It contains the Renderer class, which builds each frame in a single buffer and writes it at once. After the first frame,
+only the characters whose HP or status changed are redrawn, under a one-line summary of the status of each team. The
+pacing of the display (the pauses that let the player follow the battle) is handled by the renderer too, apart from
+the game logic: a fast renderer never pauses, and a renderer without output neither builds frames nor pauses.
+
+Classes:
+    Renderer: Represents the display of a battle.
+
+Example:
+    To display the teams of a battle, create `renderer = Renderer()` and run `renderer.render(teams)` after each attack.
+"""
+from __future__ import annotations
+import sys
+import time
+from typing import TextIO
+from modules.instrumentation import INSTRUMENTS
+from modules.team import Team
+
+STDOUT = object()  # default output of the renderers: sys.stdout when they are created, e.g. once captured by a test
+
+class Renderer:
+    def __init__(self, output: TextIO | object | None = STDOUT, fast: bool = False) -> None:
+        """
+        Initializes the Renderer object.
+
+        Args:
+            output (TextIO | object | None): The stream the frames are written to (sys.stdout by default), None for no
+                output (e.g. batch runs).
+            fast (bool): Whether to turn off every pause of the display.
+        """
+        self.output: TextIO | None = sys.stdout if output is STDOUT else output
+        self.fast = fast
+        self.shown: dict[tuple[str, int], tuple[float, str]] = {}  # HP and status last drawn, by team and index
+
+    def pause(self, seconds: float) -> None:
+        """
+        Pauses the display, unless the renderer is fast or has no output.
+
+        Args:
+            seconds (float): The duration of the pause.
+        """
+        if not self.fast and self.output is not None:
+            with INSTRUMENTS.timer("sleep"):
+                time.sleep(seconds)
+
+    def write(self, text: str) -> None:
+        """
+        Writes text to the output at once, like print.
+
+        Args:
+            text (str): The text, without its final newline.
+        """
+        if self.output is not None:
+            self.output.write(f"{text}\n")
+            self.output.flush()
+
+    def frame(self, teams: dict[str, Team], full: bool = False) -> str:
+        """
+        Builds the frame of the teams, and remembers the state of the characters drawn.
+
+        Args:
+            teams (dict[str, Team]): The teams, keyed by team name.
+            full (bool): Whether to draw every character, instead of only the characters that changed.
+
+        Returns:
+            str: The frame.
+        """
+        lines = []
+        for team_name, team in teams.items():
+            lines.append(f"\n{team_name}, {team} {''.join(character.status for character in team.characters)}")
+            for i, character in enumerate(team.characters):
+                state = (character.hp, character.status)
+                if full or self.shown.get((team_name, i)) != state:
+                    self.shown[(team_name, i)] = state
+                    lines.append(str(character))
+        return "\n".join(lines)
+
+    def render(self, teams: dict[str, Team], full: bool = False, delay: float = 0) -> None:
+        """
+        Draws the teams, then pauses the display.
+
+        Args:
+            teams (dict[str, Team]): The teams, keyed by team name.
+            full (bool): Whether to draw every character, instead of only the characters that changed.
+            delay (float): The duration of the pause after the frame.
+        """
+        if self.output is None:
+            return
+        self.write(self.frame(teams, full))
+        self.pause(delay)
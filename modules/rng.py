@@ -0,0 +1,52 @@
+"""
+The rng module derives independent, reproducible random number generators from a single seed.
+
+A seed and a path of labels (e.g. a battle index, then "fight") are hashed into a new 64-bit seed, so every battle, team
+or character can get its own RNG stream that doesn't depend on how many numbers other streams have drawn, or on which
+process or in which order they are used.
+
+Functions:
+    new_seed: Draws a fresh random seed.
+    derive_seed: Derives the seed of a substream.
+    substream: Creates the RNG of a substream.
+
+Example:
+    To get the RNG of the fight of the 3rd battle of a run, call `substream(seed, 3, "fight")`.
+"""
+from __future__ import annotations
+import hashlib
+import random
+
+def new_seed() -> int:
+    """
+    Returns:
+        int: A fresh random 64-bit seed, drawn from the operating system.
+    """
+    return random.SystemRandom().getrandbits(64)
+
+def derive_seed(seed: int, *path: int | str) -> int:
+    """
+    Derives the seed of a substream.
+
+    Args:
+        seed (int): The parent seed.
+        path (int | str): The labels identifying the substream.
+
+    Returns:
+        int: The 64-bit seed of the substream.
+    """
+    key = ":".join(str(label) for label in (seed, *path))
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+
+def substream(seed: int, *path: int | str) -> random.Random:
+    """
+    Creates the RNG of a substream.
+
+    Args:
+        seed (int): The parent seed.
+        path (int | str): The labels identifying the substream.
+
+    Returns:
+        random.Random: The RNG of the substream.
+    """
+    return random.Random(derive_seed(seed, *path))
@@ -0,0 +1,191 @@
+"""
+The sampler module draws random character IDs of the superhero API without replacement, from an index of what is known
+about each ID.
+
+It contains the HeroIndex class, which keeps the IDs that are not known to be invalid (the candidates of a roster, valid
+or not fetched yet) and the known valid IDs partitioned by alignment. Draws are lazy Fisher-Yates shuffles of these
+lists: each draw swaps a random remaining position with the next one in a dictionary instead of the list, so drawing k
+distinct IDs costs O(k) whatever the size of the index, without retrying duplicates, and IDs known to be invalid are
+never drawn. The lists are kept in ID order and replaced rather than modified when the index is updated, so a draw in
+progress is not affected by updates, and the IDs drawn only depend on the RNG and on what was known when the draw
+started.
+
+The index of the hero catalog is built lazily from the characters fetched so far (see HeroCatalog.index), and updated
+with every character stored in the catalog afterwards.
+
+Classes:
+    HeroIndex: Represents the known valid and invalid character IDs of the API.
+
+Functions:
+    shuffled: Lazily iterates over the items of a list in random order.
+
+Example:
+    To draw the candidates of a roster, iterate over `HeroCatalog().index().sample(rng)`, and to draw two teams of
+    known valid characters, one good and one bad, run `index.draw_teams(rng, 2, 5, balanced=True)`.
+"""
+from __future__ import annotations
+import bisect
+import random
+from collections.abc import Iterator
+from typing import TypeVar
+from modules.catalog import MAX_CHARACTER_ID
+
+ALIGNMENTS = ("good", "bad", "neutral")
+
+T = TypeVar("T")
+
+def shuffled(items: list[T], rng: random.Random) -> Iterator[T]:
+    """
+    Lazily iterates over the items of a list in random order, without modifying it.
+
+    Args:
+        items (list[T]): The items.
+        rng (random.Random): The RNG of the draws.
+
+    Yields:
+        T: The next item, each item being yielded once.
+    """
+    swapped: dict[int, T] = {}  # items moved by the shuffle, by position
+    n = len(items)
+    for i in range(n):
+        j = i + rng.randrange(n - i)
+        item = swapped.get(j, items[j])
+        swapped[j] = swapped.get(i, items[i])
+        yield item
+
+class HeroIndex:
+    def __init__(self, max_id: int = MAX_CHARACTER_ID) -> None:
+        """
+        Initializes the HeroIndex object, with every ID unknown.
+
+        Args:
+            max_id (int): The highest character ID of the API.
+        """
+        # lists of int IDs in ID order, replaced instead of modified so draws in progress keep their own
+        self.candidates = list(range(1, max_id + 1))  # IDs not known to be invalid
+        self.valid: dict[str, list[int]] = {alignment: [] for alignment in ALIGNMENTS}  # known valid IDs by alignment
+        self.alignments: dict[str, str] = {}  # alignment of each known valid ID
+
+    @classmethod
+    def from_heroes(
+        cls, heroes: dict[str, dict[str, str]], invalid_ids: set[str], max_id: int = MAX_CHARACTER_ID
+    ) -> "HeroIndex":
+        """
+        Builds the index of characters whose validity is known.
+
+        Args:
+            heroes (dict[str, dict[str, str]]): The data of the valid characters, keyed by character ID.
+            invalid_ids (set[str]): The IDs of the invalid characters.
+            max_id (int): The highest character ID of the API.
+
+        Returns:
+            HeroIndex: The index.
+        """
+        index = cls(max_id)
+        invalid = {int(character_id) for character_id in invalid_ids}
+        index.candidates = [character_id for character_id in index.candidates if character_id not in invalid]
+        index.alignments = {character_id: data["alignment"] for character_id, data in heroes.items()}
+        for character_id in sorted(map(int, index.alignments)):
+            index.valid[index.alignments[str(character_id)]].append(character_id)
+        return index
+
+    def put(self, character_id: str, data: dict[str, str] | None) -> None:
+        """
+        Updates the index with a fetched character.
+
+        Args:
+            character_id (str): The ID of the character.
+            data (dict[str, str] | None): The data of the character, or None if it is invalid.
+        """
+        number = int(character_id)
+        previous = self.alignments.pop(character_id, None)
+        if previous is not None:
+            self.valid[previous] = [other for other in self.valid[previous] if other != number]
+        position = bisect.bisect_left(self.candidates, number)
+        listed = position < len(self.candidates) and self.candidates[position] == number
+        if data is None:
+            if listed:
+                self.candidates = self.candidates[:position] + self.candidates[position + 1:]
+            return
+        if not listed:
+            self.candidates = self.candidates[:position] + [number] + self.candidates[position:]
+        alignment = data["alignment"]
+        self.alignments[character_id] = alignment
+        valid = list(self.valid[alignment])
+        bisect.insort(valid, number)
+        self.valid[alignment] = valid
+
+    def sample(self, rng: random.Random) -> Iterator[str]:
+        """
+        Draws the candidates of a roster: the IDs that are not known to be invalid, in random order.
+
+        Args:
+            rng (random.Random): The RNG of the draws.
+
+        Returns:
+            Iterator[str]: The IDs, each one being drawn once.
+        """
+        return map(str, shuffled(self.candidates, rng))
+
+    def sample_valid(self, rng: random.Random, alignments: tuple[str, ...] = ALIGNMENTS) -> Iterator[str]:
+        """
+        Draws known valid IDs in random order.
+
+        The partitions of the alignments are shuffled separately, and each draw picks a partition with a probability
+        proportional to its remaining IDs, so every order of the IDs is as likely as with a single list.
+
+        Args:
+            rng (random.Random): The RNG of the draws.
+            alignments (tuple[str, ...]): The alignments of the characters drawn.
+
+        Yields:
+            str: The next ID, each one being drawn once.
+        """
+        partitions = [shuffled(self.valid[alignment], rng) for alignment in alignments]
+        remaining = [len(self.valid[alignment]) for alignment in alignments]
+        left = sum(remaining)
+        while left:
+            draw = rng.randrange(left)
+            partition = 0
+            while draw >= remaining[partition]:
+                draw -= remaining[partition]
+                partition += 1
+            remaining[partition] -= 1
+            left -= 1
+            yield str(next(partitions[partition]))
+
+    def draw_teams(
+        self, rng: random.Random, n_teams: int, team_size: int, balanced: bool = False, exclude: set[str] | None = None
+    ) -> list[list[str]] | None:
+        """
+        Draws teams of distinct known valid characters.
+
+        Args:
+            rng (random.Random): The RNG of the draws.
+            n_teams (int): The number of teams.
+            team_size (int): The number of characters in a team.
+            balanced (bool): Whether to balance the alignments: each team then has as many good characters as bad and
+                neutral ones, give or take one, with the majority alternating between teams (e.g. a good team of 5
+                against a bad team of 5, each with 2 characters of the other side).
+            exclude (set[str] | None): IDs that can't be drawn, e.g. those of characters already in a roster.
+
+        Returns:
+            list[list[str]] | None: The IDs of the characters of each team, or None if there are not enough known valid
+                characters.
+        """
+        pools = [self.sample_valid(rng, ("good",)), self.sample_valid(rng, ("bad", "neutral"))] if balanced else [
+            self.sample_valid(rng)
+        ]
+        exclude = exclude or set()
+        teams = []
+        for team in range(n_teams):
+            members = []
+            for position in range(team_size):
+                # balanced teams draw from the pool of their majority first, then alternate
+                pool = pools[(team + position) % len(pools)]
+                character_id = next((i for i in pool if i not in exclude), None)
+                if character_id is None:
+                    return None
+                members.append(character_id)
+            teams.append(members)
+        return teams
@@ -0,0 +1,469 @@
+"""
+The server module hosts many simultaneous battles for remote players on a single asyncio event loop.
+
+It contains the BattleServer class, a TCP server speaking newline-delimited JSON. A player joins a battle against the CPU
+or against another player; each match is an Engine driven by the moves of its players, so it never blocks on input or
+sleeps: a match only waits (asynchronously) for the player whose turn it is. Teams are drawn from a roster shared by
+every match (e.g. the valid characters of the local catalog) and prepared with shared precomputed tables, if any. The
+server keeps latency metrics per match and across matches: the time between a move being received (or the CPU's turn
+starting) and its hit being sent to the players.
+
+Protocol (one JSON object per line):
+    - Client: {"op": "join", "mode": "cpu" | "pvp"} joins a battle against the CPU, or the next player joining a
+      player-versus-player battle. The player joining first (or playing the CPU) attacks first.
+    - Server: {"type": "start", "match", "side", "teams"} starts the battle, with the index of the player's team and
+      the characters of both teams.
+    - Server: {"type": "turn", "round", "alive"} asks the player to choose an attacker among its alive characters.
+    - Client: {"op": "attack", "attacker"} plays the attacker; an invalid move is answered with {"type": "error"}.
+    - Server: {"type": "hit", ...} describes every attack to both players, with the fields of engine.Hit.
+    - Server: {"type": "end", "winner", "reason", "rounds", "latency"} ends the battle, with its metrics. A player
+      leaving a battle forfeits it. A battle failing on the server ends with the reason 'error' and no winner. The
+      player can then join another battle.
+    - Client: {"op": "metrics"} is answered at any time with {"type": "metrics", ...}, the metrics of the server.
+
+Classes:
+    LatencyStats: Represents the distribution of a latency.
+    Connection: Represents the connection of a player.
+    RemotePolicy: Policy playing the attacker chosen by a remote player.
+    Match: Represents a battle between a player and the CPU, or between two players.
+    BattleServer: Represents the server hosting the battles.
+
+Functions:
+    bot: Plays a battle on a server, as a client choosing its attackers at random.
+
+Example:
+    To host battles with the characters of the local catalog, run `python main.py serve --port 8765`.
+"""
+from __future__ import annotations
+import asyncio
+import collections
+import json
+import logging
+import random
+import statistics
+import time
+from collections.abc import Callable
+from modules.character import Character
+from modules.engine import Engine, Policy
+from modules.policies import get_policy
+from modules.rng import new_seed, substream
+from modules.team import Team
+from modules.tables import HeroTables
+
+class LatencyStats:
+    def __init__(self, window: int = 1024) -> None:
+        """
+        Initializes the LatencyStats object.
+
+        Args:
+            window (int): The number of latest measures kept for the percentiles.
+        """
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent: collections.deque[float] = collections.deque(maxlen=window)
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def summary(self) -> dict[str, float]:
+        """
+        Returns:
+            dict[str, float]: The number of measures, and the mean, median, 99th percentile (of the latest measures)
+                and maximum latency in milliseconds.
+        """
+        if not self.count:
+            return {"count": 0}
+        recent = sorted(self.recent)
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1e3,
+            "p50_ms": statistics.median(recent) * 1e3,
+            "p99_ms": recent[min(len(recent) - 1, int(len(recent) * .99))] * 1e3,
+            "max_ms": self.max * 1e3
+        }
+
+class Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Initializes the Connection object.
+
+        Args:
+            reader (asyncio.StreamReader): The stream of the messages of the player.
+            writer (asyncio.StreamWriter): The stream of the messages to the player.
+        """
+        self.reader = reader
+        self.writer = writer
+        self.matched: asyncio.Future | None = None  # set while waiting for an opponent, done once the battle ended
+
+    async def receive(self) -> dict | None:
+        """
+        Returns:
+            dict | None: The next message of the player, or None if the player left.
+        """
+        try:
+            line = await self.reader.readline()
+        except ConnectionError:
+            return None
+        if not line:
+            return None
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return {}
+        return message if isinstance(message, dict) else {}
+
+    def send(self, message: dict) -> None:
+        """
+        Queues a message to the player, without waiting for it to be written.
+
+        Args:
+            message (dict): The message.
+        """
+        if not self.writer.is_closing():
+            self.writer.write(json.dumps(message).encode() + b"\n")
+
+    async def drain(self) -> None:
+        """
+        Waits until the queued messages can be written, so a slow player doesn't buffer messages indefinitely.
+        """
+        try:
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+
+class RemotePolicy(Policy):
+    """
+    Policy playing the attacker chosen by a remote player, set before each of its attacks.
+    """
+
+    def __init__(self) -> None:
+        self.attacker = 0
+
+    def choose_attacker(self, alive: list[int], engine: Engine, rng: random.Random) -> int:
+        return self.attacker
+
+class Match:
+    def __init__(
+        self,
+        match_id: int,
+        teams: tuple[Team, Team],
+        players: tuple[Connection | None, Connection | None],
+        cpu_policy: Policy,
+        rng: random.Random
+    ) -> None:
+        """
+        Initializes the Match object.
+
+        Args:
+            match_id (int): The index of the match on the server.
+            teams (tuple[Team, Team]): The prepared teams, the first one attacks first.
+            players (tuple[Connection | None, Connection | None]): The player of each team, None for the CPU.
+            cpu_policy (Policy): The policy of the CPU, if it plays.
+            rng (random.Random): The RNG of the battle.
+        """
+        self.match_id = match_id
+        self.players = players
+        self.engine = Engine(
+            teams, tuple(RemotePolicy() if player is not None else cpu_policy for player in players), rng,
+            record_hits=False
+        )
+        self.latency = LatencyStats()
+
+    def broadcast(self, message: dict) -> None:
+        for player in self.players:
+            if player is not None:
+                player.send(message)
+
+    async def play(self, on_turn: Callable[[float], None]) -> tuple[int, str]:
+        """
+        Plays the battle until a team is defeated or a player leaves.
+
+        Args:
+            on_turn (Callable[[float], None]): Called with the latency of every turn, e.g. for the metrics of the server.
+
+        Returns:
+            tuple[int, str]: The index of the winning team, and the reason of the end ('defeat' or 'forfeit').
+        """
+        teams = [
+            [{"name": character.name, "alignment": character.alignment, "hp": character.hp, "attack": character.attack}
+             for character in team.characters]
+            for team in self.engine.teams
+        ]
+        for side, player in enumerate(self.players):
+            if player is not None:
+                player.send({"type": "start", "match": self.match_id, "side": side, "teams": teams})
+
+        engine = self.engine
+        while engine.winner is None:
+            side = engine.side
+            player = self.players[side]
+            if player is not None:
+                alive = engine.alive(side)
+                player.send({"type": "turn", "round": engine.round + 1, "alive": list(alive)})
+                await player.drain()
+                attacker = await self.receive_attacker(player, alive)
+                if attacker is None:
+                    return 1 - side, "forfeit"
+                engine.policies[side].attacker = attacker
+            start = time.perf_counter()
+            hit = engine.step()
+            self.broadcast({"type": "hit", **hit._asdict()})
+            latency = time.perf_counter() - start
+            self.latency.add(latency)
+            on_turn(latency)
+            if player is None:
+                # let the other matches run between the turns of the CPU
+                await asyncio.sleep(0)
+        return engine.winner, "defeat"
+
+    async def receive_attacker(self, player: Connection, alive: list[int]) -> int | None:
+        """
+        Waits for the player to choose a valid attacker.
+
+        Args:
+            player (Connection): The player whose turn it is.
+            alive (list[int]): The indexes of the alive characters of the player.
+
+        Returns:
+            int | None: The index of the attacker, or None if the player left.
+        """
+        while True:
+            message = await player.receive()
+            if message is None:
+                return None
+            attacker = message.get("attacker")
+            # JSON numbers such as 1.0, and booleans, compare equal to indexes but can't index a team
+            if message.get("op") == "attack" and type(attacker) is int and attacker in alive:
+                return attacker
+            player.send({"type": "error", "message": f"choose an attacker among {alive}"})
+
+class BattleServer:
+    def __init__(
+        self,
+        roster: dict[str, dict[str, str]],
+        tables: HeroTables | None = None,
+        seed: int | None = None,
+        team_size: int = 5,
+        cpu_policy: str = "random"
+    ) -> None:
+        """
+        Initializes the BattleServer object.
+
+        Args:
+            roster (dict[str, dict[str, str]]): The data of the valid characters, keyed by character ID, shared by
+                every match.
+            tables (HeroTables | None): The precomputed tables the characters are prepared with, if any.
+            seed (int | None): The seed from which the teams and the battle of every match are derived, a fresh one if
+                not provided.
+            team_size (int): The number of characters in a team.
+            cpu_policy (str): The name of the policy of the CPU (see policies.get_policy).
+        """
+        self.roster = roster
+        self.character_ids = sorted(roster, key=int)
+        self.tables = tables
+        self.seed = seed if seed is not None else new_seed()
+        self.team_size = team_size
+        self.cpu_policy = cpu_policy
+        self.waiting: Connection | None = None  # player waiting for an opponent
+        self.matches_started = 0
+        self.active_matches = 0
+        self.finished: collections.deque[dict] = collections.deque(maxlen=100)  # metrics of the latest matches
+        self.latency = LatencyStats(window=10_000)
+        self.server: asyncio.Server | None = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0, backlog: int = 4096) -> int:
+        """
+        Starts accepting players.
+
+        Args:
+            host (str): The interface the server listens on.
+            port (int): The port the server listens on, any free port if 0.
+            backlog (int): The number of pending connections queued by the system, high enough for bursts of
+                thousands of players connecting at once (the default of asyncio is 100).
+
+        Returns:
+            int: The port the server listens on.
+        """
+        self.server = await asyncio.start_server(self.handle, host, port, backlog=backlog)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        """
+        Serves players until the task is cancelled.
+
+        Args:
+            host (str): The interface the server listens on.
+            port (int): The port the server listens on, any free port if 0.
+        """
+        port = await self.start(host, port)
+        print(f"⚔️ Serving battles on {host}:{port} (seed {self.seed})")
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def metrics(self) -> dict:
+        """
+        Returns:
+            dict: The metrics of the server: matches started, active and finished, the latency of the turns across
+                matches, and the metrics of the latest finished matches.
+        """
+        return {
+            "type": "metrics",
+            "matches_started": self.matches_started,
+            "active_matches": self.active_matches,
+            "latency": self.latency.summary(),
+            "recent_matches": list(self.finished)
+        }
+
+    def new_teams(self, match_id: int) -> tuple[Team, Team]:
+        """
+        Draws and prepares the teams of a match.
+
+        Args:
+            match_id (int): The index of the match.
+
+        Returns:
+            tuple[Team, Team]: The prepared teams.
+        """
+        rng = substream(self.seed, "match", match_id)
+        teams = []
+        for _ in range(2):
+            team = Team([
+                Character(self.roster[character_id], rng)
+                for character_id in rng.sample(self.character_ids, self.team_size)
+            ])
+            team.set_team_alignment()
+            team.update_characters(rng, self.tables)
+            teams.append(team)
+        return teams[0], teams[1]
+
+    async def run_match(self, players: tuple[Connection | None, Connection | None]) -> None:
+        """
+        Plays a match and sends its end to its players.
+
+        Args:
+            players (tuple[Connection | None, Connection | None]): The player of each team, None for the CPU.
+        """
+        match_id = self.matches_started
+        self.matches_started += 1
+        self.active_matches += 1
+        started = time.perf_counter()
+        match = Match(
+            match_id, self.new_teams(match_id), players, get_policy(self.cpu_policy),
+            substream(self.seed, "battle", match_id)
+        )
+        try:
+            winner, reason = await match.play(self.latency.add)
+        except Exception:  # pylint: disable=broad-except
+            # the players still get the end of a match that failed, instead of waiting for it forever
+            logging.exception("match %d failed", match_id)
+            winner, reason = None, "error"
+        finally:
+            self.active_matches -= 1
+        summary = {
+            "match": match_id,
+            "winner": winner,
+            "reason": reason,
+            "rounds": match.engine.round,
+            "duration_s": time.perf_counter() - started,
+            "latency": match.latency.summary()
+        }
+        self.finished.append(summary)
+        match.broadcast({"type": "end", **summary})
+        for player in players:
+            if player is not None:
+                await player.drain()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serves a player until it disconnects.
+
+        Args:
+            reader (asyncio.StreamReader): The stream of the messages of the player.
+            writer (asyncio.StreamWriter): The stream of the messages to the player.
+        """
+        connection = Connection(reader, writer)
+        try:
+            while True:
+                message = await connection.receive()
+                if message is None:
+                    return
+                op = message.get("op")
+                if op == "metrics":
+                    connection.send(self.metrics())
+                elif op == "join" and message.get("mode", "cpu") == "cpu":
+                    await self.run_match((connection, None))
+                elif op == "join" and message.get("mode") == "pvp":
+                    await self.join_pvp(connection)
+                else:
+                    connection.send({"type": "error", "message": "expected a join or metrics message"})
+                await connection.drain()
+        finally:
+            if self.waiting is connection:
+                self.waiting = None
+            writer.close()
+
+    async def join_pvp(self, connection: Connection) -> None:
+        """
+        Pairs a player with the player waiting for an opponent, or waits for one.
+
+        The match is played by the task of the second player; the first one waits for it to end, without reading
+        its messages meanwhile.
+
+        Args:
+            connection (Connection): The player.
+        """
+        if self.waiting is not None and self.waiting.reader.at_eof():
+            # the waiting player left before an opponent joined
+            self.waiting.matched.set_result(None)
+            self.waiting = None
+        if self.waiting is None:
+            self.waiting = connection
+            connection.matched = asyncio.get_running_loop().create_future()
+            await connection.matched
+            return
+        opponent, self.waiting = self.waiting, None
+        try:
+            await self.run_match((opponent, connection))
+        finally:
+            opponent.matched.set_result(None)
+
+async def bot(host: str, port: int, mode: str = "cpu", seed: int = 0) -> dict:
+    """
+    Plays a battle on a server, as a client choosing its attackers at random.
+
+    Args:
+        host (str): The host of the server.
+        port (int): The port of the server.
+        mode (str): The mode of the battle ('cpu' or 'pvp').
+        seed (int): The seed of the choices of the bot.
+
+    Returns:
+        dict: The end message of the battle.
+    """
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(json.dumps({"op": "join", "mode": mode}).encode() + b"\n")
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("the server closed the connection")
+            message = json.loads(line)
+            if message["type"] == "turn":
+                attacker = message["alive"][rng.randrange(len(message["alive"]))]
+                writer.write(json.dumps({"op": "attack", "attacker": attacker}).encode() + b"\n")
+            elif message["type"] == "end":
+                return message
+    finally:
+        writer.close()
@@ -0,0 +1,296 @@
+"""
+The solver module computes the exact odds of a battle, from any state, instead of estimating them by simulation.
+
+When both teams attack at random (like the CPU team and the simulations), a battle is a finite Markov chain: its state
+is the HP of every character and the team attacking next, and each attack leads to one of the (alive attackers x 3
+attack types x alive victims) next states with the same probability, following the rules of Engine.step. The solver
+computes the probability of each team winning and the expected number of attacks left of a state from those of its next
+states, exploring them depth-first with an explicit stack (battles can be thousands of attacks long).
+
+States are encoded as the team attacking next and the tuple of the HP of every character, rounded to DIGITS decimals so
+that the same hits in a different order lead to the same state. Results are memoized by state, in an LRU cache of
+bounded size: evicted states are computed again if they are needed, so memory stays capped whatever the length of the
+battle. Since every state reached by an attack was explored to solve
+the state before it, querying the solver again after each real attack of a battle mostly hits the cache.
+
+The number of states grows with the number of attacks needed to defeat the characters: a few thousands for teams that
+defeat each other in a few attacks, but many millions when weak characters chip at thousands of HP. Each query can be
+given a budget of new states, above which StateBudgetExceeded is raised, so callers can fall back to a simulation
+(see batch.win_probability).
+
+Classes:
+    Odds: The exact odds of a battle from a state.
+    StateBudgetExceeded: Raised when solving a state needs more new states than the budget.
+    WinSolver: Computes the exact odds of a battle between two teams.
+
+Example:
+    To get the odds of a battle before it starts, run `WinSolver(teams).solve()`, and `solver.solve(engine.side)` after
+    each attack of the engine.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from typing import NamedTuple
+from modules.team import Team
+
+DEFAULT_CAPACITY = 1_000_000
+# decimals of the HP of the states
+DIGITS = 6
+
+class Odds(NamedTuple):
+    win_probability: tuple[float, float]  # probability of each team winning
+    rounds: float  # expected number of attacks left, counted like Engine.round
+
+class StateBudgetExceeded(Exception):
+    """
+    Raised when solving a state needs more new states than the budget of the query.
+    """
+
+class _Frame:
+    # a state being solved: its next states are solved one by one, their results summed with their weights
+    __slots__ = ("key", "children", "index", "n", "passes", "win", "rounds", "partial")
+
+    def __init__(
+        self, key: tuple, children: list[tuple[tuple | None, int]], n: int, passes: int, partial: bool
+    ) -> None:
+        self.key = key
+        self.children = children  # next states (None when the attack wins) and the number of attacks leading to them
+        self.index = 0
+        self.n = n  # number of possible attacks
+        self.passes = passes  # number of attacks dealing no damage, which only hand the turn over
+        self.win = 0.0  # sum of the probability of the first team winning of the solved next states, with weights
+        self.rounds = 0.0  # sum of the expected attacks left after the solved next states, with weights
+        self.partial = partial  # whether the attacks dealing no damage are left to the frame below
+
+class WinSolver:
+    def __init__(self, teams: tuple[Team, Team], capacity: int = DEFAULT_CAPACITY) -> None:
+        """
+        Initializes the WinSolver object.
+
+        Args:
+            teams (tuple[Team, Team]): The prepared teams, the first one attacks first. The attacks of the characters
+                are read once, their HP on each query.
+            capacity (int): The maximum number of states kept in the cache.
+        """
+        self.teams = teams
+        self.capacity = capacity
+        self.size = len(teams[0].characters)  # the HP of the first team are the first of a state
+        self.attack = [
+            list(character.attack) for team in teams for character in team.characters
+        ]
+        # results by state, from the least to the most recently used: (side, HP of both teams) -> (win, rounds)
+        self.cache: OrderedDict[tuple, tuple[float, float]] = OrderedDict()
+        self.explored = 0  # number of states solved by the last query
+
+    def solve(self, side: int = 0, budget: int | None = None) -> Odds:
+        """
+        Computes the odds of the battle from the current HP of the teams.
+
+        Args:
+            side (int): The index of the team attacking next.
+            budget (int | None): The maximum number of new states solved, None for no limit.
+
+        Returns:
+            Odds: The exact odds of the battle.
+
+        Raises:
+            StateBudgetExceeded: If the battle needs more new states than the budget.
+            ValueError: If no character can deal damage, so the battle never ends.
+        """
+        # rounded like the states, since the HP of the characters drift from them when damages aren't exact in binary
+        hp = tuple(round(character.hp, DIGITS) for team in self.teams for character in team.characters)
+        return self.solve_state(hp, side, budget)
+
+    def solve_state(self, hp: tuple[float, ...], side: int = 0, budget: int | None = None) -> Odds:
+        """
+        Computes the odds of the battle from a state.
+
+        Args:
+            hp (tuple[float, ...]): The HP of the characters of the first team, then of the second team.
+            side (int): The index of the team attacking next.
+            budget (int | None): The maximum number of new states solved, None for no limit.
+
+        Returns:
+            Odds: The exact odds of the battle.
+
+        Raises:
+            StateBudgetExceeded: If the battle needs more new states than the budget.
+            ValueError: If no character can deal damage, so the battle never ends.
+        """
+        self.explored = 0
+        for team in (hp[:self.size], hp[self.size:]):
+            if not any(team):
+                # the battle is over
+                return Odds((1.0, 0.0) if any(hp[:self.size]) else (0.0, 1.0), 0.0)
+        key = (side, hp)
+        result = self.lookup(key)
+        if result is None:
+            result = self.explore(key, budget)
+        win, rounds = result
+        return Odds((win, 1 - win), rounds)
+
+    def lookup(self, key: tuple) -> tuple[float, float] | None:
+        """
+        Args:
+            key (tuple): The state.
+
+        Returns:
+            tuple[float, float] | None: The probability of the first team winning and the expected number of attacks
+                left of the state, None if it is not in the cache.
+        """
+        result = self.cache.get(key)
+        if result is not None:
+            self.cache.move_to_end(key)
+        return result
+
+    def store(self, key: tuple, result: tuple[float, float]) -> None:
+        """
+        Adds the result of a state to the cache, evicting the least recently used state if it is full.
+
+        Args:
+            key (tuple): The state.
+            result (tuple[float, float]): The probability of the first team winning and the expected number of attacks
+                left of the state.
+        """
+        self.cache[key] = result
+        if len(self.cache) > self.capacity:
+            self.cache.popitem(last=False)
+
+    def expand(self, key: tuple, partial: bool = False) -> _Frame:
+        """
+        Lists the next states of a state.
+
+        Args:
+            key (tuple): The state.
+            partial (bool): Whether the attacks dealing no damage are left to the frame below.
+
+        Returns:
+            _Frame: The frame solving the state.
+        """
+        side, hp = key
+        size = self.size
+        attackers = range(0, size) if side == 0 else range(size, len(hp))
+        victims = [i for i in (range(size, len(hp)) if side == 0 else range(0, size)) if hp[i] > 0]
+        # identical next states (e.g. equal damage) are only solved once, with the number of attacks leading to them
+        children: dict[tuple | None, int] = {}
+        n = passes = 0
+        for attacker in attackers:
+            if hp[attacker] <= 0:
+                continue
+            for damage in self.attack[attacker]:
+                n += len(victims)
+                if damage <= 0:
+                    passes += len(victims)
+                    continue
+                for victim in victims:
+                    victim_hp = round(max(hp[victim] - damage, 0), DIGITS)
+                    child = None
+                    if victim_hp > 0 or len(victims) > 1:
+                        child = (1 - side, hp[:victim] + (victim_hp,) + hp[victim + 1:])
+                    children[child] = children.get(child, 0) + 1
+        return _Frame(key, list(children.items()), n, passes, partial)
+
+    def explore(self, root: tuple, budget: int | None) -> tuple[float, float]:
+        """
+        Solves a state that is not in the cache, and the states it depends on.
+
+        Args:
+            root (tuple): The state.
+            budget (int | None): The maximum number of new states solved, None for no limit.
+
+        Returns:
+            tuple[float, float]: The probability of the first team winning and the expected number of attacks left of
+                the state.
+        """
+        stack = [self.push(root, False, budget)]
+        result = (0.0, 0.0)
+        while stack:
+            frame = stack[-1]
+            if frame.index < len(frame.children):
+                child, weight = frame.children[frame.index]
+                if child is None:
+                    # the attack defeats the last character of the opposing team
+                    frame.win += weight if frame.key[0] == 0 else 0
+                    frame.rounds += weight
+                    frame.index += 1
+                    continue
+                child_result = self.lookup(child)
+                if child_result is None:
+                    stack.append(self.push(child, False, budget))
+                    continue
+                frame.win += weight * child_result[0]
+                frame.rounds += weight * (child_result[1] + 1)
+                frame.index += 1
+                continue
+
+            if frame.partial:
+                stack.pop()
+                self.combine(stack[-1], frame)
+                continue
+            if frame.passes:
+                other = (1 - frame.key[0], frame.key[1])
+                other_result = self.lookup(other)
+                if other_result is None:
+                    # the states of both teams with the same HP depend on each other: the other one is solved without
+                    # its passes, then both are solved together
+                    stack.append(self.push(other, True, budget))
+                    continue
+                frame.win += frame.passes * other_result[0]
+                frame.rounds += frame.passes * (other_result[1] + 1)
+                frame.passes = 0
+
+            stack.pop()
+            result = (frame.win / frame.n, frame.rounds / frame.n)
+            self.store(frame.key, result)
+            if stack:
+                parent = stack[-1]
+                weight = parent.children[parent.index][1]
+                parent.win += weight * result[0]
+                parent.rounds += weight * (result[1] + 1)
+                parent.index += 1
+        return result
+
+    def push(self, key: tuple, partial: bool, budget: int | None) -> _Frame:
+        """
+        Counts a new state against the budget of the query, and lists its next states.
+
+        Args:
+            key (tuple): The state.
+            partial (bool): Whether the attacks dealing no damage are left to the frame below.
+            budget (int | None): The maximum number of new states solved, None for no limit.
+
+        Returns:
+            _Frame: The frame solving the state.
+
+        Raises:
+            StateBudgetExceeded: If the budget is exceeded.
+        """
+        self.explored += 1
+        if budget is not None and self.explored > budget:
+            raise StateBudgetExceeded(f"more than {budget} new states to solve")
+        return self.expand(key, partial)
+
+    def combine(self, frame: _Frame, other: _Frame) -> None:
+        """
+        Solves the attacks dealing no damage of the states of both teams with the same HP.
+
+        Each state is the weighted sum of its next states plus its passes times the other state: both equations are
+        solved together, the sums of the first frame are completed, and the other state is added to the cache.
+
+        Args:
+            frame (_Frame): The frame of the first state, whose next states are solved but not its passes.
+            other (_Frame): The frame of the other state, whose next states are solved but not its passes.
+
+        Raises:
+            ValueError: If no character of either team can deal damage, so the battle never ends.
+        """
+        passes, other_passes = frame.passes / frame.n, other.passes / other.n
+        loop = 1 - passes * other_passes
+        if loop <= 0:
+            raise ValueError("no character can deal damage, the battle never ends")
+        # a pass counts as an attack too
+        win = (frame.win / frame.n + passes * other.win / other.n) / loop
+        rounds = (frame.rounds / frame.n + passes * (1 + other.rounds / other.n + other_passes)) / loop
+        self.store(
+            other.key, (other.win / other.n + other_passes * win, other.rounds / other.n + other_passes * (1 + rounds))
+        )
+        frame.win, frame.rounds, frame.passes = win * frame.n, rounds * frame.n, 0
@@ -0,0 +1,157 @@
+"""
+The tables module precomputes the battle attributes of the characters of the catalog, to look them up instead of
+computing them for every battle.
+
+The real stats, HP and attacks of a character only depend on its raw stats, its actual stamina (0 to 10) and its
+filiation coefficient, drawn from 1 to 10 and inverted when the character doesn't share the alignment of its team:
+220 combinations per character. build_tables computes them all for every valid character of the catalog in one
+vectorized pass, with the formulas of batch.prepare_teams, and save_tables writes them to a .npy file. HeroTables
+memory-maps that file, so processes loading the same tables share its pages instead of copying them. Team preparation
+then looks characters up by their raw stats; characters missing from the tables (e.g. not in the catalog when they were
+built) fall back to the formulas of the Character class.
+
+Table layout: one record per character, with its raw stats ("base_stats", in the order of STATS) and its attributes
+("values") indexed by [actual stamina, misaligned (0 or 1), filiation draw (0 to 9)], each holding the 6 real stats, the
+HP, the 3 attacks and the filiation coefficient (VALUES), as float64.
+
+Classes:
+    HeroTables: Represents the memory-mapped tables of the characters of the catalog.
+
+Functions:
+    build_tables: Computes the tables of characters.
+    save_tables: Builds the tables of the characters of the catalog and writes them to a file.
+
+Example:
+    To build the tables of the catalog, run `python main.py catalog tables`, then use them with
+    `python main.py simulate --tables hero_tables.npy`.
+"""
+import os
+from typing import TYPE_CHECKING
+from modules.character import STATS, Character
+
+if TYPE_CHECKING:
+    import numpy as np
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "hero_tables.npy")
+STAMINA_LEVELS = 11
+FB_DRAWS = 10
+# attributes of a combination, in the order of the last axis of the values
+VALUES = (*STATS, "hp", "mental", "strong", "fast", "fb")
+
+def table_dtype() -> "np.dtype":
+    """
+    Returns:
+        np.dtype: The structured dtype of the record of a character.
+    """
+    import numpy as np
+
+    return np.dtype([
+        ("base_stats", "<i8", (len(STATS),)),
+        ("values", "<f8", (STAMINA_LEVELS, 2, FB_DRAWS, len(VALUES)))
+    ])
+
+def build_tables(heroes: dict[str, dict[str, str]]) -> "np.ndarray":
+    """
+    Computes the attributes of every combination of actual stamina and filiation coefficient of characters.
+
+    Args:
+        heroes (dict[str, dict[str, str]]): The data of the characters, keyed by character ID.
+
+    Returns:
+        np.ndarray: The tables, one record per character (see the table layout of the module).
+    """
+    import numpy as np
+    from modules.batch import prepare_teams
+
+    base_stats = np.array([[int(data[stat]) for stat in STATS] for data in heroes.values()], dtype=np.int64)
+    base_stats = base_stats.reshape(len(heroes), len(STATS))
+    stamina, misaligned, draws = (
+        grid.ravel() for grid in np.meshgrid(
+            np.arange(STAMINA_LEVELS), np.arange(2), np.arange(FB_DRAWS), indexing="ij"
+        )
+    )
+    shape = (len(heroes), stamina.size)
+    # each character is prepared as a 'good' team of its 220 combinations, the misaligned ones being 'bad'
+    prepared = prepare_teams(
+        np.broadcast_to(base_stats[:, None, :], (*shape, len(STATS))),
+        np.broadcast_to(np.where(misaligned == 1, "bad", "good"), shape),
+        np.broadcast_to(stamina, shape),
+        np.broadcast_to(draws, shape),
+        np.full(len(heroes), "good")
+    )
+    values = np.concatenate(
+        [prepared.stats, prepared.hp[..., None], prepared.attack, prepared.fb[..., None]], axis=-1
+    )
+
+    tables = np.zeros(len(heroes), dtype=table_dtype())
+    tables["base_stats"] = base_stats
+    tables["values"] = values.reshape(len(heroes), STAMINA_LEVELS, 2, FB_DRAWS, len(VALUES))
+    return tables
+
+def save_tables(catalog_path: str, path: str = DEFAULT_PATH) -> int:
+    """
+    Builds the tables of the valid characters of the catalog and writes them to a .npy file.
+
+    Args:
+        catalog_path (str): The path of the SQLite file of the catalog.
+        path (str): The path of the tables.
+
+    Returns:
+        int: The number of characters in the tables.
+    """
+    import numpy as np
+    from modules.catalog import HeroCatalog
+
+    catalog = HeroCatalog(catalog_path)
+    heroes = catalog.valid_heroes()
+    catalog.close()
+    np.save(path, build_tables(heroes))
+    return len(heroes)
+
+class HeroTables:
+    def __init__(self, path: str = DEFAULT_PATH) -> None:
+        """
+        Initializes the HeroTables object, memory-mapping the tables without reading them.
+
+        Args:
+            path (str): The path of the tables, as written by save_tables.
+        """
+        import numpy as np
+
+        self.path = path
+        tables = np.load(path, mmap_mode="r")
+        # plain array view of the mapping: indexing a memmap is slower, and the pages stay shared
+        self.values = np.asarray(tables["values"])
+        self.rows = {tuple(stats): row for row, stats in enumerate(tables["base_stats"].tolist())}
+
+    def prepare(self, character: Character, aligned: bool, draw: int) -> bool:
+        """
+        Sets the filiation coefficient, real stats, HP and attacks of a character from the tables, like
+        Team.update_characters does.
+
+        Args:
+            character (Character): The character, with its actual stamina.
+            aligned (bool): Whether the character shares the alignment of its team.
+            draw (int): The filiation draw of the character (0 to 9).
+
+        Returns:
+            bool: Whether the character was found in the tables, False if it must be prepared with the formulas.
+        """
+        row = self.rows.get(character.base_stats)
+        if row is None:
+            return False
+        values = self.values[row, character.actual_stamina, 0 if aligned else 1, draw].tolist()
+        character.stats = tuple(map(int, values[:6]))
+        character.hp = int(values[6])
+        if len(character.attack) == 0:
+            # like Character.set_attacks, attacks are only set once
+            character.attack = values[7:10]
+        character.fb = values[10]
+        return True
+
+    def __getstate__(self) -> dict:
+        # sent to worker processes by path: each one maps the same file
+        return {"path": self.path}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["path"])
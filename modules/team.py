@@ -17,9 +17,15 @@ Methods:
     set_team_alignment: Determines the alignment of the team based on the alignments of its characters.
     update_characters: Updates the attributes of the characters in the team after determining the team's alignment.
 """
+from __future__ import annotations
 import math
 import random
+from typing import TYPE_CHECKING
 from modules.character import Character
+from modules.instrumentation import timed
+
+if TYPE_CHECKING:
+    from modules.tables import HeroTables
 
 class Team:
     def __init__(self, characters: list[Character]) -> None:
@@ -33,14 +39,15 @@ class Team:
         self.team_alignment = ""
         # self.update_characters()
 
-    # team is good if 3 or more characters are good
-    def set_team_alignment(self) -> None:
+    # team is good if more than half of its characters are good (3 or more in a team of 5)
+    def set_team_alignment(self) -> str:
         """
         Determines the alignment of the team based on the alignments of its characters.
 
         Returns:
             str: The alignment of the team ('good' or 'bad').
         """
+        majority = len(self.characters) // 2 + 1
         good_count, bad_count = 0, 0
         for character in self.characters:
             # assumption: "neutral" characters are in alignment with "bad" ones => there are no neutral teams
@@ -49,18 +56,30 @@ class Team:
             else:
                 bad_count += 1
 
-            if good_count == 3:
+            if good_count == majority:
                 self.team_alignment = 'good'
-                return None
+                return self.team_alignment
         self.team_alignment = 'bad'
+        return self.team_alignment
 
     # set filiation coefficient, real stats, hp and attacks after team is defined and team_alignment determined
-    def update_characters(self) -> None:
+    @timed("update_characters")
+    def update_characters(self, rng: random.Random | None = None, tables: "HeroTables | None" = None) -> None:
         """
         Updates the attributes of the characters in the team after determining the team's alignment.
+
+        Args:
+            rng (random.Random | None): The RNG used to draw the filiation coefficients, the global one if not provided.
+            tables (HeroTables | None): The precomputed tables the characters are looked up in, if any. Characters
+                missing from the tables are computed, with the same results.
         """
+        rng = rng or random
         for character in self.characters:
-            character.fb = 1 + random.randrange(10) if self.team_alignment == character.data["alignment"] else math.pow(1 + random.randrange(10), -1)
+            draw = rng.randrange(10)
+            aligned = self.team_alignment == character.alignment
+            if tables is not None and tables.prepare(character, aligned, draw):
+                continue
+            character.fb = 1 + draw if aligned else math.pow(1 + draw, -1)
 
             # set real stats, then set hp and finally set attacks
             character.set_real_stats()
@@ -0,0 +1,327 @@
+"""
+The tournament module runs round-robin and bracket tournaments between many teams of characters on several processes.
+
+It contains the Tournament class, which builds teams from a roster of valid characters (e.g. the local hero catalog),
+shards the pairings of the tournament across a ProcessPoolExecutor and streams the results back as shards complete.
+Every match gets its own seed, derived from the master seed of the tournament and the match index, so a tournament is
+reproducible from its master seed whatever the number of workers and the order in which shards complete. Results are
+aggregated into Elo-style ratings per character and per team, applied in match order. Only a few shards per worker are
+in flight at once, so the matches waiting to be played don't grow with the size of the tournament.
+
+With analytics, every worker also aggregates the battles of its shards into per-hero balance statistics of the
+analytics module, which are merged into Tournament.balance in shard order as shards complete.
+
+Classes:
+    MatchResult: A compact record of a finished match.
+    EloRatings: Represents Elo-style ratings of players.
+    Tournament: Represents a tournament between teams of characters.
+
+Functions:
+    match_seed: Derives the seed of a match from the master seed of a tournament.
+    play_match: Plays a single match of a tournament.
+
+Example:
+    To run a round-robin tournament between 32 teams from the local catalog, run
+    `for result in Tournament(HeroCatalog().valid_heroes(), 32, master_seed=1).round_robin(): ...`. To simulate
+    independent battles between random teams instead, iterate over `pairs()`.
+"""
+from __future__ import annotations
+import itertools
+import os
+import random
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import TYPE_CHECKING, NamedTuple
+from modules.analytics import BalanceStats
+from modules.character import Character
+from modules.engine import simulate
+from modules.rng import derive_seed
+from modules.team import Team
+
+if TYPE_CHECKING:
+    from modules.tables import HeroTables
+
+class MatchResult(NamedTuple):
+    match: int  # index of the match in the tournament
+    teams: tuple[int, int]  # indexes of the teams, the first one attacked first
+    winner: int  # index of the winning team
+    rounds: int
+
+def match_seed(master_seed: int, match: int) -> int:
+    """
+    Derives the seed of a match from the master seed of a tournament.
+
+    Args:
+        master_seed (int): The master seed of the tournament.
+        match (int): The index of the match.
+
+    Returns:
+        int: The 64-bit seed of the match.
+    """
+    return derive_seed(master_seed, "match", match)
+
+# roster and tables of the worker processes, set once by the pool initializer instead of being sent with every match
+_roster: dict[str, dict[str, str]] = {}
+_tables: "HeroTables | None" = None
+
+def _init_worker(roster: dict[str, dict[str, str]], tables: "HeroTables | None" = None) -> None:
+    global _roster, _tables  # pylint: disable=global-statement
+    _roster = roster
+    _tables = tables
+
+def play_match(
+    roster: dict[str, dict[str, str]],
+    match: int,
+    teams: tuple[int, int],
+    lineups: tuple[tuple[str, ...], ...],
+    seed: int,
+    tables: "HeroTables | None" = None,
+    balance: BalanceStats | None = None
+) -> MatchResult:
+    """
+    Plays a single match of a tournament.
+
+    Args:
+        roster (dict[str, dict[str, str]]): The data of the characters, keyed by character ID.
+        match (int): The index of the match.
+        teams (tuple[int, int]): The indexes of the two teams.
+        lineups (tuple[tuple[str, ...], ...]): The character IDs of the two teams.
+        seed (int): The seed of the match.
+        tables (HeroTables | None): The precomputed tables the characters are looked up in, if any.
+        balance (BalanceStats | None): The statistics the battle is added to, if any.
+
+    Returns:
+        MatchResult: The result of the match.
+    """
+    rng = random.Random(seed)
+    formatted = tuple(Team([Character(roster[character_id], rng) for character_id in lineup]) for lineup in lineups)
+    for team in formatted:
+        team.set_team_alignment()
+        team.update_characters(rng, tables)
+    # the hits of a single battle are only kept to be aggregated
+    result = simulate(formatted, rng, record_hits=balance is not None)
+    if balance is not None:
+        balance.add_battle(formatted, result)
+    return MatchResult(match, teams, teams[result.winner], result.rounds)
+
+def _play_shard(
+    shard: list[tuple[int, tuple[int, int], tuple[tuple[str, ...], ...], int]], analytics: bool = False
+) -> tuple[list[MatchResult], BalanceStats | None]:
+    balance = BalanceStats() if analytics else None
+    return [play_match(_roster, *match, _tables, balance) for match in shard], balance
+
+class EloRatings:
+    def __init__(self, k: float = 32, initial: float = 1500) -> None:
+        """
+        Initializes the EloRatings object.
+
+        Args:
+            k (float): The maximum change of a rating after a match.
+            initial (float): The rating of a player before its first match.
+        """
+        self.k = k
+        self.initial = initial
+        self.ratings: dict = {}
+
+    def __getitem__(self, player) -> float:
+        return self.ratings.get(player, self.initial)
+
+    def update(self, winners: tuple, losers: tuple) -> None:
+        """
+        Updates the ratings of the players after a match, each side being rated as the mean of its players.
+
+        Args:
+            winners (tuple): The players of the winning side.
+            losers (tuple): The players of the losing side.
+        """
+        winners_rating = sum(self[player] for player in winners) / len(winners)
+        losers_rating = sum(self[player] for player in losers) / len(losers)
+        expected = 1 / (1 + 10 ** ((losers_rating - winners_rating) / 400))
+        change = self.k * (1 - expected)
+        for player in winners:
+            self.ratings[player] = self[player] + change
+        for player in losers:
+            self.ratings[player] = self[player] - change
+
+    def ranking(self) -> list[tuple]:
+        """
+        Returns:
+            list[tuple]: The (player, rating) pairs, from the highest to the lowest rating.
+        """
+        return sorted(self.ratings.items(), key=lambda item: item[1], reverse=True)
+
+class Tournament:
+    def __init__(
+        self,
+        roster: dict[str, dict[str, str]],
+        n_teams: int,
+        master_seed: int,
+        team_size: int = 5,
+        workers: int | None = None,
+        shard_size: int = 64,
+        tables: "HeroTables | None" = None,
+        analytics: bool = False
+    ) -> None:
+        """
+        Initializes the Tournament object and builds its teams from random characters of the roster.
+
+        Args:
+            roster (dict[str, dict[str, str]]): The data of the valid characters, keyed by character ID.
+            n_teams (int): The number of teams in the tournament.
+            master_seed (int): The seed from which the teams and every match are derived.
+            team_size (int): The number of characters in a team.
+            workers (int | None): The number of worker processes, the number of CPUs if not provided.
+            shard_size (int): The number of matches sent to a worker at once.
+            tables (HeroTables | None): The precomputed tables of the characters, if any, memory-mapped by every worker.
+            analytics (bool): Whether to aggregate per-hero balance statistics of the matches, in Tournament.balance.
+        """
+        self.roster = roster
+        self.tables = tables
+        self.master_seed = master_seed
+        self.workers = workers
+        self.shard_size = shard_size
+        rng = random.Random(master_seed)
+        character_ids = sorted(roster, key=int)
+        self.teams = [tuple(rng.sample(character_ids, team_size)) for _ in range(n_teams)]
+        self.character_ratings = EloRatings()
+        self.team_ratings = EloRatings()
+        self.matches_played = 0
+        self.balance = BalanceStats() if analytics else None
+
+    def play(self, pairings: list[tuple[int, int]], executor: ProcessPoolExecutor) -> Iterator[MatchResult]:
+        """
+        Plays matches on the worker processes, streaming the results as shards complete.
+
+        Ratings are updated in match order, and balance statistics merged in shard order, so they don't depend on the
+        order in which shards complete.
+
+        Args:
+            pairings (list[tuple[int, int]]): The indexes of the teams of each match.
+            executor (ProcessPoolExecutor): The pool of worker processes.
+
+        Yields:
+            MatchResult: The result of each match, in completion order.
+        """
+        first_match = self.matches_played
+        self.matches_played += len(pairings)
+        analytics = self.balance is not None
+        max_in_flight = 4 * (self.workers or os.cpu_count() or 1)
+
+        shards = enumerate(self.shards(pairings, first_match))
+        in_flight: dict[Future, int] = {}  # index of the shard of each future
+        pending: dict[int, MatchResult] = {}
+        pending_balance: dict[int, BalanceStats] = {}
+        next_match, next_shard = first_match, 0
+        while True:
+            for index, shard in itertools.islice(shards, max_in_flight - len(in_flight)):
+                in_flight[executor.submit(_play_shard, shard, analytics)] = index
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                results, balance = future.result()
+                if balance is not None:
+                    pending_balance[in_flight[future]] = balance
+                del in_flight[future]
+                for result in results:
+                    pending[result.match] = result
+                    yield result
+            while next_match in pending:
+                self.rate(pending.pop(next_match))
+                next_match += 1
+            while next_shard in pending_balance:
+                self.balance.merge(pending_balance.pop(next_shard))
+                next_shard += 1
+
+    def shards(
+        self, pairings: list[tuple[int, int]], first_match: int
+    ) -> Iterator[list[tuple[int, tuple[int, int], tuple[tuple[str, ...], ...], int]]]:
+        """
+        Lazily splits matches into shards.
+
+        Args:
+            pairings (list[tuple[int, int]]): The indexes of the teams of each match.
+            first_match (int): The index of the first match.
+
+        Yields:
+            list[tuple[int, tuple[int, int], tuple[tuple[str, ...], ...], int]]: The index, teams, character IDs of the
+                teams and seed of each match of the next shard.
+        """
+        for start in range(0, len(pairings), self.shard_size):
+            shard = []
+            shard_pairings = pairings[start:start + self.shard_size]
+            for match, (team_a, team_b) in enumerate(shard_pairings, start=first_match + start):
+                seed = match_seed(self.master_seed, match)
+                # the team attacking first is drawn from the seed of the match
+                teams = (team_a, team_b) if seed % 2 == 0 else (team_b, team_a)
+                shard.append((match, teams, (self.teams[teams[0]], self.teams[teams[1]]), seed))
+            yield shard
+
+    def rate(self, result: MatchResult) -> None:
+        """
+        Updates the ratings of the characters and teams of a match.
+
+        Teams are sampled independently, so a character can play on both sides of a match: such a character neither
+        won nor lost, and its rating is left out of the update.
+
+        Args:
+            result (MatchResult): The result of the match.
+        """
+        loser = result.teams[0] if result.winner == result.teams[1] else result.teams[1]
+        self.team_ratings.update((result.winner,), (loser,))
+        shared = set(self.teams[result.winner]) & set(self.teams[loser])
+        winners = tuple(character_id for character_id in self.teams[result.winner] if character_id not in shared)
+        losers = tuple(character_id for character_id in self.teams[loser] if character_id not in shared)
+        if winners and losers:
+            self.character_ratings.update(winners, losers)
+
+    def executor(self) -> ProcessPoolExecutor:
+        """
+        Returns:
+            ProcessPoolExecutor: A pool of worker processes that hold the roster of the tournament.
+        """
+        return ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.roster, self.tables))
+
+    def round_robin(self) -> Iterator[MatchResult]:
+        """
+        Plays a round-robin tournament, in which every team plays every other team once.
+
+        Yields:
+            MatchResult: The result of each match, in completion order.
+        """
+        pairings = [(i, j) for i in range(len(self.teams)) for j in range(i + 1, len(self.teams))]
+        with self.executor() as executor:
+            yield from self.play(pairings, executor)
+
+    def pairs(self) -> Iterator[MatchResult]:
+        """
+        Plays independent matches, in which each team plays a single match against the next team (teams 0 and 1, 2 and
+        3...).
+
+        Yields:
+            MatchResult: The result of each match, in completion order.
+        """
+        pairings = [(i, i + 1) for i in range(0, len(self.teams) - 1, 2)]
+        with self.executor() as executor:
+            yield from self.play(pairings, executor)
+
+    def bracket(self) -> Iterator[MatchResult]:
+        """
+        Plays a single-elimination tournament, in which the winners of each round face each other in the next one.
+        Teams are seeded at random, and a team without an opponent advances to the next round.
+
+        Yields:
+            MatchResult: The result of each match, in completion order.
+        """
+        remaining = list(range(len(self.teams)))
+        random.Random(match_seed(self.master_seed, -1)).shuffle(remaining)
+        with self.executor() as executor:
+            while len(remaining) > 1:
+                pairings = list(zip(remaining[::2], remaining[1::2]))
+                results = sorted(self.play(pairings, executor))
+                winners = {result.winner for result in results}
+                # keep the bracket order for the next round
+                remaining = [team for team in remaining if team in winners] + (
+                    [remaining[-1]] if len(remaining) % 2 else []
+                )
+                yield from results
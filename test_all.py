@@ -1,63 +1,192 @@
+from __future__ import annotations
+import asyncio
+import io
+import json
+import random
+import statistics
+import subprocess
+import sys
+import time
 import pytest
-from modules.character import Character
+import main
+from modules.analytics import BalanceStats, QuantileSketch, RunningMoments, median_of_counts
+from benchmarks.suite import bench_get_teams, compare, prepared_teams
+from modules.api import ApiClient, ApiError, CircuitBreaker, CircuitOpenError, InvalidResponseError, TokenBucket
+from modules.battle import Battle
+from modules.catalog import HeroCatalog
+from modules.character import STATS, Character
+from modules.engine import (
+    SMALL_TEAM_SIZE, AliveSet, BattleRecord, Engine, Policy, random_attacker, replay, simulate, snapshot
+)
+from modules.events import BinarySink, Event, EventSink, NdjsonSink, RingBufferSink, load_binary_log, read_ndjson_log
+from modules.instrumentation import INSTRUMENTS, NULL_TIMER, session
+from modules.policies import FocusFirePolicy, GreedyPolicy, LookaheadPolicy, RandomPolicy, expected_damage
+from modules.renderer import Renderer
+from modules.rng import derive_seed, substream
+from modules.sampler import HeroIndex, shuffled
+from modules.server import BattleServer, bot
+from modules.solver import DIGITS, StateBudgetExceeded, WinSolver
 from modules.team import Team
+from modules.tournament import EloRatings, MatchResult, Tournament
+
+class FakeResponse:
+    def __init__(self, data: dict[str, str]) -> None:
+        self.data = data
+
+    status = 200
+
+    async def __aenter__(self) -> "FakeResponse":
+        await asyncio.sleep(0)
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        return None
+
+    async def json(self, **kwargs) -> dict[str, str]:
+        return self.data
+
+class FakeSession:
+    # serves valid characters for even IDs and null powerstats for odd IDs
+    def __init__(self) -> None:
+        self.requested: list[str] = []
+
+    def get(self, url: str, **kwargs) -> FakeResponse:
+        character_id, endpoint = url.split("/")[-2:]
+        self.requested.append(url)
+        if endpoint == "biography":
+            return FakeResponse({"alignment": "good"})
+        value = "null" if int(character_id) % 2 else "50"
+        stats = ("combat", "durability", "intelligence", "power", "speed", "strength")
+        return FakeResponse({"name": f"Character {character_id}", **{stat: value for stat in stats}})
+
+class FailingSession(FakeSession):
+    # fails with HTTP 503 the first `failures` requests
+    def __init__(self, failures: int = 10 ** 9) -> None:
+        super().__init__()
+        self.failures = failures
+        self.calls = 0
+
+    def get(self, url: str, **kwargs) -> FakeResponse:
+        self.calls += 1
+        response = super().get(url, **kwargs)
+        if self.calls <= self.failures:
+            response.status = 503
+        return response
+
+class SlowResponse(FakeResponse):
+    def __init__(self, data: dict[str, str], delay: float) -> None:
+        super().__init__(data)
+        self.delay = delay
+
+    async def __aenter__(self) -> "SlowResponse":
+        await asyncio.sleep(self.delay)
+        return self
+
+class JitterSession(FakeSession):
+    # answers after a random delay, drawn from its own RNG
+    def __init__(self, seed: int) -> None:
+        super().__init__()
+        self.jitter = random.Random(seed)
+
+    def get(self, url: str, **kwargs) -> FakeResponse:
+        response = super().get(url, **kwargs)
+        return SlowResponse(response.data, self.jitter.uniform(0, .01))
+
+class ReplayedDraws(random.Random):
+    # replays uniform draws in [0, 1): randrange(n) picks int(u * n), like BatchSimulator.pick
+    def __new__(cls, draws) -> ReplayedDraws:
+        # before Python 3.11, random.Random is seeded with the arguments of its constructor
+        return super().__new__(cls, 0)
+
+    def __init__(self, draws) -> None:
+        super().__init__(0)
+        self.draws = iter(draws)
+
+    def randrange(self, n: int) -> int:
+        return int(next(self.draws) * n)
+
+class RejectingSession(FakeSession):
+    # answers HTTP 404 for the IDs that are multiples of 4
+    def get(self, url: str, **kwargs) -> FakeResponse:
+        response = super().get(url, **kwargs)
+        if int(url.split("/")[-2]) % 4 == 0:
+            response.status = 404
+        return response
+
+# 5 sample characters data for testing
+CHARACTERS_DATA = [
+    {
+        "name": "Test Character 1",
+        "alignment": "good",
+        "combat": "17",
+        "durability": "80",
+        "intelligence": "37",
+        "power": "66",
+        "speed": "32",
+        "strength": "33"
+    },
+    {
+        "name": "Test Character 2",
+        "alignment": "bad",
+        "combat": "84",
+        "durability": "64",
+        "intelligence": "90",
+        "power": "32",
+        "speed": "34",
+        "strength": "5"
+    },
+    {
+        "name": "Test Character 3",
+        "alignment": "good",
+        "combat": "55",
+        "durability": "7",
+        "intelligence": "90",
+        "power": "40",
+        "speed": "92",
+        "strength": "23"
+    },
+    {
+        "name": "Test Character 4",
+        "alignment": "bad",
+        "combat": "54",
+        "durability": "93",
+        "intelligence": "47",
+        "power": "58",
+        "speed": "17",
+        "strength": "79"
+    },
+    {
+        "name": "Test Character 5",
+        "alignment": "good",
+        "combat": "36",
+        "durability": "88",
+        "intelligence": "43",
+        "power": "83",
+        "speed": "58",
+        "strength": "24"
+    }
+]
 
 @pytest.fixture(name="team")
 def sample_team() -> Team:
     # Set up 5 sample characters data for testing
-    characters_data = [
-        {
-            "name": "Test Character 1",
-            "alignment": "good",
-            "combat": "17",
-            "durability": "80",
-            "intelligence": "37",
-            "power": "66",
-            "speed": "32",
-            "strength": "33"
-        },
-        {
-            "name": "Test Character 2",
-            "alignment": "bad",
-            "combat": "84",
-            "durability": "64",
-            "intelligence": "90",
-            "power": "32",
-            "speed": "34",
-            "strength": "5"
-        },
-        {
-            "name": "Test Character 3",
-            "alignment": "good",
-            "combat": "55",
-            "durability": "7",
-            "intelligence": "90",
-            "power": "40",
-            "speed": "92",
-            "strength": "23"
-        },
-        {
-            "name": "Test Character 4",
-            "alignment": "bad",
-            "combat": "54",
-            "durability": "93",
-            "intelligence": "47",
-            "power": "58",
-            "speed": "17",
-            "strength": "79"
-        },
-        {
-            "name": "Test Character 5",
-            "alignment": "good",
-            "combat": "36",
-            "durability": "88",
-            "intelligence": "43",
-            "power": "83",
-            "speed": "58",
-            "strength": "24"
-        }
-    ]
-    return Team([Character(characters_data[0]), Character(characters_data[1]), Character(characters_data[2]), Character(characters_data[3]), Character(characters_data[4])])
+    return Team([Character(dict(data)) for data in CHARACTERS_DATA])
+
+def prepared_team(alignment: str, stamina: int, fb: float) -> Team:
+    # team with fixed stamina and filiation coefficients, ready to battle
+    team = Team([Character(dict(data)) for data in CHARACTERS_DATA])
+    team.team_alignment = alignment
+    for character in team.characters:
+        character.actual_stamina = stamina
+        character.fb = fb
+        character.set_real_stats()
+        character.set_hp()
+        character.set_attacks()
+    return team
+
+@pytest.fixture(name="teams")
+def sample_teams() -> tuple[Team, Team]:
+    return prepared_team("good", 5, 2), prepared_team("bad", 3, 1)
 
 @pytest.fixture(name="character")
 def sample_character() -> Character:
@@ -80,12 +209,8 @@ def sample_character() -> Character:
 
 @pytest.fixture(name="character_real")
 def sample_character_real_stats(character: Character) -> Character:
-    character.data['combat'] = '177'
-    character.data['durability'] = '750'
-    character.data['intelligence'] = '359'
-    character.data['power'] = '622'
-    character.data['speed'] = '313'
-    character.data['strength'] = '322'
+    # combat, durability, intelligence, power, speed, strength
+    character.stats = (177, 750, 359, 622, 313, 322)
 
     return character
 
@@ -117,6 +242,21 @@ class TestCharacter:
         damage = character_real.calculate_attack(["intelligence", "speed", "combat"], [.7, .2, .1])
         assert round(damage, 1) == 1658
 
+    def test_data_view(self, character: Character) -> None:
+        # Test if the data is parsed once and exposed as a read-only view
+        assert character.base_stats == (17, 80, 37, 66, 32, 33)
+        assert character.data['name'] == "Test Character 1"
+        assert character.data['speed'] == '32'
+        assert dict(character.data)['alignment'] == "good"
+        assert not hasattr(character, "__dict__")
+        with pytest.raises(TypeError):
+            character.data['speed'] = '100'
+
+    def test_set_real_stats_is_idempotent(self, character: Character) -> None:
+        character.set_real_stats()
+        character.set_real_stats()
+        assert character.data['combat'] == '177'
+
     def test_assess_damage(self, character: Character) -> None:
         # Test if damage assessment modifies HP correctly
         character.hp = 100
@@ -136,10 +276,1099 @@ class TestTeam:
         alignment = team.set_team_alignment()
         assert alignment == "good"
 
+    @pytest.mark.parametrize("good, size, alignment", [(2, 4, "bad"), (3, 4, "good"), (3, 7, "bad"), (4, 7, "good")])
+    def test_set_team_alignment_size(self, good: int, size: int, alignment: str) -> None:
+        # a team is good when more than half of its characters are good
+        team = Team([
+            Character({**CHARACTERS_DATA[0], "alignment": "good" if i < good else "neutral"}) for i in range(size)
+        ])
+        assert team.set_team_alignment() == alignment
+
     def test_update_characters(self, team: Team) -> None:
 
         team.update_characters()
 
         for character in team.characters:
             assert character.fb > 0
-            assert character.hp > 0
\ No newline at end of file
+            assert character.hp > 0
+
+class TestBattle:
+
+    @staticmethod
+    def make_battle(session: FakeSession, catalog: HeroCatalog | None = None) -> Battle:
+        # battle without its interactive game, only fetching its roster
+        battle = Battle.__new__(Battle)
+        battle.client = ApiClient("https://example.com/api/", session=session, rate=10 ** 6, burst=10 ** 6)
+        battle.catalog = catalog
+        battle.seed = 1
+        battle.rng = random.Random(1)
+        return battle
+
+    def test_get_teams(self) -> None:
+        session = FakeSession()
+        battle = self.make_battle(session)
+
+        teams = asyncio.run(battle.get_teams(max_in_flight=4))
+
+        names = [character.data["name"] for team in teams.values() for character in team]
+        assert len(teams["Team 1"]) == 5 and len(teams["Team 2"]) == 5
+        assert len(set(names)) == 10
+        # both endpoints are requested for each candidate, and no candidate twice
+        assert len(session.requested) == len(set(session.requested))
+
+    def test_get_teams_ignores_network_timing(self) -> None:
+        rosters = []
+        for jitter_seed in (1, 2):
+            teams = asyncio.run(self.make_battle(JitterSession(jitter_seed)).get_teams())
+            rosters.append([character.data["name"] for team in teams.values() for character in team])
+
+        # the roster is made of the first valid candidates in draw order
+        assert rosters[0] == rosters[1]
+
+    def test_prefetch_roster(self, capsys: pytest.CaptureFixture) -> None:
+        with ApiClient("https://example.com/api/", session=FakeSession(), rate=10 ** 6, burst=10 ** 6) as client:
+            roster = Battle.fetcher(client, seed=5).prefetch_roster()
+            teams = Battle.take_roster(roster)
+            # the prefetched roster is the one the next battle would fetch with its seed
+            expected = client.run(Battle.fetcher(client, seed=roster.seed).get_teams(show_progress=False))
+
+        assert roster.seed == derive_seed(5, "next")
+        assert [c.data["name"] for c in teams["Team 1"] + teams["Team 2"]] == [
+            c.data["name"] for c in expected["Team 1"] + expected["Team 2"]
+        ]
+        # the background fetch doesn't print
+        assert capsys.readouterr().out == ""
+
+    def test_discarded_roster(self) -> None:
+        with ApiClient("https://example.com/api/", session=JitterSession(1)) as client:
+            roster = Battle.fetcher(client, seed=5).prefetch_roster()
+            roster.future.cancel()
+
+            assert Battle.take_roster(roster) is None
+
+    def test_get_teams_warm_catalog(self) -> None:
+        session = FakeSession()
+        catalog = HeroCatalog(":memory:")
+        for character_id in range(1, 732):
+            data = {"name": f"Character {character_id}", "alignment": "bad", **dict.fromkeys(STATS, "1")}
+            catalog.put(str(character_id), data if character_id % 3 else None)
+        battle = self.make_battle(session, catalog)
+
+        teams = asyncio.run(battle.get_teams())
+
+        assert session.requested == []
+        assert all(int(character.data["name"].split()[1]) % 3 for team in teams.values() for character in team)
+
+    def test_get_teams_falls_back_to_catalog(self) -> None:
+        catalog = HeroCatalog(":memory:")
+        for character_id in range(1, 21):
+            catalog.put(str(character_id), {"name": f"Cached {character_id}", "alignment": "good", **dict.fromkeys(STATS, "9")})
+        battle = self.make_battle(FailingSession(), catalog)
+        battle.client.retries = 0
+        battle.client.breaker = CircuitBreaker(failure_threshold=1)
+
+        teams = asyncio.run(battle.get_teams())
+
+        names = [character.data["name"] for team in teams.values() for character in team]
+        assert len(set(names)) == 10 and all(name.startswith("Cached") for name in names)
+
+    def test_get_teams_rejects_client_errors(self) -> None:
+        session = RejectingSession()
+        catalog = HeroCatalog(":memory:")
+        battle = self.make_battle(session, catalog)
+
+        teams = asyncio.run(battle.get_teams())
+
+        # rejected IDs are skipped without aborting the roster, and remembered as invalid
+        ids = [int(character.data["name"].split()[1]) for team in teams.values() for character in team]
+        assert len(ids) == 10 and all(character_id % 4 == 2 for character_id in ids)
+        rejected = {url.split("/")[-2] for url in session.requested if int(url.split("/")[-2]) % 4 == 0}
+        assert rejected and rejected <= catalog.invalid_ids()
+
+    def test_get_teams_known_invalid(self) -> None:
+        session = FakeSession()
+        catalog = HeroCatalog(":memory:")
+        for character_id in range(1, 721):
+            catalog.put(str(character_id), None)
+        battle = self.make_battle(session, catalog)
+
+        # 5 of the 11 IDs left are valid: each one is requested once, then the draws run out instead of looping
+        with pytest.raises(ApiError):
+            asyncio.run(battle.get_teams(show_progress=False))
+        requested = [url.split("/")[-2] for url in session.requested]
+        assert sorted(set(requested), key=int) == [str(character_id) for character_id in range(721, 732)]
+        assert len(requested) == 2 * 11
+        assert catalog.index().valid["good"] == [722, 724, 726, 728, 730]
+
+    def test_get_teams_without_fallback(self, capsys: pytest.CaptureFixture) -> None:
+        battle = self.make_battle(FailingSession())
+        battle.client.retries = 0
+
+        with pytest.raises(ApiError):
+            asyncio.run(battle.get_teams())
+        # the progress reporter draws the final state of the fetch and stops with it
+        assert "0 in flight" in capsys.readouterr().out.split("\r")[-2]
+
+    def test_get_teams_progress(self, capsys: pytest.CaptureFixture) -> None:
+        asyncio.run(self.make_battle(FakeSession()).get_teams())
+
+        # the last line shows the final state of the fetch
+        last_line = capsys.readouterr().out.rstrip("\r ").split("\r")[-1]
+        assert last_line.startswith("⏳ Loading characters: 10/10 fetched, ") and "0 in flight" in last_line
+
+    def test_odds_skip_exceeded_solver(self, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture) -> None:
+        pytest.importorskip("numpy")
+        import modules.battle
+
+        battle = self.make_battle(FakeSession())
+        battle.teams_formatted = {"Team 1": prepared_team("good", 0, 5), "Team 2": prepared_team("bad", 0, 5)}
+        battle.user_team, battle.cpu_team = "Team 1", "Team 2"
+        battle.solver, battle.solver_failed_at = None, None
+        monkeypatch.setattr(modules.battle, "SOLVER_BUDGET", 10)
+        calls = []
+        solve = WinSolver.solve
+        monkeypatch.setattr(WinSolver, "solve", lambda self, *args: calls.append(args) or solve(self, *args))
+
+        for _ in range(3):
+            battle.print_win_probability(n_battles=100)
+
+        # the solver is tried once, then the odds are estimated while the battle is as long
+        assert len(calls) == 1 and battle.solver_failed_at == 10 and not battle.solver.cache
+        assert capsys.readouterr().out.count("(estimated)") == 3
+
+        for team in battle.teams_formatted.values():
+            for character in team.characters[1:]:
+                character.hp = 0
+        battle.print_win_probability(n_battles=100)
+
+        # with few characters left, it is tried again
+        assert len(calls) == 2 and "(exact)" in capsys.readouterr().out
+
+class TestApiClient:
+
+    def test_retries(self) -> None:
+        session = FailingSession(failures=2)
+        client = ApiClient("https://example.com/api/", session=session, backoff=0, retries=2)
+
+        assert asyncio.run(client.get_json("1/biography")) == {"alignment": "good"}
+        assert session.calls == 3
+
+    def test_circuit_breaker(self) -> None:
+        client = ApiClient("https://example.com/api/", session=FailingSession(), backoff=0, retries=0,
+                           breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        for _ in range(2):
+            with pytest.raises(ApiError):
+                asyncio.run(client.get_json("1/biography"))
+
+        assert client.breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            asyncio.run(client.get_json("1/biography"))
+
+    def test_retries_count_once_for_circuit_breaker(self) -> None:
+        client = ApiClient("https://example.com/api/", session=FailingSession(), backoff=0, retries=3,
+                           breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        with pytest.raises(ApiError):
+            asyncio.run(client.get_json("1/biography"))
+
+        assert client.breaker.failures == 1 and client.breaker.state == "closed"
+
+    def test_client_errors_are_not_retried(self) -> None:
+        session = RejectingSession()
+        client = ApiClient("https://example.com/api/", session=session, backoff=0)
+
+        with pytest.raises(InvalidResponseError) as error:
+            asyncio.run(client.get_json("4/powerstats"))
+        assert error.value.status == 404 and len(session.requested) == 1 and client.breaker.failures == 0
+
+    def test_token_bucket(self) -> None:
+        bucket = TokenBucket(rate=100, capacity=2)
+
+        async def acquire_all() -> float:
+            start = time.perf_counter()
+            for _ in range(4):
+                await bucket.acquire()
+            return time.perf_counter() - start
+
+        # 2 tokens are available at once, the next 2 come at 100 tokens per second
+        assert asyncio.run(acquire_all()) >= .015
+
+    def test_run_on_client_loop(self) -> None:
+        with ApiClient("https://example.com/api/", session=FakeSession()) as client:
+            assert client.run(client.get_json("2/powerstats"))["name"] == "Character 2"
+            assert client.run(client.get_json("4/powerstats"))["name"] == "Character 4"
+
+class TestHeroIndex:
+
+    def test_sample(self) -> None:
+        index = HeroIndex(max_id=20)
+        for character_id in range(1, 11):
+            index.put(str(character_id), None if character_id % 2 else {"alignment": "good"})
+
+        drawn = list(index.sample(random.Random(1)))
+        assert sorted(drawn, key=int) == ["2", "4", "6", "8", "10", *map(str, range(11, 21))]
+        assert drawn == list(index.sample(random.Random(1)))
+        assert sorted(shuffled(["a", "b", "c"], random.Random(2))) == ["a", "b", "c"]
+
+        # an update doesn't affect a draw in progress
+        draws = index.sample(random.Random(3))
+        first = [next(draws) for _ in range(3)]
+        index.put("11", None)
+        assert first + list(draws) == list(HeroIndex.from_heroes(
+            {str(i): {"alignment": "good"} for i in range(2, 11, 2)}, {str(i) for i in range(1, 10, 2)}, max_id=20
+        ).sample(random.Random(3)))
+        assert "11" not in index.sample(random.Random(3))
+
+    def test_draw_teams(self) -> None:
+        heroes = {
+            str(character_id): {
+                **CHARACTERS_DATA[character_id % 5], "alignment": ("good", "bad", "neutral")[character_id % 3]
+            }
+            for character_id in range(1, 31)
+        }
+        index = HeroIndex.from_heroes(heroes, set())
+
+        teams = index.draw_teams(random.Random(4), 2, 5, balanced=True, exclude={"3", "4"})
+        ids = [character_id for team in teams for character_id in team]
+        assert len(set(ids)) == 10 and not {"3", "4"} & set(ids)
+        alignments = [
+            Team([Character(heroes[character_id]) for character_id in team]).set_team_alignment() for team in teams
+        ]
+        assert alignments == ["good", "bad"]
+        # 10 of the characters are good
+        assert index.draw_teams(random.Random(4), 2, 12, balanced=True) is None
+        assert len(index.draw_teams(random.Random(4), 2, 12)) == 2
+
+class TestHeroCatalog:
+
+    def test_put_and_get(self) -> None:
+        catalog = HeroCatalog(":memory:")
+        catalog.put("1", {"name": "Test Character 1", "alignment": "good"})
+        catalog.put("2", None)
+
+        assert catalog.get("1") == {"name": "Test Character 1", "alignment": "good"}
+        assert catalog.get("2") is None and catalog.is_known("2")
+        assert not catalog.is_known("3")
+        assert catalog.invalid_ids() == {"2"}
+        assert list(catalog.valid_heroes()) == ["1"]
+
+    def test_prefetch_all_reports_failures(self) -> None:
+        class UnavailableSession(RejectingSession):
+            # also fails with HTTP 503 for character 7
+            def get(self, url: str, **kwargs) -> FakeResponse:
+                response = super().get(url, **kwargs)
+                if url.split("/")[-2] == "7":
+                    response.status = 503
+                return response
+
+        catalog = HeroCatalog(":memory:")
+        client = ApiClient("https://example.com/api/", session=UnavailableSession(), backoff=0, retries=0,
+                           rate=10 ** 6, burst=10 ** 6)
+
+        fetched, failures = asyncio.run(catalog.prefetch_all(client))
+
+        # the failed character is reported and left unknown, the others are stored
+        assert list(failures) == ["7"] and fetched == 730
+        assert not catalog.is_known("7") and "8" in catalog.invalid_ids() and catalog.get("2") is not None
+
+    def test_ttl(self) -> None:
+        catalog = HeroCatalog(":memory:", ttl=-1)
+        catalog.put("1", {"name": "Test Character 1", "alignment": "good"})
+
+        assert catalog.get("1") is None and not catalog.is_known("1")
+
+class TestEngine:
+
+    def test_simulate_is_deterministic(self) -> None:
+        results = []
+        for _ in range(2):
+            teams = prepared_team("good", 5, 2), prepared_team("bad", 3, 1)
+            results.append(simulate(teams, random.Random(42)))
+        assert results[0] == results[1]
+
+    def test_simulate(self, teams: tuple[Team, Team]) -> None:
+        result = simulate(teams, random.Random(7))
+
+        assert result.rounds == len(result.hits)
+        assert all(character.hp == 0 for character in teams[1 - result.winner].characters)
+        assert any(character.hp > 0 for character in teams[result.winner].characters)
+        # teams attack in turns, starting with the first team
+        assert [hit.side for hit in result.hits] == [i % 2 for i in range(result.rounds)]
+        for hit in result.hits:
+            attacker = teams[hit.side].characters[hit.attacker]
+            assert hit.damage == attacker.attack[hit.attack_type]
+
+    def test_policy(self, teams: tuple[Team, Team]) -> None:
+        calls: list[list[int]] = []
+
+        def last_alive(alive: list[int], engine: Engine, rng: random.Random) -> int:
+            calls.append(list(alive))
+            return alive[-1]
+
+        result = Engine(teams, (last_alive, random_attacker), random.Random(1)).run()
+
+        # the policy is asked once per hit of its team, with the characters alive at that time
+        own_hits = [hit for hit in result.hits if hit.side == 0]
+        assert len(calls) == len(own_hits) and 4 in calls[0]
+        for alive, hit in zip(calls, own_hits):
+            assert hit.attacker == alive[-1]
+            assert hit.attacker == 4 or 4 not in alive
+
+    def test_alive_members(self, teams: tuple[Team, Team]) -> None:
+        engine = Engine(teams, (random_attacker, random_attacker), random.Random(3))
+        members = engine.alive(0), engine.alive(1)
+
+        while engine.winner is None:
+            engine.step()
+            # the alive members are updated in place, in team order, as characters are defeated
+            for side, team in enumerate(teams):
+                assert engine.alive(side) is members[side]
+                assert members[side] == [i for i, character in enumerate(team.characters) if character.hp > 0]
+        assert members[1 - engine.winner] == [] and members[engine.winner]
+
+    def test_alive_set(self) -> None:
+        alive = list(range(0, 300, 2))
+        members = AliveSet(alive, 300)
+        for i in random.Random(0).sample(alive, 100):
+            alive.remove(i)
+            members.remove(i)
+            assert members == alive and members[-1] == alive[-1]
+        assert [members[k] for k in range(len(members))] == alive
+        assert alive[0] in members and 1 not in members
+        with pytest.raises(ValueError):
+            members.remove(1)
+        with pytest.raises(IndexError):
+            members[len(alive)]
+
+    def test_large_teams(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        size = SMALL_TEAM_SIZE + 44
+        results = []
+        for small_team_size in (SMALL_TEAM_SIZE, size):
+            # the same battle, with the alive characters in an AliveSet then in plain lists
+            monkeypatch.setattr("modules.engine.SMALL_TEAM_SIZE", small_team_size)
+            teams = prepared_teams(random.Random(4), size)
+            engine = Engine(teams, (random_attacker, random_attacker), random.Random(4))
+            assert isinstance(engine.alive(0), AliveSet if small_team_size < size else list)
+            results.append(engine.run())
+        assert results[0] == results[1]
+
+class TestBatchSimulator:
+
+    def test_matches_scalar_rules(self, teams: tuple[Team, Team]) -> None:
+        np = pytest.importorskip("numpy")
+        from modules.batch import BatchSimulator
+
+        characters = teams[0].characters + teams[1].characters
+        n_battles = 50
+        simulator = BatchSimulator(
+            np.tile([character.hp for character in characters], (n_battles, 1)),
+            np.tile([character.attack for character in characters], (n_battles, 1, 1))
+        )
+        draws = np.random.default_rng(3).random((1000, 3, n_battles))
+        step = 0
+        while (simulator.winner < 0).any():
+            simulator.step(*draws[step])
+            step += 1
+
+        for battle in range(n_battles):
+            # replay the same draws in the headless engine: attacker, attack type, then victim
+            rng = ReplayedDraws(draws[:, :, battle].ravel())
+            scalar_teams = prepared_team("good", 5, 2), prepared_team("bad", 3, 1)
+            policy = lambda alive, engine, policy_rng: alive[rng.randrange(len(alive))]
+            result = Engine(scalar_teams, (policy, policy), rng).run()
+
+            hp = [character.hp for team in scalar_teams for character in team.characters]
+            assert simulator.hp[battle].tolist() == hp
+            assert simulator.rounds[battle] == result.rounds
+            assert simulator.winner[battle] == result.winner
+
+    def test_win_probability(self, teams: tuple[Team, Team]) -> None:
+        np = pytest.importorskip("numpy")
+        from modules.batch import win_probability
+
+        first_team, second_team = win_probability(teams, 2000, rng=np.random.default_rng(0))
+        assert first_team + second_team == pytest.approx(1)
+        # the first team has higher filiation coefficients and stamina
+        assert first_team > second_team
+
+    def test_win_probability_time_limit(self, teams: tuple[Team, Team]) -> None:
+        np = pytest.importorskip("numpy")
+        from modules.batch import win_probability
+
+        # a single chunk of battles is simulated once the time limit is reached
+        first_team, _ = win_probability(teams, 100_000, rng=np.random.default_rng(0), time_limit=0, chunk_size=500)
+        assert first_team == win_probability(teams, 500, rng=np.random.default_rng(0))[0]
+
+class TestSolver:
+
+    def test_matches_brute_force(self) -> None:
+        teams = prepared_team("good", 0, 2), prepared_team("bad", 0, 2)
+        for team in teams:
+            team.characters = team.characters[:2]
+        attack = [character.attack for team in teams for character in team.characters]
+
+        def odds(hp: tuple[float, ...], side: int) -> tuple[float, float]:
+            # every attacker, attack type and victim, recursively
+            if not any(hp[2:]) or not any(hp[:2]):
+                return float(any(hp[:2])), 0
+            attackers, victims = (range(0, 2), range(2, 4)) if side == 0 else (range(2, 4), range(0, 2))
+            results = []
+            for attacker in (i for i in attackers if hp[i] > 0):
+                for damage in attack[attacker]:
+                    for victim in (i for i in victims if hp[i] > 0):
+                        next_hp = list(hp)
+                        next_hp[victim] = round(max(hp[victim] - damage, 0), DIGITS)
+                        results.append(odds(tuple(next_hp), 1 - side))
+            return (
+                sum(win for win, _ in results) / len(results), sum(rounds + 1 for _, rounds in results) / len(results)
+            )
+
+        hp = tuple(character.hp for team in teams for character in team.characters)
+        win, rounds = odds(hp, 0)
+        result = WinSolver(teams).solve()
+        assert result.win_probability == pytest.approx((win, 1 - win))
+        assert result.rounds == pytest.approx(rounds)
+        # a cache smaller than the battle only costs recomputations
+        assert WinSolver(teams, capacity=10).solve() == pytest.approx(result)
+
+    def test_incremental(self) -> None:
+        teams = prepared_team("good", 5, 5), prepared_team("bad", 5, 5)
+        solver = WinSolver(teams)
+        result = solver.solve()
+
+        wins = 0
+        for seed in range(1000):
+            wins += simulate((prepared_team("good", 5, 5), prepared_team("bad", 5, 5)), random.Random(seed)).winner == 0
+        assert result.win_probability[0] == pytest.approx(wins / 1000, abs=.03)
+
+        # the states after each attack were explored by the previous query
+        engine = Engine(teams, (random_attacker, random_attacker), random.Random(0))
+        while engine.winner is None:
+            engine.step()
+            assert solver.solve(engine.side).rounds <= result.rounds + 1
+            assert solver.explored == 0
+        assert solver.solve(engine.side).win_probability == (1 - engine.winner, engine.winner)
+
+    def test_incremental_inexact_damage(self) -> None:
+        teams = prepared_team("good", 5, 5), prepared_team("bad", 5, 5)
+        for team in teams:
+            team.characters = team.characters[:2]
+            for character in team.characters:
+                # damages that aren't exact in binary, so the HP of the engine drift from the rounded states
+                character.hp, character.attack = 1.0, [.1, .2, .3]
+        solver = WinSolver(teams)
+        solver.solve()
+
+        engine = Engine(teams, (random_attacker, random_attacker), random.Random(1))
+        while engine.winner is None:
+            engine.step()
+            solver.solve(engine.side)
+            assert solver.explored == 0
+
+    def test_budget_and_passes(self) -> None:
+        teams = prepared_team("good", 5, 2), prepared_team("bad", 3, 1)
+        with pytest.raises(StateBudgetExceeded):
+            WinSolver(teams).solve(budget=1000)
+
+        teams = prepared_team("good", 5, 2), prepared_team("bad", 3, 1)
+        for team in teams:
+            team.characters = team.characters[:1]
+        # a third of the attacks of the first team deal no damage, those of the second team never do
+        teams[0].characters[0].attack = [0, 10 ** 4, 10 ** 4]
+        teams[1].characters[0].attack = [0, 0, 0]
+        result = WinSolver(teams).solve()
+        # the first team attacks 1.5 times on average, the second team in between
+        assert result.win_probability == pytest.approx((1, 0)) and result.rounds == pytest.approx(2)
+        teams[0].characters[0].attack = [0, 0, 0]
+        with pytest.raises(ValueError):
+            WinSolver(teams).solve()
+
+class TestDraft:
+
+    roster = {
+        str(i): {
+            "name": f"Character {i}",
+            "alignment": ("good", "bad", "neutral")[i % 3],
+            **{stat: str(random.Random(i).randint(1, 100) * (j + 1) % 101) for j, stat in enumerate(STATS)}
+        }
+        for i in range(1, 31)
+    }
+
+    def test_best_lineups_matches_brute_force(self) -> None:
+        np = pytest.importorskip("numpy")
+        import itertools
+        from modules.draft import best_lineups
+
+        rng = np.random.default_rng(2)
+        hp, damage, off_alignment = rng.uniform(100, 1000, 14), rng.uniform(10, 500, 14), rng.random(14) < .5
+        order = np.argsort(-hp * damage)
+        best, _ = best_lineups(hp[order], damage[order], off_alignment[order], 10)
+
+        strengths = sorted((
+            hp[list(lineup)].sum() * damage[list(lineup)].sum()
+            for lineup in itertools.combinations(range(14), 5) if off_alignment[list(lineup)].sum() <= 2
+        ), reverse=True)
+        assert [strength for strength, _ in best] == pytest.approx(strengths[:10])
+
+    def test_draft(self) -> None:
+        np = pytest.importorskip("numpy")
+        from modules.draft import draft, score_lineups
+
+        opponent = ["1", "2", "3", "4", "5"]
+        result = draft(self.roster, opponent, lineups=8, samples=64, seed=0)
+        assert result == draft(self.roster, opponent, lineups=8, samples=64, seed=0)
+
+        team = Team([Character(self.roster[character_id]) for character_id in result.ids])
+        assert len(set(result.ids)) == 5 and not set(result.ids) & set(opponent)
+        assert team.set_team_alignment() == result.team_alignment
+        assert result.lineups == 16
+
+        # the drafted team beats random lineups of the roster
+        ids = list(self.roster)
+        raw_stats = np.array([[int(self.roster[i][stat]) for stat in STATS] for i in ids])
+        alignments = np.array([self.roster[i]["alignment"] for i in ids])
+        rng = np.random.default_rng(1)
+        lineups = np.array([rng.choice(np.arange(5, 30), 5, replace=False) for _ in range(20)])
+        assert result.win_rate > score_lineups(raw_stats, alignments, lineups, np.arange(5), 64, rng).mean()
+
+        with pytest.raises(ValueError, match="missing"):
+            draft(self.roster, ["0", "1", "2", "3", "4"])
+        with pytest.raises(ValueError, match="4 characters"):
+            draft(self.roster, opponent[:4])
+        with pytest.raises(ValueError, match="more than once"):
+            draft(self.roster, ["1", "2", "3", "4", "1"])
+
+    @pytest.mark.parametrize("team_size", [4, 7])
+    def test_draft_team_size(self, team_size: int) -> None:
+        pytest.importorskip("numpy")
+        from modules.draft import draft
+
+        result = draft(self.roster, alignment="good", team_size=team_size, lineups=4, samples=16, seed=0)
+        team = Team([Character(self.roster[character_id]) for character_id in result.ids])
+        assert len(set(result.ids)) == team_size
+        assert team.set_team_alignment() == result.team_alignment == "good"
+
+class TestTournament:
+
+    roster = {
+        str(i): {**data, "name": f"{data['name']} ({i})"}
+        for i, data in enumerate(CHARACTERS_DATA * 4, start=1)
+    }
+
+    def test_round_robin_is_reproducible(self) -> None:
+        runs = []
+        for workers, shard_size in ((1, 100), (2, 3)):
+            tournament = Tournament(self.roster, 6, master_seed=11, workers=workers, shard_size=shard_size)
+            results = sorted(tournament.round_robin())
+            runs.append((results, tournament.character_ratings.ranking(), tournament.team_ratings.ranking()))
+
+        assert len(runs[0][0]) == 15
+        assert runs[0] == runs[1]
+
+    def test_bracket(self) -> None:
+        tournament = Tournament(self.roster, 5, master_seed=3, workers=2)
+        results = list(tournament.bracket())
+
+        # every team but the champion is eliminated exactly once, and the champion never loses
+        losers = [result.teams[0] if result.winner == result.teams[1] else result.teams[1] for result in results]
+        champion = results[-1].winner
+        assert len(results) == 4
+        assert sorted(losers) == sorted(team for team in range(5) if team != champion)
+
+    def test_shared_characters_are_not_rated(self) -> None:
+        tournament = Tournament(self.roster, 2, master_seed=3)
+        tournament.teams = [("1", "2", "3"), ("3", "4", "5")]
+        tournament.rate(MatchResult(0, (0, 1), 0, 10))
+
+        ratings = tournament.character_ratings
+        assert ratings["3"] == 1500 and "3" not in ratings.ratings
+        assert ratings["1"] == ratings["2"] > 1500 > ratings["4"] == ratings["5"]
+
+    def test_elo_ratings(self) -> None:
+        ratings = EloRatings()
+        ratings.update(("a", "b"), ("c",))
+
+        assert ratings["a"] == ratings["b"] == 1516
+        assert ratings["c"] == 1484
+        assert ratings["d"] == 1500
+
+class TestAnalytics:
+
+    def test_running_moments(self) -> None:
+        rng = random.Random(0)
+        values = [rng.gauss(100, 15) for _ in range(1000)]
+        merged = RunningMoments()
+        for start in range(0, 1000, 300):
+            # moments of chunks, as aggregated by workers
+            chunk = RunningMoments()
+            for value in values[start:start + 300]:
+                chunk.add(value)
+            merged.merge(chunk)
+
+        assert merged.count == 1000 and merged.min == min(values) and merged.max == max(values)
+        assert merged.mean == pytest.approx(sum(values) / 1000)
+        assert merged.std == pytest.approx(statistics.stdev(values))
+
+    def test_quantile_sketch(self) -> None:
+        rng = random.Random(1)
+        values = [rng.lognormvariate(5, 2) for _ in range(5000)] + [0.0] * 100
+        sketches = QuantileSketch(.01), QuantileSketch(.01)
+        for i, value in enumerate(values):
+            sketches[i % 2].add(value)
+        sketches[0].merge(sketches[1])
+
+        ordered = sorted(values)
+        for q in (.01, .25, .5, .9, .99):
+            exact = ordered[int(q * (len(values) - 1))]
+            assert sketches[0].quantile(q) == pytest.approx(exact, rel=.01)
+        assert sketches[0].count == len(values) and sketches[0].quantile(0) == 0
+
+        # values spanning more buckets than the sketch keeps lose the accuracy of their lowest quantiles only
+        bounded = QuantileSketch(.01, max_buckets=64)
+        for value in values:
+            bounded.add(value)
+        assert len(bounded.buckets) == 64 and bounded.quantile(.99) == pytest.approx(ordered[int(.99 * 5099)], rel=.01)
+
+    def test_median_of_counts(self) -> None:
+        assert median_of_counts({3: 2, 1: 1}) == 3
+        assert median_of_counts({1: 1, 2: 1, 5: 1, 9: 1}) == 3.5
+
+    def test_tournament_balance(self, tmp_path) -> None:
+        balances = []
+        for workers, shard_size in ((1, 100), (2, 7)):
+            tournament = Tournament(
+                TestTournament.roster, 40, master_seed=2, workers=workers, shard_size=shard_size, analytics=True
+            )
+            results = list(tournament.pairs())
+            balances.append(tournament.balance)
+
+        balance = balances[0]
+        rows = balance.summary()
+        assert balance.battles == len(results) == 20
+        assert sum(row.battles for row in rows) == 20 * 2 * 5
+        # every battle has 5 winners, and the stats don't depend on the sharding
+        assert sum(row.win_rate * row.battles for row in rows) == pytest.approx(20 * 5)
+        assert [row[:4] for row in rows] == [row[:4] for row in balances[1].summary()]
+        assert all(row.rounds_survived_p50 > 0 and .1 <= row.fb <= 10 for row in rows)
+        assert "Test Character" in balance.format_table(3)
+
+        balance.save(str(tmp_path / "balance.json"))
+        loaded = BalanceStats.load(str(tmp_path / "balance.json"))
+        assert loaded.summary() == rows
+        loaded.merge(balances[1])
+        assert loaded.battles == 40 and loaded.summary()[0].battles >= rows[0].battles
+
+class TestPrepareTeams:
+
+    def test_matches_update_characters(self) -> None:
+        np = pytest.importorskip("numpy")
+        from modules.batch import prepare_teams
+
+        rng = random.Random(5)
+        teams, stamina, fb_draws = [], [], []
+        for _ in range(20):
+            team = Team([Character(data) for data in rng.sample(CHARACTERS_DATA, 5)])
+            team.set_team_alignment()
+            stamina.append([character.actual_stamina for character in team.characters])
+            # record the draws of update_characters
+            state = random.getstate()
+            fb_draws.append([random.randrange(10) for _ in team.characters])
+            random.setstate(state)
+            team.update_characters()
+            teams.append(team)
+
+        prepared = prepare_teams(
+            [[character.base_stats for character in team.characters] for team in teams],
+            [[character.alignment for character in team.characters] for team in teams],
+            stamina,
+            fb_draws
+        )
+
+        assert prepared.team_alignment.tolist() == [team.team_alignment for team in teams]
+        for m, team in enumerate(teams):
+            for i, character in enumerate(team.characters):
+                assert prepared.fb[m, i] == character.fb
+                assert tuple(prepared.stats[m, i].tolist()) == character.stats
+                assert prepared.hp[m, i] == character.hp
+                assert prepared.attack[m, i].tolist() == character.attack
+
+class TestTables:
+
+    def test_lookup_matches_formulas(self, tmp_path) -> None:
+        pytest.importorskip("numpy")
+        from modules.tables import HeroTables, build_tables
+        import numpy as np
+
+        path = str(tmp_path / "tables.npy")
+        # the last character is missing from the tables, and falls back to the formulas
+        np.save(path, build_tables(dict(enumerate(CHARACTERS_DATA[:4]))))
+        tables = HeroTables(path)
+        for seed in range(30):
+            computed, looked_up = (
+                Team([Character(data, random.Random(seed)) for data in CHARACTERS_DATA]) for _ in range(2)
+            )
+            for team, team_tables in ((computed, None), (looked_up, tables)):
+                team.set_team_alignment()
+                team.update_characters(random.Random(seed), team_tables)
+            for expected, character in zip(computed.characters, looked_up.characters):
+                assert (character.fb, character.stats, character.hp, character.attack) == (
+                    expected.fb, expected.stats, expected.hp, expected.attack
+                )
+                assert type(character.hp) is int and type(character.stats[0]) is int
+
+    def test_tournament_with_tables(self, tmp_path) -> None:
+        pytest.importorskip("numpy")
+        from modules.tables import HeroTables, build_tables
+        import numpy as np
+
+        path = str(tmp_path / "tables.npy")
+        np.save(path, build_tables(TestTournament.roster))
+        runs = [
+            sorted(Tournament(TestTournament.roster, 6, master_seed=11, workers=2, tables=tables).round_robin())
+            for tables in (None, HeroTables(path))
+        ]
+        assert runs[0] == runs[1]
+
+class TestRng:
+
+    def test_substreams(self) -> None:
+        assert derive_seed(1, 2, "fight") == derive_seed(1, 2, "fight")
+        assert derive_seed(1, 2, "fight") != derive_seed(1, 3, "fight")
+        assert substream(7, "a").random() == substream(7, "a").random()
+
+    def test_seeded_team(self) -> None:
+        teams = []
+        for _ in range(2):
+            rng = random.Random(4)
+            team = Team([Character(data, rng) for data in CHARACTERS_DATA])
+            team.set_team_alignment()
+            team.update_characters(rng)
+            teams.append([(character.actual_stamina, character.fb, character.hp) for character in team.characters])
+        assert teams[0] == teams[1]
+
+    def test_replay(self) -> None:
+        rng = random.Random(8)
+        teams = []
+        for _ in range(2):
+            team = Team([Character(data, rng) for data in rng.sample(CHARACTERS_DATA, 5)])
+            team.set_team_alignment()
+            team.update_characters(rng)
+            teams.append(team)
+        record_teams = (snapshot(teams[0]), snapshot(teams[1]))
+        result = simulate((teams[0], teams[1]), random.Random(99))
+
+        record = BattleRecord(record_teams, 99, [hit.attacker for hit in result.hits])
+        # the record survives a JSON round trip
+        record = BattleRecord(**json.loads(json.dumps(record._asdict())))
+        assert replay(record) == result
+
+class TestPolicies:
+
+    @pytest.mark.parametrize("policy", [RandomPolicy(), GreedyPolicy(), FocusFirePolicy(), LookaheadPolicy(.005)])
+    def test_policy_plays_battle(self, teams: tuple[Team, Team], policy: RandomPolicy) -> None:
+        result = simulate(teams, random.Random(2), (policy, RandomPolicy()))
+
+        for hit in result.hits:
+            assert hit.damage == teams[hit.side].characters[hit.attacker].attack[hit.attack_type]
+        assert all(character.hp == 0 for character in teams[1 - result.winner].characters)
+
+    def test_focus_fire_targets_lowest_hp(self, teams: tuple[Team, Team]) -> None:
+        teams[1].characters[2].hp = 1
+        engine = Engine(teams, (FocusFirePolicy(), RandomPolicy()), random.Random(0))
+        hit = engine.step()
+
+        assert hit.victim == 2
+        assert hit.attacker == max(range(5), key=lambda i: sum(teams[0].characters[i].attack))
+
+    def test_lookahead_budget(self, teams: tuple[Team, Team]) -> None:
+        policy = LookaheadPolicy(budget=.02)
+        engine = Engine(teams, (policy, RandomPolicy()), random.Random(0))
+
+        start = time.perf_counter()
+        engine.step()
+        assert time.perf_counter() - start < .2
+        assert policy.depth_reached >= 1
+
+    def test_targeting_large_teams(self) -> None:
+        class ScanningGreedy(Policy):
+            # the greedy and focus fire choices, scanning every alive character
+            def choose_attacker(self, alive: list[int], engine: Engine, rng: random.Random) -> int:
+                characters = engine.teams[engine.side].characters
+                return max(alive, key=lambda i: expected_damage(characters[i].attack))
+
+            def choose_target(
+                self, alive: list[int], attacker: int, attack_type: int, engine: Engine, rng: random.Random
+            ) -> int | None:
+                damage = engine.teams[engine.side].characters[attacker].attack[attack_type]
+                victims = engine.teams[1 - engine.side].characters
+                return max(alive, key=lambda i: (min(damage, victims[i].hp), -victims[i].hp))
+
+        class ScanningFocusFire(ScanningGreedy):
+            def choose_target(
+                self, alive: list[int], attacker: int, attack_type: int, engine: Engine, rng: random.Random
+            ) -> int | None:
+                victims = engine.teams[1 - engine.side].characters
+                return min(alive, key=lambda i: victims[i].hp)
+
+        size = SMALL_TEAM_SIZE + 44
+        results = [
+            simulate(prepared_teams(random.Random(6), size), random.Random(6), policies)
+            for policies in ((GreedyPolicy(), FocusFirePolicy()), (ScanningGreedy(), ScanningFocusFire()))
+        ]
+        assert results[0] == results[1]
+
+    def test_replay_with_policies(self, teams: tuple[Team, Team]) -> None:
+        record_teams = (snapshot(teams[0]), snapshot(teams[1]))
+        result = simulate(teams, random.Random(5), (GreedyPolicy(), LookaheadPolicy(.005)))
+
+        record = BattleRecord(record_teams, 5, [hit.attacker for hit in result.hits], [hit.victim for hit in result.hits])
+        assert replay(record) == result
+
+class TestEvents:
+
+    def test_sinks(self, tmp_path) -> None:
+        results = [
+            simulate((prepared_team("good", 5, 2), prepared_team("bad", 3, 1)), random.Random(battle))
+            for battle in range(3)
+        ]
+        with RingBufferSink(capacity=8) as ring, NdjsonSink(str(tmp_path / "hits.ndjson"), batch_size=5) as ndjson, \
+                BinarySink(str(tmp_path / "hits.bin"), batch_size=5) as binary:
+            for battle, result in enumerate(results):
+                for sink in (ring, ndjson, binary):
+                    sink.write(battle, result.hits)
+        events = [Event(battle, *hit) for battle, result in enumerate(results) for hit in result.hits]
+
+        assert list(ring.events) == events[-8:]
+        with pytest.raises(TypeError):
+            EventSink()  # pylint: disable=abstract-class-instantiated
+        assert list(read_ndjson_log(str(tmp_path / "hits.ndjson"))) == events
+
+        pytest.importorskip("numpy")
+        log = load_binary_log(str(tmp_path / "hits.bin"))
+        assert log.dtype.itemsize == 30 and len(log) == len(events)
+        assert [Event(*record) for record in log.tolist()] == events
+
+        # logs of the previous layout, without the battle, are rejected
+        old_log = tmp_path / "old.bin"
+        old_log.write_bytes(b"FSHITS\x01\x00" + bytes(26))
+        with pytest.raises(ValueError, match="version 1"):
+            load_binary_log(str(old_log))
+
+    def test_step_by_step(self, teams: tuple[Team, Team]) -> None:
+        sink = RingBufferSink()
+        engine = Engine(teams, (random_attacker, random_attacker), random.Random(3), sink=sink)
+        hit = engine.step()
+
+        # hits are emitted at the end of run, or when flushed
+        assert not sink.events
+        engine.flush_events()
+        assert list(sink.events) == [Event(0, *hit)]
+        result = engine.run()
+        assert list(sink.events) == [Event(0, *hit) for hit in result.hits]
+
+class TestRenderer:
+
+    def test_redraws_changed_characters(self, teams: tuple[Team, Team]) -> None:
+        renderer = Renderer(io.StringIO())
+        named = {"Team 1": teams[0], "Team 2": teams[1]}
+
+        first = renderer.frame(named)
+        teams[1].characters[2].assess_damage(10)
+        teams[1].characters[2].set_status()
+        second = renderer.frame(named)
+
+        assert all(character.name in first for team in teams for character in team.characters)
+        # only the victim is drawn again, under the status of each team
+        assert second.count("HP:") == 1 and "Test Character 3" in second and "🟢🟢🟡🟢🟢" in second
+        assert renderer.frame(named).count("HP:") == 0
+        assert renderer.frame(named, full=True).count("HP:") == 10
+
+    def test_modes(self, teams: tuple[Team, Team], monkeypatch: pytest.MonkeyPatch) -> None:
+        sleeps: list[float] = []
+        monkeypatch.setattr(time, "sleep", sleeps.append)
+        named = {"Team 1": teams[0], "Team 2": teams[1]}
+
+        output = io.StringIO()
+        Renderer(output).render(named, delay=2)
+        Renderer(output, fast=True).render(named, delay=2)
+        silent = Renderer(None)
+        silent.render(named, delay=2)
+        silent.write("hidden")
+
+        # a single write per frame, and only the paced renderer pauses
+        assert output.getvalue().count("Team 1") == 2 and "hidden" not in output.getvalue()
+        assert sleeps == [2] and silent.shown == {}
+
+    def test_default_output(self, capsys: pytest.CaptureFixture) -> None:
+        # the default output is the stdout of the creation of the renderer, here captured
+        Renderer().write("shown")
+        assert capsys.readouterr().out == "shown\n"
+
+class TestInstrumentation:
+
+    def test_disabled(self, team: Team) -> None:
+        INSTRUMENTS.reset()
+        team.set_team_alignment()
+        team.update_characters(random.Random(1))
+
+        assert INSTRUMENTS.timer("fight") is NULL_TIMER
+        assert not INSTRUMENTS.timers and not INSTRUMENTS.counters
+
+    def test_session(self, tmp_path, capsys: pytest.CaptureFixture) -> None:
+        trace_path = str(tmp_path / "trace.json")
+        profile_path = tmp_path / "game.prof"
+        battle = TestBattle.make_battle(RejectingSession())
+
+        with session(stats=True, profile=str(profile_path), trace=trace_path):
+            asyncio.run(battle.get_teams(show_progress=False))
+
+        with open(trace_path, encoding="utf-8") as file:
+            trace = json.load(file)["traceEvents"]
+        timed = {event["name"] for event in trace if event["ph"] == "X"}
+        assert {"get_teams", "fetch_data", "fetch_data.powerstats", "fetch_data.biography"} <= timed
+        assert INSTRUMENTS.counters["get_teams.accepted"] >= 10 and INSTRUMENTS.counters["get_teams.rejected"] > 0
+        assert "fetch_data.powerstats" in capsys.readouterr().out and profile_path.stat().st_size > 0
+        assert not INSTRUMENTS.enabled and INSTRUMENTS.timer("get_teams") is NULL_TIMER
+
+class TestCli:
+
+    def test_startup_is_lazy(self) -> None:
+        loaded = subprocess.run(
+            [sys.executable, "-c", "import sys, main; print(sorted({'aiohttp', 'asyncio', 'numpy'} & set(sys.modules)))"],
+            capture_output=True, text=True, check=True
+        ).stdout
+        assert loaded.strip() == "[]"
+
+    def test_simulate(self, tmp_path, capsys: pytest.CaptureFixture) -> None:
+        catalog = HeroCatalog(str(tmp_path / "catalog.db"))
+        for character_id, data in enumerate(CHARACTERS_DATA * 2, start=1):
+            catalog.put(str(character_id), {**data, "name": f"{data['name']} #{character_id}"})
+        catalog.close()
+        argv = ["simulate", "--battles", "40", "--workers", "2", "--seed", "3", "--catalog", str(tmp_path / "catalog.db")]
+
+        assert main.main(argv) == 0
+        first = capsys.readouterr().out
+        assert main.main([*argv[:4], "1", *argv[5:]]) == 0
+        second = capsys.readouterr().out
+
+        assert "40 battles" in first and "seed 3" in first
+        # the stats don't depend on the number of workers
+        assert first.splitlines()[1:] == second.splitlines()[1:]
+        assert main.main(["simulate", "--catalog", str(tmp_path / "empty.db")]) == 1
+
+    def test_rejects_no_battles(self, capsys: pytest.CaptureFixture) -> None:
+        for battles in ("0", "-3", "ten"):
+            with pytest.raises(SystemExit):
+                main.main(["simulate", "--battles", battles])
+            assert "not a positive integer" in capsys.readouterr().err
+
+    def test_rejects_empty_teams(self, capsys: pytest.CaptureFixture) -> None:
+        for command in ("play", "simulate", "serve", "draft"):
+            with pytest.raises(SystemExit):
+                main.main([command, "--team-size", "0"])
+            assert "not a positive integer" in capsys.readouterr().err
+
+class TestServer:
+
+    @staticmethod
+    async def send(writer: asyncio.StreamWriter, message: dict) -> None:
+        writer.write(json.dumps(message).encode() + b"\n")
+        await writer.drain()
+
+    def test_concurrent_battles(self) -> None:
+        async def run() -> tuple[list[dict], dict]:
+            server = BattleServer(TestTournament.roster, seed=1)
+            port = await server.start()
+            ends = await asyncio.gather(
+                *(bot("127.0.0.1", port, "pvp" if i % 4 == 0 else "cpu", seed=i) for i in range(200))
+            )
+            metrics = server.metrics()
+            await server.close()
+            return ends, metrics
+
+        ends, metrics = asyncio.run(run())
+
+        # 150 battles against the CPU and 25 between players, all played to the end on a single event loop
+        assert metrics["matches_started"] == 175 and metrics["active_matches"] == 0
+        assert all(end["reason"] == "defeat" for end in ends)
+        assert len({end["match"] for end in ends}) == 175
+        assert metrics["latency"]["count"] == sum(end["rounds"] for end in {end["match"]: end for end in ends}.values())
+        assert all(end["latency"]["count"] == end["rounds"] for end in ends)
+
+    def test_invalid_move_and_forfeit(self) -> None:
+        async def run() -> tuple[dict, dict, dict, dict]:
+            server = BattleServer(TestTournament.roster, seed=1)
+            port = await server.start()
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            await self.send(writer, {"op": "join", "mode": "pvp"})
+            await asyncio.sleep(.05)
+            opponent = asyncio.create_task(bot("127.0.0.1", port, "pvp"))
+
+            start = json.loads(await reader.readline())
+            turn = json.loads(await reader.readline())
+            await self.send(writer, {"op": "attack", "attacker": 99})
+            error = json.loads(await reader.readline())
+            # the first player leaves instead of playing
+            writer.close()
+            end = await opponent
+            await server.close()
+            return start, turn, error, end
+
+        start, turn, error, end = asyncio.run(run())
+
+        assert start["side"] == 0 and len(start["teams"]) == 2 and turn["alive"] == [0, 1, 2, 3, 4]
+        assert error["type"] == "error"
+        assert end["winner"] == 1 and end["reason"] == "forfeit"
+
+    def test_non_int_attacker(self) -> None:
+        async def run() -> tuple[list[dict], dict]:
+            server = BattleServer(TestTournament.roster, seed=1)
+            port = await server.start()
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            await self.send(writer, {"op": "join", "mode": "cpu"})
+            await reader.readline()  # start
+            await reader.readline()  # turn
+            errors = []
+            for attacker in (1.0, True, "1"):
+                await self.send(writer, {"op": "attack", "attacker": attacker})
+                errors.append(json.loads(await reader.readline()))
+            # the match is still being played
+            await self.send(writer, {"op": "attack", "attacker": 1})
+            hit = json.loads(await reader.readline())
+            writer.close()
+            await server.close()
+            return errors, hit
+
+        errors, hit = asyncio.run(run())
+        assert all(error["type"] == "error" for error in errors)
+        assert hit["type"] == "hit" and hit["attacker"] == 1
+
+    def test_failed_match_ends(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        def fail(engine: Engine) -> None:
+            raise RuntimeError("engine failure")
+
+        async def run() -> list[dict]:
+            server = BattleServer(TestTournament.roster, seed=1)
+            port = await server.start()
+            ends = await asyncio.gather(bot("127.0.0.1", port, "pvp"), bot("127.0.0.1", port, "pvp", seed=1))
+            await server.close()
+            return ends
+
+        monkeypatch.setattr(Engine, "step", fail)
+        ends = asyncio.run(run())
+        # both players of the failed match get its end
+        assert all(end["reason"] == "error" and end["winner"] is None for end in ends)
+
+class TestBenchmarks:
+
+    def test_compare(self) -> None:
+        baseline = {"results": {"fight": {"median": 1.0}, "render": {"median": 1.0}}}
+        current = {"results": {"fight": {"median": 1.5}, "render": {"median": 1.1}, "new": {"median": 9.0}}}
+
+        regressions = compare(baseline, current, threshold=.2)
+        assert len(regressions) == 1 and regressions[0].startswith("fight")
+
+    def test_get_teams_against_mock_api(self, capsys: pytest.CaptureFixture) -> None:
+        result = bench_get_teams(1, 1, latency=0)
+        assert result["iterations"] == 1 and result["median"] > 0
+        # the loading animation is disabled for headless runs
+        assert "Loading" not in capsys.readouterr().out